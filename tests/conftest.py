@@ -0,0 +1,35 @@
+"""Shared fixtures: the tools are scripts (some with dashes in their names), loaded by file name"""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+TOOLS_DIR = Path(__file__).resolve().parent.parent / "tools"
+sys.path.insert(0, str(TOOLS_DIR))
+
+
+def load_tool(name):
+    """Import a tool script by file name (e.g. 'blockchain-audit')"""
+    module_name = name.replace("-", "_")
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, TOOLS_DIR / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    # Registered before exec so worker processes can unpickle module-level functions
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def audit():
+    return load_tool("blockchain-audit")
+
+
+@pytest.fixture
+def chain(audit, tmp_path):
+    blockchain = audit.DOCScoinBlockchain(str(tmp_path / "audit.db"), miner="none")
+    yield blockchain
+    blockchain.close()
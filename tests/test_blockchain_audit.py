@@ -0,0 +1,188 @@
+import hashlib
+import json
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import pytest
+
+from conftest import TOOLS_DIR
+
+
+def baseline_hash(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def write_baseline_chain(db_path, document_ids):
+    """A chain as the original tool wrote it: one transaction per block, the block
+    hash is the hash of its JSON data and doubles as the merkle root"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+    CREATE TABLE blocks (
+        block_number INTEGER PRIMARY KEY AUTOINCREMENT, previous_hash TEXT NOT NULL,
+        timestamp DATETIME NOT NULL, data_hash TEXT NOT NULL, merkle_root TEXT NOT NULL,
+        nonce INTEGER, difficulty INTEGER DEFAULT 4, miner TEXT DEFAULT 'DOCScoin-Audit-System'
+    )""")
+    conn.execute("""
+    CREATE TABLE transactions (
+        tx_id TEXT PRIMARY KEY, block_number INTEGER, operation_type TEXT NOT NULL,
+        operator_id TEXT, certificate_thumbprint TEXT, document_id TEXT, action TEXT,
+        data_summary TEXT, timestamp DATETIME NOT NULL, signature TEXT
+    )""")
+    genesis_data = {"message": "DOCScoin Audit Blockchain Genesis Block",
+                    "created": datetime.now().isoformat(), "standard_version": "2.0.0"}
+    previous_hash = baseline_hash(genesis_data)
+    conn.execute("INSERT INTO blocks (previous_hash, timestamp, data_hash, merkle_root, nonce) VALUES (?, ?, ?, ?, 0)",
+                 ("0" * 64, datetime.now().isoformat(), previous_hash, previous_hash))
+    conn.execute("INSERT INTO transactions (tx_id, block_number, operation_type, timestamp, action, data_summary) "
+                 "VALUES ('GENESIS-TX-001', 1, 'system', ?, 'init', ?)",
+                 (datetime.now().isoformat(), json.dumps(genesis_data)))
+    for number, document_id in enumerate(document_ids):
+        transaction = {"tx_id": f"TX-{number}", "operation_type": "document_export", "operator_id": "op",
+                       "certificate_thumbprint": "SHA1:AA", "document_id": document_id, "action": "export",
+                       "data_summary": "export", "timestamp": datetime.now().isoformat()}
+        block_data = {"transactions": [transaction], "timestamp": datetime.now().isoformat(),
+                      "previous_block": previous_hash}
+        data_hash, nonce = baseline_hash(block_data), 0
+        while not data_hash.startswith("0000"):
+            nonce += 1
+            block_data["nonce"] = nonce
+            data_hash = baseline_hash(block_data)
+        block_number = conn.execute(
+            "INSERT INTO blocks (previous_hash, timestamp, data_hash, merkle_root, nonce) VALUES (?, ?, ?, ?, ?)",
+            (previous_hash, datetime.now().isoformat(), data_hash, data_hash, nonce)).lastrowid
+        conn.execute("INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, '')",
+                     (transaction["tx_id"], block_number, *list(transaction.values())[1:]))
+        previous_hash = data_hash
+    conn.commit()
+    conn.close()
+
+
+def test_recorded_export_is_visible_before_the_block_is_sealed(chain):
+    tx_id = chain.record_export_operation("op", "SHA1:AA", "DOC-1", "export")
+
+    assert isinstance(tx_id, str)
+    assert chain.transaction_status(tx_id) == {"tx_id": tx_id, "status": "pending", "block_number": None}
+    assert chain.has_document("DOC-1")
+    assert chain.last_operation("DOC-1")["tx_id"] == tx_id
+    assert not chain.mempool
+    assert chain.transaction_status(tx_id) == {"tx_id": tx_id, "status": "sealed", "block_number": 2}
+    assert chain.transaction_status("TX-MISSING")["status"] == "unknown"
+
+
+def test_mempool_is_sealed_by_age(audit, tmp_path):
+    chain = audit.DOCScoinBlockchain(str(tmp_path / "audit.db"), miner="none", max_block_age=0.2)
+    chain.record_export_operation("op", "SHA1:AA", "DOC-1", "export")
+    deadline = time.monotonic() + 5
+    while chain.store.height() < 2 and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert chain.store.height() == 2
+    assert not chain.mempool
+    chain.close()
+
+
+def test_mempool_is_sealed_at_exit(tmp_path):
+    db_path = tmp_path / "audit.db"
+    script = (
+        "import importlib.util, sys\n"
+        f"sys.path.insert(0, {str(TOOLS_DIR)!r})\n"
+        f"spec = importlib.util.spec_from_file_location('audit', {str(TOOLS_DIR / 'blockchain-audit.py')!r})\n"
+        "audit = importlib.util.module_from_spec(spec); spec.loader.exec_module(audit)\n"
+        f"chain = audit.DOCScoinBlockchain({str(db_path)!r}, miner='none', max_block_age=60)\n"
+        "chain.record_export_operation('op', 'SHA1:AA', 'DOC-EXIT', 'export')\n"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True, capture_output=True)
+
+    rows = sqlite3.connect(db_path).execute("SELECT document_id FROM transactions").fetchall()
+    assert ("DOC-EXIT",) in rows
+
+
+def test_chain_written_by_baseline_code_verifies(audit, tmp_path):
+    db_path = str(tmp_path / "audit.db")
+    write_baseline_chain(db_path, ["DOC-1", "DOC-2"])
+    chain = audit.DOCScoinBlockchain(db_path, miner="none")
+    chain.record_export_operation("op", "SHA1:AA", "DOC-3", "export", wait=True)
+
+    assert chain.store.legacy_height() == 3
+    result = chain.verify_chain(full=True)
+    assert result["valid"], result["errors"]
+    assert result["blocks_verified"] == 4
+    assert result["checkpoint"]
+
+    # The previous_hash link still covers legacy blocks
+    chain.store.connection().execute("UPDATE blocks SET previous_hash = ? WHERE block_number = 3", ("0" * 4 + "1" * 60,))
+    chain.store.connection().commit()
+    assert not chain.verify_chain(full=True)["valid"]
+    chain.close()
+
+
+def test_lookups_see_blocks_sealed_by_another_writer(audit, chain):
+    chain.record_export_operation("op", "SHA1:AA", "DOC-1", "export", wait=True)
+    assert not chain.has_document("DOC-2")
+    assert chain.last_operation("DOC-1")["operator_id"] == "op"
+
+    other_writer = audit.DOCScoinBlockchain(chain.db_path, miner="none")
+    other_writer.record_export_operation("other", "SHA1:BB", "DOC-2", "export", wait=True)
+    other_writer.record_export_operation("other", "SHA1:BB", "DOC-1", "export", wait=True)
+    other_writer.close()
+
+    assert chain.has_document("DOC-2")
+    assert chain.last_operation("DOC-1")["operator_id"] == "other"
+
+
+def test_failed_seal_keeps_the_pending_transactions(audit, chain, monkeypatch):
+    for document_id in ("DOC-1", "DOC-2"):
+        chain.submit_transaction(audit.make_export_transaction("op", "SHA1:AA", document_id, "export"))
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(chain.miner, "mine", fail)
+        with pytest.raises(OSError):
+            chain.flush()
+    assert [tx["document_id"] for tx in chain.mempool] == ["DOC-1", "DOC-2"]
+
+    with monkeypatch.context() as patch:
+        patch.setattr(chain.store, "append_block", fail)
+        with pytest.raises(OSError):
+            chain.flush()
+    assert len(chain.mempool) == 2
+
+    assert chain.flush()["block_number"] == 2
+    assert not chain.mempool
+    assert chain.has_document("DOC-1") and chain.has_document("DOC-2")
+
+
+def test_failed_writer_batch_keeps_other_pending_transactions(audit, chain, monkeypatch):
+    queued = audit.make_export_transaction("op", "SHA1:AA", "DOC-QUEUED", "export")
+    chain.submit_transaction(queued)
+    writer = audit.AuditWriter(chain, max_delay=0)
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(chain.store, "append_block", fail)
+        _, future = writer.record_export_operation("op", "SHA1:BB", "DOC-BATCH", "export")
+        with pytest.raises(OSError):
+            future.result(timeout=5)
+    writer.close()
+
+    assert chain.mempool == [queued]
+    chain.flush()
+    assert chain.has_document("DOC-QUEUED")
+    assert not chain.has_document("DOC-BATCH")
+
+
+def test_history_and_report_queries_use_indexes(chain):
+    plans, full_scans = chain.query_plans()
+
+    assert {"history", "report_total", "report_by_type", "report_by_operator", "report_page"} <= set(plans)
+    assert full_scans == []
+    for name, plan in plans.items():
+        assert not any(step.startswith("SCAN transactions") for step in plan), (name, plan)
+        assert any(step.startswith("SEARCH transactions") for step in plan), (name, plan)
@@ -0,0 +1,27 @@
+import json
+
+from conftest import load_tool
+
+generator_module = load_tool("document-generator")
+
+
+def test_malformed_jsonl_records_are_reported_and_the_batch_continues(tmp_path):
+    db_path = str(tmp_path / "template-registry.db")
+    load_tool("create_database").create_database(db_path)
+    generator = generator_module.DocumentGenerator(db_path)
+    field_paths = generator.field_paths()
+    generator.close()
+
+    data = tmp_path / "profiles.jsonl"
+    data.write_text("\n".join([
+        "[1]",
+        json.dumps({"enterprise_data": "x"}),
+        json.dumps({"enterprise_data": {"employee": None}}),
+        json.dumps({"enterprise_data": {"employee": {"employee_id": "E-1"}}}),
+    ]) + "\n", encoding="utf-8")
+
+    results = list(generator_module.generate_batch(field_paths, generator_module.iter_profiles(str(data)),
+                                                   str(tmp_path), workers=1, date="2025-01-01"))
+
+    assert [result["status"] for result in results] == ["error", "generated", "generated", "generated"]
+    assert "JSON object" in results[0]["error"]
@@ -0,0 +1,17 @@
+from conftest import load_tool
+
+signer_module = load_tool("rutoken-signer")
+
+
+def test_cached_certificate_does_not_vouch_for_another_with_the_same_serial():
+    signer = signer_module.MockRutokenSigner()
+    verifier = signer_module.SignatureVerifier()
+    data = {"document_id": "DOC-1"}
+    signature = signer.sign_data(data)
+    assert verifier.verify(data, signature)["valid"]
+
+    expired = dict(signature, signer_certificate=dict(signer.certificate, valid_to="2000-01-01"))
+    result = verifier.verify(data, expired)
+
+    assert not result["valid"]
+    assert [kind for kind, _ in result["errors"]] == ["certificate_expired"]
@@ -0,0 +1,67 @@
+import os
+
+from conftest import load_tool
+
+validator = load_tool("validator")
+field_crypto = load_tool("field_crypto")
+
+
+def passport_profile(cipher, series, number):
+    return {"national_data": {"ru": {"passport": {"series": cipher.encrypt(series),
+                                                  "number": cipher.encrypt(number)}}}}
+
+
+def test_encrypted_passport_is_checked_with_a_key_and_skipped_without():
+    cipher = field_crypto.AESGCMCipher(os.urandom(field_crypto.KEY_SIZE))
+    decryptor = field_crypto.FieldDecryptor([cipher])
+
+    errors = []
+    validator._validate_passport_numbers(passport_profile(cipher, "4510", "123456"), errors, decryptor)
+    assert errors == []
+
+    errors = []
+    validator._validate_passport_numbers(passport_profile(cipher, "4510", "12345"), errors, decryptor)
+    assert [(error.kind, error.field_code) for error in errors] == [("invalid_format", "NATIONAL:RU:PASSPORT:NUMBER")]
+    assert errors[0].message.endswith(": 12345")
+
+    errors = []
+    validator._validate_passport_numbers(passport_profile(cipher, "4510", "12345"), errors)
+    assert errors == []
+
+
+def test_undecryptable_required_passport_field_is_reported_once():
+    cipher = field_crypto.AESGCMCipher(os.urandom(field_crypto.KEY_SIZE))
+    decryptor = field_crypto.FieldDecryptor([cipher])
+    plan = validator.compile_registry([
+        {"field_code": "NATIONAL:RU:PASSPORT:SERIES", "json_path": "$.national_data.ru.passport.series",
+         "validation_pattern": None, "data_type": "STRING"},
+        {"field_code": "NATIONAL:RU:PASSPORT:NUMBER", "json_path": "$.national_data.ru.passport.number",
+         "validation_pattern": None, "data_type": "STRING"},
+    ])
+    profile = passport_profile(cipher, "4510", "123456")
+    series = profile["national_data"]["ru"]["passport"]["series"]
+    # Change one base64 character inside the nonce: authentication fails
+    i = series.index("(") + 4
+    profile["national_data"]["ru"]["passport"]["series"] = series[:i] + ("A" if series[i] != "A" else "B") + series[i + 1:]
+
+    errors = validator.check_profile(plan, profile, decryptor)
+
+    assert [(error.kind, error.field_code) for error in errors] == [
+        ("decryption_failed", "NATIONAL:RU:PASSPORT:SERIES")]
+
+
+def test_string_fields_accept_non_negative_integers_checked_by_pattern():
+    plan = validator.compile_registry([
+        {"field_code": "NATIONAL:RU:PASSPORT:SERIES", "json_path": "$.national_data.ru.passport.series",
+         "validation_pattern": r"^\d{4}$", "data_type": "STRING"},
+    ])
+
+    def kinds(series):
+        profile = {"national_data": {"ru": {"passport": {"series": series}}}}
+        return [error.kind for error in validator.check_profile(plan, profile)]
+
+    assert kinds(4510) == []
+    assert kinds("4510") == []
+    assert kinds(451) == ["invalid_format"]
+    assert kinds(-4510) == ["invalid_type"]
+    assert kinds(True) == ["invalid_type"]
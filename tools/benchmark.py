@@ -0,0 +1,571 @@
+#!/usr/bin/env python3
+"""
+DOCScoin Benchmarks
+Performance measurements for the DOCScoin tools
+
+Usage:
+    python tools/benchmark.py mining --blocks 5
+    python tools/benchmark.py connections --ops 2000
+    python tools/benchmark.py validator
+    python tools/benchmark.py signing
+    python tools/benchmark.py canonical --attachments 8 --attachment-mb 4
+    python tools/benchmark.py startup --runs 10
+    python tools/benchmark.py checksums --rows 1000000
+    python tools/benchmark.py decryption --values 100000
+    python tools/benchmark.py storage --transactions 100000
+    python tools/benchmark.py lookups --documents 100000
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+TOOLS_DIR = Path(__file__).resolve().parent
+REPO_DIR = TOOLS_DIR.parent
+
+
+def load_tool(name):
+    """Import a tool script by file name (e.g. 'blockchain-audit')"""
+    module_name = name.replace('-', '_')
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, TOOLS_DIR / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    # Registered before exec so worker processes can unpickle module-level functions
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def quiet():
+    """Silence the tools' progress output inside a timed section"""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def sample_transactions(count, prefix="BENCH", documents=None):
+    """Synthetic export transactions"""
+    documents = documents or count
+    return [{
+        "tx_id": f"{prefix}-{i:08d}",
+        "operation_type": "document_export",
+        "operator_id": f"operator_{i % 17}",
+        "certificate_thumbprint": "SHA1:BENCH",
+        "document_id": f"DOC-{i % documents:08d}",
+        "action": "export",
+        "data_summary": "benchmark export",
+        "timestamp": f"2025-01-{1 + i % 28:02d}T{i % 24:02d}:{i % 60:02d}:00"
+    } for i in range(count)]
+
+
+def report(title, rows):
+    """Print a simple aligned result table"""
+    print(f"\n📊 {title}")
+    for label, value in rows:
+        print(f"   {label:<32} {value}")
+
+
+def bench_mining(args):
+    """Hashes/sec and seal latency for every mining engine"""
+    audit = load_tool("blockchain-audit")
+
+    for mode in args.modes:
+        with tempfile.TemporaryDirectory() as tmp:
+            miner = audit.make_miner(mode)
+            if mode == "parallel" and args.workers:
+                miner.workers = args.workers
+            chain = audit.DOCScoinBlockchain(
+                os.path.join(tmp, "bench.db"),
+                max_block_transactions=args.batch,
+                miner=miner,
+                difficulty=args.difficulty
+            )
+
+            latencies, attempts, mining_time = [], 0, 0.0
+            for block in range(args.blocks):
+                chain.mempool.extend(sample_transactions(args.batch, prefix=f"B{block}"))
+
+                # Mining in isolation: header prefix of a fixed dummy block
+                prefix = audit.block_header_prefix("f" * 64, f"bench-{block}", "e" * 64)
+                difficulty = 0 if mode == "none" else args.difficulty
+                started = time.perf_counter()
+                _, _, tried = miner.mine(prefix, difficulty)
+                mining_time += time.perf_counter() - started
+                attempts += tried
+
+                started = time.perf_counter()
+                with quiet():
+                    chain.seal_block()
+                latencies.append(time.perf_counter() - started)
+            chain.close()
+
+        latencies.sort()
+        report(f"Mining: {mode} (difficulty {0 if mode == 'none' else args.difficulty}, "
+               f"{args.batch} tx/block)", [
+            ("hashes/sec", f"{attempts / mining_time:,.0f}" if mining_time else "n/a"),
+            ("seal latency mean, ms", f"{1000 * sum(latencies) / len(latencies):.1f}"),
+            ("seal latency p50, ms", f"{1000 * latencies[len(latencies) // 2]:.1f}"),
+            ("seal latency max, ms", f"{1000 * latencies[-1]:.1f}"),
+            ("tx/sec", f"{args.batch * len(latencies) / sum(latencies):,.0f}"),
+        ])
+
+
+@contextlib.contextmanager
+def registry_database():
+    """Temporary template-registry.db built by create_database.py; yields its path"""
+    create_database = load_tool("create_database")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "template-registry.db")
+        with quiet():
+            create_database.create_database(db_path)
+        yield db_path
+
+
+def ops_per_sec(func, count):
+    """Run func(i) count times, return ops/sec"""
+    with quiet():
+        started = time.perf_counter()
+        for i in range(count):
+            func(i)
+        elapsed = time.perf_counter() - started
+    return count / elapsed
+
+
+def bench_connections(args):
+    """Record / history / report ops/sec: per-call connect vs persistent connection"""
+    import sqlite3
+
+    audit = load_tool("blockchain-audit")
+    transactions = sample_transactions(args.ops, documents=max(1, args.ops // 10))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Before: every call opens its own connection with default pragmas
+        before_db = os.path.join(tmp, "before.db")
+        with quiet():
+            # The constructor no longer creates the schema; the baseline queries below need it
+            chain = audit.DOCScoinBlockchain(before_db)
+            chain.init_blockchain()
+            chain.close()
+
+        def record_before(i):
+            tx = transactions[i]
+            conn = sqlite3.connect(before_db)
+            last = conn.execute("SELECT data_hash FROM blocks ORDER BY block_number DESC LIMIT 1").fetchone()
+            cur = conn.execute(
+                "INSERT INTO blocks (previous_hash, timestamp, data_hash, merkle_root, nonce) VALUES (?, ?, ?, ?, 0)",
+                (last[0], tx["timestamp"], f"{i:064x}", f"{i:064x}"))
+            conn.execute(
+                f"INSERT INTO transactions (block_number, {', '.join(audit.TRANSACTION_FIELDS)}) "
+                f"VALUES (?, {', '.join('?' * len(audit.TRANSACTION_FIELDS))})",
+                [cur.lastrowid] + [tx.get(f, "") for f in audit.TRANSACTION_FIELDS])
+            conn.commit()
+            conn.close()
+
+        def history_before(i):
+            conn = sqlite3.connect(before_db)
+            conn.execute("""SELECT tx_id, operation_type, operator_id, timestamp, action, data_summary
+                FROM transactions WHERE document_id = ? ORDER BY timestamp""",
+                         (transactions[i]["document_id"],)).fetchall()
+            conn.close()
+
+        def report_before(i):
+            conn = sqlite3.connect(before_db)
+            conn.execute("SELECT * FROM transactions WHERE timestamp >= ? ORDER BY timestamp DESC",
+                         ("2025-01-15",)).fetchall()
+            conn.close()
+
+        # After: the real API on one long-lived connection, no PoW to isolate storage cost
+        after_db = os.path.join(tmp, "after.db")
+        with quiet():
+            chain = audit.DOCScoinBlockchain(after_db, max_block_transactions=1, miner="none")
+
+        rows = []
+        for name, before, after, count in (
+            ("record", record_before, lambda i: chain.submit_transaction(transactions[i]), args.ops),
+            ("history", history_before,
+             lambda i: chain.verify_document_history(transactions[i]["document_id"]), args.ops),
+            ("report", report_before,
+             lambda i: chain.generate_audit_report(start_date="2025-01-15"), max(1, args.ops // 20)),
+        ):
+            b = ops_per_sec(before, count)
+            a = ops_per_sec(after, count)
+            rows.append((f"{name} before, ops/sec", f"{b:,.0f}"))
+            rows.append((f"{name} after, ops/sec", f"{a:,.0f}  (x{a / b:.1f})"))
+        chain.close()
+
+    report(f"SQLite connection layer ({args.ops} operations)", rows)
+
+
+def bench_validator(args):
+    """Validations/sec: registry re-read and recompiled per call vs compiled plan"""
+    import json
+
+    validator_module = load_tool("validator")
+    with open(args.profile, encoding='utf-8') as f:
+        profile = json.load(f)
+
+    with registry_database() as db_path:
+        validator = validator_module.DOCScoinValidator(db_path)
+
+        def uncached(i):
+            validator.invalidate()
+            validator.validate_json(profile)
+
+        cold = ops_per_sec(uncached, args.ops)
+        warm = ops_per_sec(lambda i: validator.validate_json(profile), args.ops)
+        validator.close()
+
+    report(f"Validator ({Path(args.profile).name}, {args.ops} validations)", [
+        ("recompiled per call, val/sec", f"{cold:,.0f}"),
+        ("compiled plan, val/sec", f"{warm:,.0f}  (x{warm / cold:.1f})"),
+    ])
+
+
+def bench_signing(args):
+    """Signatures/sec: sign_data per document vs sign_many in one token session"""
+    import json
+
+    rutoken = load_tool("rutoken-signer")
+    with open(args.profile, encoding='utf-8') as f:
+        profile = json.load(f)
+    documents = [dict(profile, global_unique_id=f"doc-{i}") for i in range(args.documents)]
+
+    signer = rutoken.MockRutokenSigner()
+    single = ops_per_sec(lambda i: signer.sign_data(documents[i]), len(documents))
+
+    started = time.perf_counter()
+    records = list(signer.sign_many(documents))
+    batch = len(records) / (time.perf_counter() - started)
+
+    rows = [
+        ("sign_data, sig/sec", f"{single:,.0f}"),
+        ("sign_many, sig/sec", f"{batch:,.0f}  (x{batch / single:.1f})"),
+        ("record size full / compact, B", f"{len(json.dumps(signer.sign_data(documents[0])))} / "
+                                          f"{len(json.dumps(records[0]))}"),
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = []
+        for i in range(args.files):
+            path = Path(tmp) / f"export_{i}.bin"
+            path.write_bytes(os.urandom(args.file_mb * 1024 * 1024))
+            files.append(path)
+        started = time.perf_counter()
+        list(signer.sign_many(files))
+        elapsed = time.perf_counter() - started
+    rows.append((f"sign_many files ({args.file_mb} MiB), MiB/sec", f"{args.files * args.file_mb / elapsed:,.0f}"))
+
+    report(f"Signing ({args.documents} documents, one token session per sign_many call)", rows)
+
+
+def bench_canonical(args):
+    """Canonical JSON hashing: json.dumps + encode vs streaming canonical_json,
+    on a profile with embedded base64 attachments"""
+    import base64
+    import hashlib
+    import json
+    import tracemalloc
+
+    canonical_json = load_tool("canonical_json")
+    audit = load_tool("blockchain-audit")
+    rutoken = load_tool("rutoken-signer")
+
+    with open(args.profile, encoding='utf-8') as f:
+        profile = json.load(f)
+    profile["attachments"] = [{
+        "file_name": f"scan_{i}.pdf",
+        "content_base64": base64.b64encode(os.urandom(args.attachment_mb * 1024 * 1024)).decode()
+    } for i in range(args.attachments)]
+
+    def materialized():
+        return hashlib.sha256(json.dumps(profile, sort_keys=True).encode()).hexdigest()
+
+    def streaming():
+        return canonical_json.canonical_hash(profile).hexdigest()
+
+    rows = []
+    for name, func in (("json.dumps + encode", materialized), ("canonical_json", streaming)):
+        tracemalloc.start()
+        started = time.perf_counter()
+        digest = func()
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        rows.append((f"{name}, MiB/sec", f"{args.attachments * args.attachment_mb / elapsed:,.0f}"))
+        rows.append((f"{name}, peak MiB", f"{peak / 1024 / 1024:,.1f}"))
+
+    with quiet():
+        chain = audit.DOCScoinBlockchain(":memory:", miner="none")
+        chain_hash = chain.hash_data(profile)
+        chain.close()
+    signer_hash = rutoken.MockRutokenSigner().hash_payload(profile).hex()
+    rows.append(("same hash in all tools", str(digest == chain_hash == signer_hash == materialized())))
+
+    report(f"Canonical JSON hashing ({args.attachments} x {args.attachment_mb} MiB attachments)", rows)
+
+
+def bench_startup(args):
+    """Cold start of each tool in a fresh interpreter: import, construct, first operation"""
+    import json
+    import statistics
+    import subprocess
+
+    prelude = f"import sys; sys.path.insert(0, {str(TOOLS_DIR)!r}); from benchmark import load_tool, quiet\n"
+    with open(args.profile, encoding='utf-8') as f:
+        profile = json.load(f)
+
+    with registry_database() as db_path, tempfile.TemporaryDirectory() as tmp:
+        registry = load_tool("registry")
+        snapshot_path = os.path.join(tmp, "registry-snapshot.json")
+        registry.RegistrySnapshot.from_database(db_path).save(snapshot_path)
+        compiled_path = os.path.join(tmp, "registry.snap")
+        registry.compile_snapshot(registry.RegistrySnapshot.from_database(db_path), compiled_path)
+        profile_path = os.path.join(tmp, "profile.json")
+        with open(profile_path, 'w', encoding='utf-8') as f:
+            json.dump(profile, f)
+
+        chain_path = os.path.join(tmp, "audit.db")
+        with quiet():
+            load_tool("blockchain-audit").DOCScoinBlockchain(chain_path).init_blockchain()
+
+        load_profile = f"import json; profile = json.load(open({profile_path!r}))\n"
+        render = ".generate_from_template('{{GLOBAL:IDENTIFIER:GUID}} {{ENTERPRISE:EMPLOYEE:ID}}', profile)"
+        cases = [
+            ("python startup", "pass"),
+            ("blockchain: construct",
+             f"load_tool('blockchain-audit').DOCScoinBlockchain({chain_path!r})"),
+            ("blockchain: first history query",
+             f"c = load_tool('blockchain-audit').DOCScoinBlockchain({chain_path!r})\n"
+             f"with quiet(): c.verify_document_history('DOC-1')"),
+            ("validator: construct", f"load_tool('validator').DOCScoinValidator({db_path!r})"),
+            ("validator: validate (SQLite)",
+             load_profile + f"load_tool('validator').DOCScoinValidator({db_path!r}).validate_json(profile)"),
+            ("validator: validate (JSON snapshot)",
+             load_profile + f"load_tool('validator').DOCScoinValidator(snapshot={snapshot_path!r})"
+                            f".validate_json(profile)"),
+            ("validator: validate (mmap snapshot)",
+             load_profile + f"load_tool('validator').DOCScoinValidator(snapshot={compiled_path!r})"
+                            f".validate_json(profile)"),
+            ("generator: construct", f"load_tool('document-generator').DocumentGenerator({db_path!r})"),
+            ("generator: render (SQLite)",
+             load_profile + f"load_tool('document-generator').DocumentGenerator({db_path!r})" + render),
+            ("generator: render (JSON snapshot)",
+             load_profile + f"load_tool('document-generator').DocumentGenerator(snapshot={snapshot_path!r})" + render),
+            ("generator: render (mmap snapshot)",
+             load_profile + f"load_tool('document-generator').DocumentGenerator(snapshot={compiled_path!r})" + render),
+        ]
+
+        rows = []
+        for label, code in cases:
+            timings = []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                subprocess.run([sys.executable, "-c", prelude + code], check=True, cwd=tmp,
+                               stdout=subprocess.DEVNULL)
+                timings.append(time.perf_counter() - started)
+            rows.append((f"{label}, ms", f"{1000 * statistics.median(timings):.1f}"))
+
+    report(f"Cold start (median of {args.runs} fresh interpreters)", rows)
+
+
+def bench_checksums(args):
+    """National identifier checksums: one validate() call per value vs the column API,
+    pure Python and NumPy"""
+    import random
+
+    checksums = load_tool("checksums")
+    lengths = checksums.CHECKSUMS[args.kind].lengths or (10,)
+    generator = random.Random(42)
+    values = ["".join(generator.choices("0123456789", k=generator.choice(lengths))) for _ in range(args.rows)]
+
+    engines = [
+        ("validate() per value", lambda: [checksums.validate(args.kind, value) for value in values]),
+        ("validate_column, pure Python", lambda: checksums.validate_column(args.kind, values, use_numpy=False)),
+    ]
+    if checksums.np is not None:
+        engines.append(("validate_column, NumPy", lambda: checksums.validate_column(args.kind, values)))
+
+    rows, results = [], []
+    for name, func in engines:
+        started = time.perf_counter()
+        results.append(func())
+        elapsed = time.perf_counter() - started
+        rows.append((f"{name}, rows/sec", f"{args.rows / elapsed:,.0f}"))
+    rows.append(("valid rows", f"{sum(results[0]):,}"))
+    rows.append(("same results", str(all(result == results[0] for result in results))))
+
+    report(f"{args.kind} checksums ({args.rows:,} random identifiers)", rows)
+
+
+def bench_decryption(args):
+    """ENC[AES256_GCM] field values: a cipher context per value vs one shared context
+    (FieldDecryptor.reveal_many), cold and from the plaintext cache"""
+    field_crypto = load_tool("field_crypto")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        key_file = os.path.join(tmp, "field.key")
+        field_crypto.generate_key_file(key_file)
+        key = bytes(field_crypto.load_key(key_file))
+        decryptor = field_crypto.FieldDecryptor.from_key_file(key_file, max_entries=args.values)
+
+    cipher = field_crypto.AESGCMCipher(key)
+    values = [cipher.encrypt(f"{770000000000 + i}") for i in range(args.values)]
+
+    def context_per_value():
+        return [field_crypto.AESGCMCipher(key).decrypt(field_crypto.ENCRYPTED_RE.match(value).group(2)).decode()
+                for value in values]
+
+    rows, results = [], []
+    for name, func in (("cipher context per value", context_per_value),
+                       ("reveal_many, cold cache", lambda: decryptor.reveal_many(values)),
+                       ("reveal_many, warm cache", lambda: decryptor.reveal_many(values))):
+        started = time.perf_counter()
+        results.append(func())
+        elapsed = time.perf_counter() - started
+        rows.append((f"{name}, values/sec", f"{args.values / elapsed:,.0f}"))
+    rows.append(("same plaintexts", str(all(result == results[0] for result in results))))
+    decryptor.clear()
+
+    report(f"Field decryption ({args.values:,} values)", rows)
+
+
+def bench_storage(args):
+    """Ingest tx/sec, document history ops/sec and full verification time: SQLite vs segment log"""
+    audit = load_tool("blockchain-audit")
+    transactions = sample_transactions(args.transactions, documents=max(1, args.transactions // 10))
+    documents = [tx["document_id"] for tx in transactions[:args.lookups]]
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for storage in args.backends:
+            with quiet():
+                chain = audit.DOCScoinBlockchain(os.path.join(tmp, f"bench-{storage}"), storage=storage,
+                                                 max_block_transactions=args.batch, miner="none")
+                chain.init_blockchain()
+
+                started = time.perf_counter()
+                for tx in transactions:
+                    chain.submit_transaction(dict(tx))
+                chain.flush()
+                ingest = time.perf_counter() - started
+            history = ops_per_sec(lambda i: chain.verify_document_history(documents[i]), len(documents))
+            with quiet():
+                started = time.perf_counter()
+                result = chain.verify_chain(full=True, workers=args.workers)
+                verify = time.perf_counter() - started
+            chain.close()
+
+            rows.append((f"{storage} ingest, tx/sec", f"{args.transactions / ingest:,.0f}"))
+            rows.append((f"{storage} history, ops/sec", f"{history:,.0f}"))
+            rows.append((f"{storage} verify --full, s", f"{verify:.2f}  (valid: {result['valid']})"))
+
+    report(f"Chain storage ({args.transactions:,} transactions, {args.batch} tx/block)", rows)
+
+
+def bench_lookups(args):
+    """Document existence lookups: a history query per call vs the Bloom filter and history cache"""
+    audit = load_tool("blockchain-audit")
+    transactions = sample_transactions(args.documents * 2, documents=args.documents)
+    present = [tx["document_id"] for tx in transactions[:args.lookups]]
+    absent = [f"MISSING-{i:08d}" for i in range(args.lookups)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with quiet():
+            chain = audit.DOCScoinBlockchain(os.path.join(tmp, "bench.db"), storage=args.storage, miner="none",
+                                             history_cache_size=args.lookups)
+            for start in range(0, len(transactions), args.batch):
+                chain.mempool.extend(transactions[start:start + args.batch])
+                chain.seal_block()
+
+        started = time.perf_counter()
+        chain.has_document(absent[0])
+        build = time.perf_counter() - started
+
+        rows = [("filter build, s", f"{build:.2f}")]
+        # The history cache holds every present document after the first pass
+        for name, documents in (("absent", absent), ("present", present), ("repeat", present)):
+            query = ops_per_sec(lambda i: chain.store.document_history(documents[i]), len(documents))
+            lookup = ops_per_sec(lambda i: chain.has_document(documents[i]), len(documents))
+            rows.append((f"{name}, query, ops/sec", f"{query:,.0f}"))
+            rows.append((f"{name}, has_document, ops/sec", f"{lookup:,.0f}  (x{lookup / query:.1f})"))
+        rows.append(("store queries for absent documents", str(chain.lookup_stats["queried"] - len(set(present)))))
+        rows.append(("lookup stats", str(chain.lookup_stats)))
+        chain.close()
+
+    report(f"Document lookups ({args.storage}, {args.documents:,} documents, {args.lookups:,} lookups)", rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DOCScoin Benchmarks')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    mining = subparsers.add_parser('mining', help='Proof-of-work engines')
+    mining.add_argument('--modes', nargs='+', default=['single', 'parallel', 'none'])
+    mining.add_argument('--blocks', type=int, default=5)
+    mining.add_argument('--batch', type=int, default=100, help='Transactions per block')
+    mining.add_argument('--difficulty', type=int, default=4)
+    mining.add_argument('--workers', type=int, default=None)
+    mining.set_defaults(func=bench_mining)
+
+    connections = subparsers.add_parser('connections', help='Audit store connection layer')
+    connections.add_argument('--ops', type=int, default=2000)
+    connections.set_defaults(func=bench_connections)
+
+    validator = subparsers.add_parser('validator', help='DOCScoinValidator throughput')
+    validator.add_argument('--profile', type=str, default=str(REPO_DIR / 'examples' / 'basic-profile.json'))
+    validator.add_argument('--ops', type=int, default=20000)
+    validator.set_defaults(func=bench_validator)
+
+    signing = subparsers.add_parser('signing', help='MockRutokenSigner throughput')
+    signing.add_argument('--profile', type=str, default=str(REPO_DIR / 'examples' / 'basic-profile.json'))
+    signing.add_argument('--documents', type=int, default=20000)
+    signing.add_argument('--files', type=int, default=4)
+    signing.add_argument('--file-mb', type=int, default=16)
+    signing.set_defaults(func=bench_signing)
+
+    canonical = subparsers.add_parser('canonical', help='Canonical JSON hashing of large profiles')
+    canonical.add_argument('--profile', type=str, default=str(REPO_DIR / 'examples' / 'basic-profile.json'))
+    canonical.add_argument('--attachments', type=int, default=8)
+    canonical.add_argument('--attachment-mb', type=int, default=4)
+    canonical.set_defaults(func=bench_canonical)
+
+    startup = subparsers.add_parser('startup', help='Cold start time of each tool')
+    startup.add_argument('--profile', type=str, default=str(REPO_DIR / 'examples' / 'basic-profile.json'))
+    startup.add_argument('--runs', type=int, default=10)
+    startup.set_defaults(func=bench_startup)
+
+    checksums = subparsers.add_parser('checksums', help='National identifier checksum validation')
+    checksums.add_argument('--kind', type=str, default='RU:INN')
+    checksums.add_argument('--rows', type=int, default=1000000)
+    checksums.set_defaults(func=bench_checksums)
+
+    decryption = subparsers.add_parser('decryption', help='ENC[...] field decryption and plaintext cache')
+    decryption.add_argument('--values', type=int, default=100000)
+    decryption.set_defaults(func=bench_decryption)
+
+    storage = subparsers.add_parser('storage', help='Chain storage backends: SQLite vs segment log')
+    storage.add_argument('--backends', nargs='+', default=['sqlite', 'log'])
+    storage.add_argument('--transactions', type=int, default=100000)
+    storage.add_argument('--batch', type=int, default=100, help='Transactions per block')
+    storage.add_argument('--lookups', type=int, default=2000, help='Document history lookups')
+    storage.add_argument('--workers', type=int, default=1, help='Parallel workers for verification')
+    storage.set_defaults(func=bench_storage)
+
+    lookups = subparsers.add_parser('lookups', help='has_document / last_operation fast path')
+    lookups.add_argument('--storage', choices=['sqlite', 'log'], default='sqlite')
+    lookups.add_argument('--documents', type=int, default=100000)
+    lookups.add_argument('--lookups', type=int, default=10000)
+    lookups.add_argument('--batch', type=int, default=100, help='Transactions per block')
+    lookups.set_defaults(func=bench_lookups)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
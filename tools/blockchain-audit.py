@@ -7,21 +7,294 @@ DOCScoin Blockchain Audit System
 import sqlite3
 import hashlib
 import json
-from datetime import datetime
+import time
+import os
+import hmac
+import itertools
+import threading
+import csv
+import sys
+import queue
+import atexit
+import collections
+import gzip
+import heapq
+import zlib
+from concurrent.futures import Future, FIRST_COMPLETED, wait
+from datetime import datetime, date, timedelta
 import base64
 
-class DOCScoinBlockchain:
-    def __init__(self, db_path="audit-blockchain.db"):
-        self.db_path = db_path
-        self.init_blockchain()
+from canonical_json import canonical_hash
+from bloom import BloomFilter
+from segment_log import CorruptRecord, SegmentLog
+
+# Поля транзакции, которые хранятся в таблице transactions и входят в хэш листа
+TRANSACTION_FIELDS = (
+    "tx_id", "operation_type", "operator_id", "certificate_thumbprint",
+    "document_id", "action", "data_summary", "timestamp", "signature"
+)
+
+
+def make_export_transaction(operator_id, certificate_hash, document_id, data_summary):
+    """Транзакция экспорта документа.
+    Случайный суффикс tx_id исключает коллизии операций с одним документом в одну секунду"""
+    now = datetime.now()
+    return {
+        "tx_id": f"TX-{now.strftime('%Y%m%d%H%M%S')}-{hashlib.md5(document_id.encode()).hexdigest()[:8]}"
+                 f"-{os.urandom(6).hex()}",
+        "operation_type": "document_export",
+        "operator_id": operator_id,
+        "certificate_thumbprint": certificate_hash,
+        "document_id": document_id,
+        "action": "export",
+        "data_summary": data_summary,
+        "timestamp": now.isoformat()
+    }
+
+
+def transaction_hash(transaction):
+    """Хэш транзакции (лист дерева Меркла) по сохраняемым полям"""
+    leaf = {field: transaction.get(field) for field in TRANSACTION_FIELDS}
+    if leaf["signature"] is None:
+        leaf["signature"] = ""
+    return canonical_hash(leaf).hexdigest()
+
+
+def _hash_pair(left, right):
+    return hashlib.sha256(bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+
+def _merkle_levels(leaves):
+    """Все уровни дерева Меркла, от листьев к корню.
+    Нечетный последний узел уровня дублируется (как в Bitcoin)."""
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        if len(level) % 2:
+            level = level + [level[-1]]
+        levels.append([_hash_pair(level[i], level[i + 1]) for i in range(0, len(level), 2)])
+    return levels
+
+
+def merkle_root(leaves):
+    """Меркл-корень списка хэшей транзакций"""
+    if not leaves:
+        raise ValueError("Merkle root of an empty block is undefined")
+    return _merkle_levels(leaves)[-1][0]
+
+
+def merkle_proof(leaves, index, levels=None):
+    """Доказательство включения листа: список {"position", "hash"} от листа к корню.
+    levels — готовые уровни дерева, чтобы не пересчитывать их для каждого листа"""
+    proof = []
+    for level in (levels or _merkle_levels(leaves))[:-1]:
+        sibling = index ^ 1
+        if sibling >= len(level):
+            sibling = index  # дублированный узел
+        proof.append({
+            "position": "left" if sibling < index else "right",
+            "hash": level[sibling]
+        })
+        index //= 2
+    return proof
+
+
+def verify_merkle_proof(leaf, proof, root):
+    """Проверка доказательства включения листа в меркл-корень"""
+    node = leaf
+    for step in proof:
+        if step["position"] == "left":
+            node = _hash_pair(step["hash"], node)
+        else:
+            node = _hash_pair(node, step["hash"])
+    return node == root
+
+
+# ---------------------------------------------------------------------------
+# Proof-of-Work
+# ---------------------------------------------------------------------------
+
+DEFAULT_DIFFICULTY = 4
+
+
+def block_header_prefix(previous_hash, timestamp, merkle_root):
+    """Неизменная часть заголовка блока; к ней дописывается только nonce"""
+    return f"{previous_hash}|{timestamp}|{merkle_root}|".encode()
+
+
+def block_hash(prefix, nonce):
+    """Хэш заголовка блока для заданного nonce"""
+    return hashlib.sha256(prefix + str(nonce).encode()).hexdigest()
+
+
+def difficulty_target(difficulty):
+    """Целевое значение: хэш < target <=> difficulty ведущих нулей в hex"""
+    return 1 << (256 - 4 * difficulty)
+
+
+def _mine_range(prefix, difficulty, start, stop):
+    """Перебор nonce в диапазоне [start, stop).
+    Возвращает (nonce или None, число попыток)"""
+    target = difficulty_target(difficulty)
+    base = hashlib.sha256(prefix)  # состояние после префикса считается один раз
+    for nonce in range(start, stop):
+        h = base.copy()
+        h.update(str(nonce).encode())
+        if int.from_bytes(h.digest(), "big") < target:
+            return nonce, nonce - start + 1
+    return None, stop - start
+
+
+class SingleProcessMiner:
+    """Перебор nonce в текущем процессе"""
+    name = "single"
     
-    def init_blockchain(self):
-        """Инициализация блокчейна SQLite"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def __init__(self, chunk_size=1 << 16):
+        self.chunk_size = chunk_size
+    
+    def mine(self, prefix, difficulty):
+        """Возвращает (nonce, data_hash, attempts)"""
+        start, attempts = 0, 0
+        while True:
+            nonce, tried = _mine_range(prefix, difficulty, start, start + self.chunk_size)
+            attempts += tried
+            if nonce is not None:
+                return nonce, block_hash(prefix, nonce), attempts
+            start += self.chunk_size
+    
+    def close(self):
+        pass
+
+
+class ParallelMiner:
+    """Перебор nonce в пуле процессов: пространство nonce режется на куски"""
+    name = "parallel"
+    
+    def __init__(self, workers=None, chunk_size=1 << 15):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._pool = None
+    
+    def mine(self, prefix, difficulty):
+        if self._pool is None:
+            # Пул процессов импортируется лениво: он не нужен для быстрого старта
+            from concurrent.futures import ProcessPoolExecutor
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
         
+        next_start, attempts = 0, 0
+        pending = set()
+        found = None
+        while found is None:
+            # Держим в очереди по два куска на процесс
+            while len(pending) < self.workers * 2:
+                pending.add(self._pool.submit(
+                    _mine_range, prefix, difficulty, next_start, next_start + self.chunk_size
+                ))
+                next_start += self.chunk_size
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                nonce, tried = future.result()
+                attempts += tried
+                if nonce is not None and (found is None or nonce < found):
+                    found = nonce
+        
+        for future in pending:
+            future.cancel()
+        return found, block_hash(prefix, found), attempts
+    
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+class NoProofOfWork:
+    """Режим без PoW для доверенных инсталляций: difficulty = 0, nonce = 0"""
+    name = "none"
+    
+    def mine(self, prefix, difficulty):
+        return 0, block_hash(prefix, 0), 1
+    
+    def close(self):
+        pass
+
+
+MINERS = {
+    "single": SingleProcessMiner,
+    "parallel": ParallelMiner,
+    "none": NoProofOfWork,
+}
+
+
+def make_miner(miner):
+    """Движок майнинга по имени ("single", "parallel", "none") или готовый объект"""
+    if isinstance(miner, str):
+        if miner not in MINERS:
+            raise ValueError(f"Unknown miner: {miner}")
+        return MINERS[miner]()
+    return miner
+
+
+# ---------------------------------------------------------------------------
+# Подключение к SQLite
+# ---------------------------------------------------------------------------
+
+# Настройки соединения: WAL позволяет читать во время записи, synchronous=NORMAL
+# в режиме WAL сохраняет целостность при сбое ОС ценой последней транзакции
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # в КиБ: 64 МиБ
+    "temp_store": "MEMORY",
+}
+
+STATEMENT_CACHE_SIZE = 256
+
+
+def connect(db_path, pragmas=None):
+    """Соединение с аудит-базой с настроенными PRAGMA и кэшем подготовленных запросов"""
+    # Соединение используется одним потоком, но закрывается из close() любого потока
+    conn = sqlite3.connect(db_path, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+    for name, value in (SQLITE_PRAGMAS if pragmas is None else pragmas).items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+# ---------------------------------------------------------------------------
+# Схема базы
+# ---------------------------------------------------------------------------
+
+# Пересчет дневных агрегатов по сырым транзакциям
+ROLLUP_REBUILD_SQL = """
+INSERT INTO daily_rollups (day, operation_type, operator_id, action, count)
+SELECT substr(timestamp, 1, 10), operation_type, COALESCE(operator_id, ''), COALESCE(action, ''), COUNT(*)
+FROM transactions
+GROUP BY 1, 2, 3, 4
+"""
+
+ROLLUP_UPSERT_SQL = """
+INSERT INTO daily_rollups (day, operation_type, operator_id, action, count)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (day, operation_type, operator_id, action) DO UPDATE SET count = count + excluded.count
+"""
+
+
+def rollup_counts(transactions):
+    """Дневные агрегаты пачки транзакций: {(day, type, operator, action): count}"""
+    counts = {}
+    for tx in transactions:
+        key = (tx["timestamp"][:10], tx["operation_type"], tx.get("operator_id") or "", tx.get("action") or "")
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+# Миграции применяются по порядку; номер последней хранится в PRAGMA user_version
+SCHEMA_MIGRATIONS = [
+    # 1: базовая схема
+    (
         # Таблица блоков
-        cursor.execute("""
+        """
         CREATE TABLE IF NOT EXISTS blocks (
             block_number INTEGER PRIMARY KEY AUTOINCREMENT,
             previous_hash TEXT NOT NULL,
@@ -32,10 +305,9 @@ class DOCScoinBlockchain:
             difficulty INTEGER DEFAULT 4,
             miner TEXT DEFAULT 'DOCScoin-Audit-System'
         )
-        """)
-        
+        """,
         # Таблица транзакций (операций)
-        cursor.execute("""
+        """
         CREATE TABLE IF NOT EXISTS transactions (
             tx_id TEXT PRIMARY KEY,
             block_number INTEGER,
@@ -49,161 +321,1426 @@ class DOCScoinBlockchain:
             signature TEXT,
             FOREIGN KEY (block_number) REFERENCES blocks(block_number)
         )
-        """)
-        
-        # Генезис-блок (первый блок)
-        cursor.execute("SELECT COUNT(*) FROM blocks")
-        if cursor.fetchone()[0] == 0:
-            self.create_genesis_block(conn)
-        
-        conn.commit()
-        conn.close()
+        """,
+        # Индекс для потоковой сверки меркл-корней (транзакции блока по порядку)
+        "CREATE INDEX IF NOT EXISTS idx_transactions_block ON transactions (block_number)",
+        # Контрольные точки проверки цепочки (подписаны HMAC)
+        """
+        CREATE TABLE IF NOT EXISTS verification_checkpoints (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            height INTEGER NOT NULL,
+            block_hash TEXT NOT NULL,
+            verified_at DATETIME NOT NULL,
+            signature TEXT NOT NULL
+        )
+        """,
+    ),
+    # 2: индексы истории документа и отчетов аудита
+    (
+        "CREATE INDEX IF NOT EXISTS idx_transactions_document ON transactions (document_id, timestamp)",
+        # Покрывающий индекс: отчет считает типы и операторов, не читая строки таблицы
+        "CREATE INDEX IF NOT EXISTS idx_transactions_timestamp "
+        "ON transactions (timestamp, operation_type, operator_id)",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_operator ON transactions (operator_id, timestamp)",
+        "ANALYZE",
+    ),
+    # 3: индекс (timestamp) — порядок (timestamp, rowid) для постраничного обхода периода
+    (
+        "CREATE INDEX IF NOT EXISTS idx_transactions_time ON transactions (timestamp)",
+    ),
+    # 4: дневные агрегаты для отчетов (NULL-оператор хранится как '')
+    (
+        """
+        CREATE TABLE IF NOT EXISTS daily_rollups (
+            day TEXT NOT NULL,
+            operation_type TEXT NOT NULL,
+            operator_id TEXT NOT NULL,
+            action TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, operation_type, operator_id, action)
+        ) WITHOUT ROWID
+        """,
+        ROLLUP_REBUILD_SQL,
+    ),
+    # 5: архивы закрытых эпох (блоки и транзакции вынесены в сжатые файлы <db>.archive/)
+    (
+        """
+        CREATE TABLE IF NOT EXISTS archives (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            epoch TEXT NOT NULL UNIQUE,
+            path TEXT NOT NULL,
+            first_block INTEGER NOT NULL,
+            last_block INTEGER NOT NULL,
+            previous_hash TEXT NOT NULL,
+            last_hash TEXT NOT NULL,
+            first_timestamp TEXT,
+            last_timestamp TEXT,
+            transactions INTEGER NOT NULL,
+            merkle_root TEXT NOT NULL,
+            sha256 TEXT NOT NULL,
+            anchor_tx_id TEXT NOT NULL,
+            created_at DATETIME NOT NULL
+        )
+        """,
+        # Индекс документов архивов: история документа читает только его архивы
+        """
+        CREATE TABLE IF NOT EXISTS archive_documents (
+            document_id TEXT NOT NULL,
+            archive_id INTEGER NOT NULL,
+            PRIMARY KEY (document_id, archive_id)
+        ) WITHOUT ROWID
+        """,
+    ),
+    # 6: высота блоков старого формата (хэш JSON-данных блока, меркл-корень = хэш данных).
+    # Такие блоки идут подряд с генезиса; после архивации эпох их нет (старые эпохи не архивировались)
+    (
+        """
+        CREATE TABLE IF NOT EXISTS chain_metadata (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        """,
+        """
+        INSERT OR IGNORE INTO chain_metadata (key, value)
+        SELECT 'legacy_height', CASE WHEN EXISTS (SELECT 1 FROM archives) THEN 0 ELSE COALESCE(
+            (SELECT MIN(block_number) - 1 FROM blocks WHERE merkle_root != data_hash),
+            (SELECT MAX(block_number) FROM blocks),
+            0
+        ) END
+        """,
+    ),
+]
+
+
+HISTORY_QUERY = """
+SELECT tx_id, operation_type, operator_id, timestamp, action, data_summary
+FROM transactions
+WHERE document_id = ?
+ORDER BY timestamp
+"""
+HISTORY_FIELDS = ("tx_id", "operation_type", "operator_id", "timestamp", "action", "data_summary")
+
+
+# Поля строки потокового отчета и измерения группировки
+REPORT_FIELDS = (
+    "tx_id", "block_number", "timestamp", "operation_type", "operator_id",
+    "certificate_thumbprint", "document_id", "action", "data_summary"
+)
+
+REPORT_DIMENSIONS = {
+    "type": lambda tx: tx["operation_type"],
+    "operator": lambda tx: tx["operator_id"],
+    "action": lambda tx: tx["action"],
+    "document": lambda tx: tx["document_id"],
+    "hour": lambda tx: tx["timestamp"][:13],
+    "day": lambda tx: tx["timestamp"][:10],
+}
+
+
+# ---------------------------------------------------------------------------
+# Проверка целостности цепочки
+# ---------------------------------------------------------------------------
+
+GENESIS_PREVIOUS_HASH = "0" * 64
+
+_BLOCK_COLUMN_NAMES = ("block_number", "previous_hash", "timestamp", "data_hash", "merkle_root", "nonce", "difficulty")
+_BLOCK_COLUMNS = ", ".join(_BLOCK_COLUMN_NAMES)
+
+# Поля строки таблицы archives
+ARCHIVE_FIELDS = (
+    "id", "epoch", "path", "first_block", "last_block", "previous_hash", "last_hash",
+    "first_timestamp", "last_timestamp", "transactions", "merkle_root", "sha256", "anchor_tx_id", "created_at"
+)
+
+# Сколько разобранных архивов держать в памяти для истории документов
+ARCHIVE_CACHE_SIZE = 2
+
+
+class ArchiveError(ValueError):
+    """Файл архива эпохи отсутствует, поврежден или не совпадает с записью в таблице archives"""
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _merge_by_timestamp(sources):
+    """Слияние потоков транзакций по timestamp.
+    sources — (нижняя граница timestamp, функция, возвращающая поток) по возрастанию границы;
+    поток открывается, только когда слияние дошло до его границы"""
+    heap, pending, order = [], collections.deque(sources), itertools.count()
+    
+    def push(stream):
+        for tx in stream:
+            heapq.heappush(heap, (tx["timestamp"], next(order), tx, stream))
+            return
+    
+    while heap or pending:
+        while pending and (not heap or (pending[0][0] or "") <= heap[0][0]):
+            push(iter(pending.popleft()[1]()))
+        if not heap:
+            continue
+        _, _, tx, stream = heapq.heappop(heap)
+        yield tx
+        push(stream)
+
+
+def _verify_block(block, transactions, genesis_data_hash=None, legacy=False):
+    """Проверка одного блока: PoW-хэш заголовка, сложность, меркл-корень.
+    legacy — блок старого формата (до заголовков с меркл-корнем).
+    Возвращает список ошибок"""
+    errors = []
+    block_number, previous_hash, timestamp, data_hash, root, nonce, difficulty = block
+    
+    if previous_hash == GENESIS_PREVIOUS_HASH:
+        # Генезис: хэш равен хэшу данных генезис-транзакции
+        if data_hash != genesis_data_hash or root != data_hash:
+            errors.append("genesis block hash does not match genesis data")
+        return errors
+    
+    if legacy:
+        # Старый формат хэшировал JSON {transactions, timestamp, previous_block, nonce},
+        # но timestamp этого JSON в базе не сохранялся: пересчитать хэш нельзя.
+        # Проверяются сцепка (в _verify_range), сложность и форма блока
+        if root != data_hash:
+            errors.append("legacy block merkle root differs from data hash")
+        if int(data_hash, 16) >= difficulty_target(difficulty or DEFAULT_DIFFICULTY):
+            errors.append(f"block hash does not meet difficulty {difficulty}")
+        if len(transactions) != 1:
+            errors.append(f"legacy block has {len(transactions)} transactions, expected 1")
+        return errors
+    
+    if block_hash(block_header_prefix(previous_hash, timestamp, root), nonce) != data_hash:
+        errors.append("block header hash mismatch")
+    elif int(data_hash, 16) >= difficulty_target(difficulty or 0):
+        errors.append(f"block hash does not meet difficulty {difficulty}")
+    
+    if not transactions:
+        errors.append("block has no transactions")
+    elif merkle_root([transaction_hash(tx) for tx in transactions]) != root:
+        errors.append("merkle root mismatch")
+    return errors
+
+
+def _verify_range(store, first, last, expected_previous=None):
+    """Потоковая проверка блоков [first, last] хранилища.
+    Возвращает previous_hash первого блока, хэш последнего, число блоков и ошибки"""
+    errors = []
+    first_previous, last_hash, count = None, expected_previous, 0
+    expected_number = first
+    legacy_height = store.legacy_height()
+    try:
+        for block, transactions in store.iter_blocks(first, last):
+            block_number, previous_hash = block[0], block[1]
+            
+            if block_number != expected_number:
+                errors.append({"block_number": block_number,
+                               "error": f"missing blocks {expected_number}..{block_number - 1}"})
+            if count == 0:
+                first_previous = previous_hash
+            if last_hash is not None and previous_hash != last_hash:
+                errors.append({"block_number": block_number, "error": "previous_hash does not link to prior block"})
+            
+            genesis_hash = None
+            if previous_hash == GENESIS_PREVIOUS_HASH and transactions:
+                try:
+                    genesis_data = json.loads(transactions[0]["data_summary"])
+                    genesis_hash = canonical_hash(genesis_data).hexdigest()
+                except (TypeError, ValueError):
+                    pass
+            for error in _verify_block(block, transactions, genesis_hash, block_number <= legacy_height):
+                errors.append({"block_number": block_number, "error": error})
+            
+            last_hash = block[3]
+            expected_number = block_number + 1
+            count += 1
+    except (CorruptRecord, ArchiveError) as e:
+        # Поврежденная запись сегментного журнала или архива эпохи: дальше читать нельзя
+        errors.append({"block_number": expected_number, "error": f"storage: {e}"})
+    
+    return first_previous, last_hash, count, errors
+
+
+def _verify_range_worker(storage, path, first, last):
+    """_verify_range в процессе пула: хранилище открывается только на чтение"""
+    store = make_store(storage, path, readonly=True)
+    try:
+        return _verify_range(store, first, last)
+    finally:
+        store.close()
+
+
+# ---------------------------------------------------------------------------
+# Хранилища цепочки
+# ---------------------------------------------------------------------------
+#
+# Хранилище отвечает за блоки, транзакции и контрольные точки:
+#   tip() -> (block_number, data_hash, difficulty) | None
+#   append_block(block, transactions) -> block_number
+#   height(), block_hash(block_number)
+#   legacy_height() -> последний блок старого формата (0, если таких нет)
+#   changed() -> менялось ли хранилище с прошлого вызова (дешевая проверка без чтения блоков)
+#   iter_blocks(first, last) -> (кортеж _BLOCK_COLUMNS, [транзакции]) по порядку
+#   document_history(document_id) -> строки HISTORY_QUERY
+#   document_ids(first, last) -> document_id транзакций блоков [first, last]
+#   find_transaction(tx_id) -> (block_number, merkle_root, [транзакции блока]) | None
+#   checkpoints() (новые первыми), add_checkpoint(...)
+# Отчеты, дневные агрегаты и архивы эпох есть только в SQLite.
+
+def genesis_records():
+    """Генезис-блок и его единственная транзакция"""
+    now = datetime.now().isoformat()
+    genesis_data = {
+        "message": "DOCScoin Audit Blockchain Genesis Block",
+        "created": now,
+        "standard_version": "2.0.0"
+    }
+    data_hash = canonical_hash(genesis_data).hexdigest()
+    block = {
+        "previous_hash": GENESIS_PREVIOUS_HASH,  # Нулевой хэш для первого блока
+        "timestamp": now,
+        "data_hash": data_hash,
+        "merkle_root": data_hash,  # Для одного элемента меркл-корень = хэш данных
+        "nonce": 0,
+        "difficulty": DEFAULT_DIFFICULTY
+    }
+    transaction = dict.fromkeys(TRANSACTION_FIELDS)
+    transaction.update({
+        "tx_id": "GENESIS-TX-001",
+        "operation_type": "system",
+        "timestamp": now,
+        "action": "init",
+        "data_summary": json.dumps(genesis_data)
+    })
+    return block, transaction
+
+
+class SQLiteStore:
+    """Цепочка в SQLite: блоки, транзакции, дневные агрегаты, контрольные точки"""
+    name = "sqlite"
+    
+    def __init__(self, path, readonly=False):
+        self.path = path
+        # readonly: без миграций и генезиса (процессы пула проверки)
+        self.readonly = readonly
+        # Долгоживущие соединения: по одному на поток
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        # База открывается лениво: схема проверяется при первом соединении
+        self._schema_ready = readonly
+        self._schema_lock = threading.Lock()
+        # Разобранные архивы эпох для истории документов: archive id -> {document_id: [строки]}
+        self._archive_cache = collections.OrderedDict()
+        self._archive_lock = threading.Lock()
+    
+    def connection(self):
+        """Соединение текущего потока (открывается один раз и переиспользуется)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+            if not self._schema_ready:
+                self._init_schema(conn)
+        return conn
+    
+    def open(self):
+        self.connection()
+    
+    def close(self):
+        """Закрытие всех открытых соединений"""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+    
+    def _init_schema(self, conn):
+        """Применение недостающих миграций схемы — один раз на экземпляр.
+        Актуальная база стоит одного чтения PRAGMA user_version"""
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            # Номер примененной миграции хранится в PRAGMA user_version
+            if conn.execute("PRAGMA user_version").fetchone()[0] < len(SCHEMA_MIGRATIONS):
+                cursor = conn.cursor()
+                # Блокировка записи до повторного чтения версии: параллельный процесс не мигрирует ту же базу
+                cursor.execute("BEGIN IMMEDIATE")
+                version = cursor.execute("PRAGMA user_version").fetchone()[0]
+                for number, statements in enumerate(SCHEMA_MIGRATIONS[version:], start=version + 1):
+                    for statement in statements:
+                        cursor.execute(statement)
+                    cursor.execute(f"PRAGMA user_version = {number}")
+                
+                # Генезис-блок (первый блок)
+                if version == 0:
+                    cursor.execute("SELECT COUNT(*) FROM blocks")
+                    if cursor.fetchone()[0] == 0:
+                        self.create_genesis_block(conn)
+                
+                conn.commit()
+            self._schema_ready = True
     
     def create_genesis_block(self, conn):
         """Создание генезис-блока"""
-        genesis_data = {
-            "message": "DOCScoin Audit Blockchain Genesis Block",
-            "created": datetime.now().isoformat(),
-            "standard_version": "2.0.0"
-        }
-        
-        data_hash = self.hash_data(genesis_data)
-        
+        block, transaction = genesis_records()
         cursor = conn.cursor()
         cursor.execute("""
-        INSERT INTO blocks (previous_hash, timestamp, data_hash, merkle_root, nonce)
-        VALUES (?, ?, ?, ?, ?)
-        """, (
-            "0" * 64,  # Нулевой хэш для первого блока
-            datetime.now().isoformat(),
-            data_hash,
-            data_hash,  # Для одного элемента меркл-корень = хэш данных
-            0
-        ))
+        INSERT INTO blocks (previous_hash, timestamp, data_hash, merkle_root, nonce, difficulty)
+        VALUES (:previous_hash, :timestamp, :data_hash, :merkle_root, :nonce, :difficulty)
+        """, block)
         
         # Первая транзакция
         cursor.execute("""
         INSERT INTO transactions (tx_id, block_number, operation_type, timestamp, action, data_summary)
-        VALUES (?, ?, ?, ?, ?, ?)
-        """, (
-            "GENESIS-TX-001",
-            1,
-            "system",
-            datetime.now().isoformat(),
-            "init",
-            json.dumps(genesis_data)
-        ))
+        VALUES (:tx_id, 1, :operation_type, :timestamp, :action, :data_summary)
+        """, transaction)
+        cursor.execute("""
+        INSERT INTO daily_rollups (day, operation_type, operator_id, action, count)
+        SELECT substr(timestamp, 1, 10), operation_type, '', action, 1
+        FROM transactions WHERE tx_id = 'GENESIS-TX-001'
+        """)
+    
+    def tip(self):
+        return self.connection().execute(
+            "SELECT block_number, data_hash, difficulty FROM blocks ORDER BY block_number DESC LIMIT 1"
+        ).fetchone()
+    
+    def append_block(self, block, transactions):
+        """Блок, его транзакции и дневные агрегаты — одной транзакцией SQLite.
+        При ошибке транзакция откатывается: недописанный блок не попадет в следующий коммит"""
+        conn = self.connection()
+        cursor = conn.cursor()
+        
+        try:
+            # Добавляем блок
+            cursor.execute("""
+            INSERT INTO blocks (previous_hash, timestamp, data_hash, merkle_root, nonce, difficulty)
+            VALUES (:previous_hash, :timestamp, :data_hash, :merkle_root, :nonce, :difficulty)
+            """, block)
+            
+            block_number = cursor.lastrowid
+            
+            # Добавляем транзакции одной пачкой, в порядке листьев дерева
+            cursor.executemany("""
+            INSERT INTO transactions 
+            (tx_id, block_number, operation_type, operator_id, certificate_thumbprint, 
+             document_id, action, data_summary, timestamp, signature)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(
+                tx["tx_id"],
+                block_number,
+                tx["operation_type"],
+                tx["operator_id"],
+                tx["certificate_thumbprint"],
+                tx["document_id"],
+                tx["action"],
+                tx["data_summary"],
+                tx["timestamp"],
+                tx.get("signature", "")
+            ) for tx in transactions])
+            
+            # Дневные агрегаты обновляются в той же транзакции, что и блок
+            cursor.executemany(ROLLUP_UPSERT_SQL, [
+                (*key, count) for key, count in rollup_counts(transactions).items()
+            ])
+            
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return block_number
+    
+    def height(self):
+        return self.connection().execute("SELECT MAX(block_number) FROM blocks").fetchone()[0] or 0
+    
+    def changed(self):
+        # data_version меняется при коммитах других соединений, в том числе других процессов;
+        # значение своё у каждого соединения, поэтому хранится рядом с соединением потока
+        version = self.connection().execute("PRAGMA data_version").fetchone()[0]
+        changed = version != getattr(self._local, "data_version", None)
+        self._local.data_version = version
+        return changed
+    
+    def legacy_height(self):
+        row = self.connection().execute(
+            "SELECT value FROM chain_metadata WHERE key = 'legacy_height'"
+        ).fetchone()
+        return int(row[0]) if row else 0
+    
+    def block_hash(self, block_number):
+        row = self.connection().execute("SELECT data_hash FROM blocks WHERE block_number = ?",
+                                        (block_number,)).fetchone()
+        if row:
+            return row[0]
+        for archive in self.archives():
+            if archive["first_block"] <= block_number <= archive["last_block"]:
+                if block_number == archive["last_block"]:
+                    return archive["last_hash"]
+                for block in self._archive_blocks(archive):
+                    if block["block_number"] == block_number:
+                        return block["data_hash"]
+        return None
+    
+    def iter_blocks(self, first, last):
+        """Блоки [first, last] с транзакциями: сначала из архивов эпох,
+        затем из базы — merge-join двух упорядоченных курсоров"""
+        for archive in self.archives():
+            if archive["last_block"] < first or archive["first_block"] > last:
+                continue
+            for block in self._archive_blocks(archive):
+                if first <= block["block_number"] <= last:
+                    yield tuple(block[column] for column in _BLOCK_COLUMN_NAMES), block["transactions"]
+        
+        conn = self.connection()
+        blocks = conn.execute(f"""
+        SELECT {_BLOCK_COLUMNS} FROM blocks
+        WHERE block_number BETWEEN ? AND ? ORDER BY block_number
+        """, (first, last))
+        tx_cursor = conn.cursor()
+        tx_cursor.execute(f"""
+        SELECT block_number, {', '.join(TRANSACTION_FIELDS)} FROM transactions
+        WHERE block_number BETWEEN ? AND ? ORDER BY block_number, rowid
+        """, (first, last))
+        tx_groups = itertools.groupby(tx_cursor, key=lambda row: row[0])
+        pending_group = next(tx_groups, None)
+        
+        for block in blocks:
+            block_number = block[0]
+            transactions = []
+            while pending_group is not None and pending_group[0] <= block_number:
+                if pending_group[0] == block_number:
+                    transactions = [dict(zip(TRANSACTION_FIELDS, row[1:])) for row in pending_group[1]]
+                pending_group = next(tx_groups, None)
+            yield block, transactions
+    
+    def document_history(self, document_id):
+        conn = self.connection()
+        history = conn.execute(HISTORY_QUERY, (document_id,)).fetchall()
+        archive_ids = [row[0] for row in conn.execute(
+            "SELECT archive_id FROM archive_documents WHERE document_id = ?", (document_id,))]
+        if archive_ids:
+            archives = {archive["id"]: archive for archive in self.archives()}
+            for archive_id in archive_ids:
+                history.extend(self._archive_history(archives[archive_id]).get(document_id, ()))
+            history.sort(key=lambda row: row[3])
+        return history
+    
+    def document_ids(self, first, last):
+        rows = self.connection().execute("""
+        SELECT DISTINCT document_id FROM transactions
+        WHERE block_number BETWEEN ? AND ? AND document_id IS NOT NULL
+        UNION
+        SELECT document_id FROM archive_documents
+        WHERE archive_id IN (SELECT id FROM archives WHERE first_block <= ? AND last_block >= ?)
+        """, (first, last, last, first))
+        return (row[0] for row in rows)
+    
+    def find_transaction(self, tx_id):
+        conn = self.connection()
+        row = conn.execute("SELECT block_number FROM transactions WHERE tx_id = ?", (tx_id,)).fetchone()
+        if not row:
+            # Индекса по tx_id в архивах нет: проход архивов от новых к старым
+            for archive in reversed(self.archives()):
+                for block in self._archive_blocks(archive):
+                    if any(tx["tx_id"] == tx_id for tx in block["transactions"]):
+                        return block["block_number"], block["merkle_root"], block["transactions"]
+            return None
+        block_number = row[0]
+        root = conn.execute("SELECT merkle_root FROM blocks WHERE block_number = ?", (block_number,)).fetchone()[0]
+        rows = conn.execute(f"""
+        SELECT {', '.join(TRANSACTION_FIELDS)} FROM transactions
+        WHERE block_number = ? ORDER BY rowid
+        """, (block_number,))
+        return block_number, root, [dict(zip(TRANSACTION_FIELDS, r)) for r in rows]
+    
+    def checkpoints(self):
+        return self.connection().execute("""
+        SELECT height, block_hash, verified_at, signature FROM verification_checkpoints
+        ORDER BY id DESC
+        """)
+    
+    def add_checkpoint(self, height, block_hash_value, verified_at, signature):
+        conn = self.connection()
+        conn.execute("""
+        INSERT INTO verification_checkpoints (height, block_hash, verified_at, signature)
+        VALUES (?, ?, ?, ?)
+        """, (height, block_hash_value, verified_at, signature))
+        conn.commit()
+    
+    # --- Архивы эпох -------------------------------------------------------
+    
+    @property
+    def archive_dir(self):
+        return f"{self.path}.archive"
+    
+    def archives(self):
+        """Архивы эпох по возрастанию номеров блоков (словари ARCHIVE_FIELDS)"""
+        rows = self.connection().execute(f"SELECT {', '.join(ARCHIVE_FIELDS)} FROM archives ORDER BY first_block")
+        return [dict(zip(ARCHIVE_FIELDS, row)) for row in rows]
+    
+    def _archive_blocks(self, archive):
+        """Блоки архива по порядку. Файл сверяется с sha256 из таблицы archives до чтения,
+        число блоков и меркл-корень их хэшей — по окончании чтения"""
+        path = os.path.join(self.archive_dir, archive["path"])
+        hashes, trailer = [], None
+        try:
+            if _file_sha256(path) != archive["sha256"]:
+                raise ArchiveError(f"archive {archive['epoch']}: file checksum mismatch")
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if "archive" in record:
+                        trailer = record["archive"]
+                        continue
+                    hashes.append(record["data_hash"])
+                    yield record
+        except ArchiveError:
+            raise
+        except (OSError, EOFError, zlib.error, ValueError) as e:
+            raise ArchiveError(f"archive {archive['epoch']}: {e}") from None
+        
+        if (trailer is None or len(hashes) != archive["last_block"] - archive["first_block"] + 1
+                or merkle_root(hashes) != archive["merkle_root"]):
+            raise ArchiveError(f"archive {archive['epoch']}: blocks do not match the archived merkle root")
+    
+    def _archive_history(self, archive):
+        """{document_id: строки HISTORY_QUERY} архива; последние ARCHIVE_CACHE_SIZE архивов — в памяти"""
+        with self._archive_lock:
+            index = self._archive_cache.get(archive["id"])
+            if index is not None:
+                self._archive_cache.move_to_end(archive["id"])
+                return index
+        
+        index = {}
+        for block in self._archive_blocks(archive):
+            for tx in block["transactions"]:
+                if tx["document_id"]:
+                    index.setdefault(tx["document_id"], []).append(tuple(tx[field] for field in HISTORY_FIELDS))
+        with self._archive_lock:
+            self._archive_cache[archive["id"]] = index
+            while len(self._archive_cache) > ARCHIVE_CACHE_SIZE:
+                self._archive_cache.popitem(last=False)
+        return index
+    
+    def archived_transactions(self, start_date=None, end_date=None, end_inclusive=True, archives=None):
+        """Транзакции архивов (с block_number) с timestamp в [start_date, end_date]
+        или [start_date, end_date) — по архивам, в порядке блоков"""
+        for archive in self.archives() if archives is None else archives:
+            if start_date and archive["last_timestamp"] < start_date:
+                continue
+            if end_date and archive["first_timestamp"] > end_date:
+                continue
+            for block in self._archive_blocks(archive):
+                for tx in block["transactions"]:
+                    timestamp = tx["timestamp"]
+                    if start_date and timestamp < start_date:
+                        continue
+                    if end_date and (timestamp > end_date or (timestamp == end_date and not end_inclusive)):
+                        continue
+                    yield {**tx, "block_number": block["block_number"]}
+    
+    def closed_epochs(self, cutoff):
+        """Эпохи (календарные месяцы) блоков старше cutoff, не содержащие последний блок:
+        [(epoch, first_block, last_block)] по порядку"""
+        return self.connection().execute("""
+        SELECT substr(timestamp, 1, 7), MIN(block_number), MAX(block_number) FROM blocks
+        WHERE timestamp < ?
+        GROUP BY 1
+        HAVING MAX(block_number) < (SELECT MAX(block_number) FROM blocks)
+        ORDER BY 2
+        """, (cutoff,)).fetchall()
+    
+    def write_archive(self, epoch, first, last):
+        """Запись блоков [first, last] в сжатый файл <db>.archive/<epoch>.jsonl.gz только для чтения.
+        Строка на блок с транзакциями, последняя строка — сводка архива.
+        Возвращает описание для таблицы archives и множество document_id архива"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        name = f"{epoch}.jsonl.gz"
+        path = os.path.join(self.archive_dir, name)
+        tmp_path = f"{path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        
+        hashes, document_ids, timestamps = [], set(), []
+        previous_hash, transactions = None, 0
+        with open(tmp_path, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+                for block, block_transactions in self.iter_blocks(first, last):
+                    record = dict(zip(_BLOCK_COLUMN_NAMES, block))
+                    record["transactions"] = block_transactions
+                    f.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+                    if previous_hash is None:
+                        previous_hash = record["previous_hash"]
+                    hashes.append(record["data_hash"])
+                    for tx in block_transactions:
+                        if tx["document_id"]:
+                            document_ids.add(tx["document_id"])
+                    if block_transactions:
+                        timestamps.append(min(tx["timestamp"] for tx in block_transactions))
+                        timestamps.append(max(tx["timestamp"] for tx in block_transactions))
+                    transactions += len(block_transactions)
+                if len(hashes) != last - first + 1:
+                    raise ArchiveError(f"epoch {epoch}: blocks {first}..{last} are not all in the database")
+                
+                archive = {
+                    "epoch": epoch,
+                    "path": name,
+                    "first_block": first,
+                    "last_block": last,
+                    "previous_hash": previous_hash,
+                    "last_hash": hashes[-1],
+                    "first_timestamp": min(timestamps, default=None),
+                    "last_timestamp": max(timestamps, default=None),
+                    "transactions": transactions,
+                    "merkle_root": merkle_root(hashes)
+                }
+                f.write((json.dumps({"archive": archive}) + "\n").encode("utf-8"))
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, path)
+        archive["sha256"] = _file_sha256(path)
+        return archive, document_ids
+    
+    def prune_epoch(self, archive, document_ids):
+        """Регистрация архива и удаление его блоков и транзакций из базы — одной транзакцией.
+        Дневные агрегаты эпохи остаются в daily_rollups"""
+        conn = self.connection()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+        INSERT INTO archives ({', '.join(ARCHIVE_FIELDS[1:])})
+        VALUES ({', '.join('?' * (len(ARCHIVE_FIELDS) - 1))})
+        """, [archive.get(field) for field in ARCHIVE_FIELDS[1:]])
+        archive["id"] = cursor.lastrowid
+        cursor.executemany("INSERT OR IGNORE INTO archive_documents (document_id, archive_id) VALUES (?, ?)",
+                           [(document_id, archive["id"]) for document_id in document_ids])
+        cursor.execute("DELETE FROM transactions WHERE block_number BETWEEN ? AND ?",
+                       (archive["first_block"], archive["last_block"]))
+        cursor.execute("DELETE FROM blocks WHERE block_number BETWEEN ? AND ?",
+                       (archive["first_block"], archive["last_block"]))
+        conn.commit()
+    
+    def compact(self):
+        """Возврат освободившихся страниц: VACUUM и усечение WAL"""
+        conn = self.connection()
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+class SegmentLogStore:
+    """Цепочка в сегментном журнале (segment_log): только дозапись, чтение через mmap.
+    Блок с транзакциями — одна запись; контрольные точки — в checkpoints.jsonl"""
+    name = "log"
+    
+    def __init__(self, path, readonly=False, fsync=False):
+        self.path = path
+        self.readonly = readonly
+        self.fsync = fsync
+        self._log = None
+        self._lock = threading.Lock()
+        self._seen_end = None
+    
+    @property
+    def log(self):
+        """Журнал открывается лениво; пустой журнал начинается с генезис-блока"""
+        if self._log is None:
+            with self._lock:
+                if self._log is None:
+                    log = SegmentLog(self.path, readonly=self.readonly, fsync=self.fsync)
+                    if log.height == 0 and not self.readonly:
+                        block, transaction = genesis_records()
+                        log.append({**block, "transactions": [transaction]})
+                    self._log = log
+        return self._log
+    
+    def open(self):
+        return self.log
+    
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+    
+    def tip(self):
+        block = self.log.tip()
+        return (block["block_number"], block["data_hash"], block["difficulty"]) if block else None
+    
+    def append_block(self, block, transactions):
+        records = []
+        for tx in transactions:
+            record = {field: tx.get(field) for field in TRANSACTION_FIELDS}
+            record["signature"] = tx.get("signature", "")
+            records.append(record)
+        with self._lock:
+            return self.log.append({**block, "transactions": records})
+    
+    def height(self):
+        return self.log.height
+    
+    def legacy_height(self):
+        # Журнал появился позже старого формата блоков
+        return 0
+    
+    def changed(self):
+        # Конец журнала: дописывает его только владелец LOCK
+        end = self.log.end
+        changed, self._seen_end = end != self._seen_end, end
+        return changed
+    
+    def block_hash(self, block_number):
+        for block in self.log.blocks(block_number, block_number):
+            return block["data_hash"]
+        return None
+    
+    def iter_blocks(self, first, last):
+        for block in self.log.blocks(first, last):
+            yield tuple(block[column] for column in _BLOCK_COLUMN_NAMES), block["transactions"]
+        if self.log.corruption is not None:
+            raise self.log.corruption
+    
+    def document_history(self, document_id):
+        history = [
+            (tx["tx_id"], tx["operation_type"], tx["operator_id"], tx["timestamp"], tx["action"], tx["data_summary"])
+            for block in self.log.document_blocks(document_id)
+            for tx in block["transactions"] if tx["document_id"] == document_id
+        ]
+        history.sort(key=lambda row: row[3])
+        return history
+    
+    def document_ids(self, first, last):
+        for block in self.log.blocks(first, last):
+            for tx in block["transactions"]:
+                if tx["document_id"]:
+                    yield tx["document_id"]
+    
+    def find_transaction(self, tx_id):
+        # Индекса по tx_id нет: полный проход журнала
+        for block in self.log.blocks():
+            if any(tx["tx_id"] == tx_id for tx in block["transactions"]):
+                return block["block_number"], block["merkle_root"], block["transactions"]
+        return None
+    
+    def checkpoints(self):
+        try:
+            with open(os.path.join(self.path, "checkpoints.jsonl"), "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        rows = []
+        for line in reversed(lines):
+            try:
+                checkpoint = json.loads(line)
+                rows.append((checkpoint["height"], checkpoint["block_hash"],
+                             checkpoint["verified_at"], checkpoint["signature"]))
+            except (ValueError, KeyError):
+                continue  # оборванная строка
+        return rows
+    
+    def add_checkpoint(self, height, block_hash_value, verified_at, signature):
+        self.open()
+        with open(os.path.join(self.path, "checkpoints.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"height": height, "block_hash": block_hash_value,
+                                "verified_at": verified_at, "signature": signature}) + "\n")
+
+
+STORAGE_BACKENDS = {
+    "sqlite": SQLiteStore,
+    "log": SegmentLogStore,
+}
+
+# Путь по умолчанию для каждого хранилища
+DEFAULT_STORAGE_PATHS = {
+    "sqlite": "audit-blockchain.db",
+    "log": "audit-log",
+}
+
+
+def make_store(storage, path, readonly=False):
+    """Хранилище по имени ("sqlite", "log") или готовый объект"""
+    if isinstance(storage, str):
+        if storage not in STORAGE_BACKENDS:
+            raise ValueError(f"Unknown storage backend: {storage}")
+        return STORAGE_BACKENDS[storage](path, readonly=readonly)
+    return storage
+
+
+class DOCScoinBlockchain:
+    def __init__(self, db_path=None, max_block_transactions=100, max_block_age=5.0,
+                 miner="single", difficulty=None, storage="sqlite",
+                 document_capacity=1_000_000, history_cache_size=1024):
+        # Хранилище: "sqlite" (файл базы) или "log" (каталог сегментного журнала)
+        self.db_path = db_path or DEFAULT_STORAGE_PATHS.get(storage, DEFAULT_STORAGE_PATHS["sqlite"])
+        self.store = make_store(storage, self.db_path)
+        # Движок PoW; difficulty=None — берется из последнего блока цепочки
+        self.miner = make_miner(miner)
+        self.difficulty = difficulty
+        # Мемпул: транзакции ждут запечатывания в блок
+        self.max_block_transactions = max_block_transactions
+        self.max_block_age = max_block_age
+        self.mempool = []
+        self.mempool_since = None
+        self.last_mining_attempts = 0
+        # Мемпул запечатывается по размеру при постановке и по возрасту — фоновым потоком;
+        # остаток запечатывается в close() и при выходе из процесса
+        self._mempool_lock = threading.Condition(threading.RLock())
+        self._sealer = None
+        self._closing = False
+        self._exit_hook = False
+        # Фильтр Блума по document_id запечатанных блоков (<db>.bloom) и LRU-кэш истории документов.
+        # Строятся при первом запросе; отрицательный ответ фильтра не доходит до хранилища
+        self.document_capacity = document_capacity
+        self.history_cache_size = history_cache_size
+        self._documents = None
+        self._documents_tip = None
+        self._documents_dirty = False
+        self._history_cache = collections.OrderedDict()
+        self._history_generation = 0
+        self._documents_lock = threading.RLock()
+        self.lookup_stats = {"filtered": 0, "cached": 0, "queried": 0}
+    
+    def connection(self):
+        """Соединение текущего потока с SQLite (отчеты, агрегаты и архивы есть только в SQLite)"""
+        if not isinstance(self.store, SQLiteStore):
+            raise RuntimeError(f"Audit reports and archives need the sqlite storage backend, "
+                               f"not {self.store.name}")
+        return self.store.connection()
+    
+    def close_connections(self):
+        """Закрытие хранилища (соединений SQLite или файлов журнала)"""
+        self.store.close()
+    
+    def init_blockchain(self):
+        """Открытие хранилища и проверка схемы (иначе выполняется при первом обращении)"""
+        self.store.open()
     
     def hash_data(self, data):
-        """Хэширование данных"""
+        """Хэширование данных: dict — потоково по каноническому JSON (canonical_json)"""
         if isinstance(data, dict):
-            data_str = json.dumps(data, sort_keys=True)
-        else:
-            data_str = str(data)
-        
-        return hashlib.sha256(data_str.encode()).hexdigest()
+            return canonical_hash(data).hexdigest()
+        return hashlib.sha256(str(data).encode()).hexdigest()
     
-    def record_export_operation(self, operator_id, certificate_hash, document_id, data_summary):
-        """Запись операции экспорта в блокчейн"""
+    def record_export_operation(self, operator_id, certificate_hash, document_id, data_summary, wait=False):
+        """Запись операции экспорта в блокчейн (через мемпул). Возвращает tx_id.
         
-        # Создаем транзакцию
-        tx_id = f"TX-{datetime.now().strftime('%Y%m%d%H%M%S')}-{hashlib.md5(document_id.encode()).hexdigest()[:8]}"
+        Блок запечатывается по размеру мемпула или не позднее max_block_age секунд;
+        wait=True запечатывает мемпул сразу. Состояние записи — transaction_status(tx_id)"""
         
-        transaction = {
-            "tx_id": tx_id,
-            "operation_type": "document_export",
-            "operator_id": operator_id,
-            "certificate_thumbprint": certificate_hash,
-            "document_id": document_id,
-            "action": "export",
-            "data_summary": data_summary,
-            "timestamp": datetime.now().isoformat()
-        }
+        # Создаем транзакцию
+        transaction = make_export_transaction(operator_id, certificate_hash, document_id, data_summary)
+        tx_id = transaction["tx_id"]
         
-        # Добавляем в блок
-        self.add_transaction_to_block(transaction)
+        # Добавляем в мемпул; блок запечатается при достижении лимита
+        sealed = self.submit_transaction(transaction)
+        if sealed is None and wait:
+            sealed = self.flush()
         
-        print(f"✅ Операция экспорта зафиксирована в блокчейне: {tx_id}")
+        if sealed is None:
+            print(f"⏳ Операция экспорта ожидает запечатывания блока: {tx_id}")
+        else:
+            print(f"✅ Операция экспорта записана в блок #{sealed['block_number']}: {tx_id}")
         return tx_id
     
+    def transaction_status(self, tx_id):
+        """Состояние транзакции: {"tx_id", "status", "block_number"}.
+        status: "pending" — в мемпуле, "sealed" — в запечатанном блоке, "unknown" — не найдена"""
+        with self._mempool_lock:
+            if any(tx["tx_id"] == tx_id for tx in self.mempool):
+                return {"tx_id": tx_id, "status": "pending", "block_number": None}
+        found = self.store.find_transaction(tx_id)
+        if found is None:
+            return {"tx_id": tx_id, "status": "unknown", "block_number": None}
+        return {"tx_id": tx_id, "status": "sealed", "block_number": found[0]}
+    
+    def submit_transaction(self, transaction):
+        """Постановка транзакции в мемпул.
+        Возвращает результат seal_block(), если блок был запечатан, иначе None"""
+        with self._mempool_lock:
+            if not self.mempool:
+                self.mempool_since = time.monotonic()
+            self.mempool.append(transaction)
+            self._start_sealer()
+            
+            if self._mempool_full():
+                return self.seal_block()
+            self._mempool_lock.notify()
+            return None
+    
+    def _start_sealer(self):
+        """Фоновое запечатывание по возрасту мемпула и запечатывание остатка при выходе"""
+        if not self._exit_hook:
+            atexit.register(self.flush)
+            self._exit_hook = True
+        if self._sealer is None and self.max_block_age is not None and not self._closing:
+            self._sealer = threading.Thread(target=self._run_sealer, name="docscoin-block-sealer", daemon=True)
+            self._sealer.start()
+    
+    def _run_sealer(self):
+        with self._mempool_lock:
+            while not self._closing:
+                if not self.mempool:
+                    self._mempool_lock.wait()
+                    continue
+                remaining = self.mempool_since + self.max_block_age - time.monotonic()
+                if remaining > 0:
+                    self._mempool_lock.wait(remaining)
+                    continue
+                try:
+                    self.seal_block()
+                except Exception as e:
+                    # Транзакции остались в мемпуле: повтор не раньше чем через max_block_age
+                    print(f"❌ Не удалось запечатать блок: {e}", file=sys.stderr)
+                    self._mempool_lock.wait(self.max_block_age)
+    
+    def _seal_pending(self, matches):
+        """Запечатывание мемпула, если в нем есть подходящая транзакция (перед чтением истории)"""
+        with self._mempool_lock:
+            if any(matches(tx) for tx in self.mempool):
+                self.seal_block()
+    
+    def _mempool_full(self):
+        if len(self.mempool) >= self.max_block_transactions:
+            return True
+        return (self.max_block_age is not None and self.mempool_since is not None
+                and time.monotonic() - self.mempool_since >= self.max_block_age)
+    
+    def flush(self):
+        """Принудительное запечатывание ожидающих транзакций"""
+        with self._mempool_lock:
+            if not self.mempool:
+                return None
+            return self.seal_block()
+    
+    def close(self):
+        """Запечатывает остаток мемпула и останавливает движок майнинга"""
+        with self._mempool_lock:
+            self._closing = True
+            self._mempool_lock.notify_all()
+        if self._sealer is not None:
+            self._sealer.join()
+            self._sealer = None
+        result = self.flush()
+        if self._exit_hook:
+            atexit.unregister(self.flush)
+            self._exit_hook = False
+        self.miner.close()
+        self.save_document_filter()
+        self.close_connections()
+        return result
+    
+    def _discard_pending(self, transactions):
+        """Удаление из мемпула транзакций, чей блок не был записан (остальные остаются)"""
+        discarded = {id(transaction) for transaction in transactions}
+        with self._mempool_lock:
+            self.mempool = [tx for tx in self.mempool if id(tx) not in discarded]
+            if not self.mempool:
+                self.mempool_since = None
+    
     def add_transaction_to_block(self, transaction):
-        """Добавление транзакции в новый блок"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """Добавление транзакции в новый блок (без ожидания мемпула)"""
+        with self._mempool_lock:
+            self.mempool.append(transaction)
+            return self.seal_block()["block_number"]
+    
+    def seal_block(self):
+        """Запечатывание всех транзакций мемпула в один блок.
+        Возвращает номер блока, меркл-корень и доказательства включения по tx_id"""
+        with self._mempool_lock:
+            return self._seal_block()
+    
+    def _seal_block(self):
+        # Мемпул очищается только после записи блока: при ошибке майнинга или хранилища
+        # транзакции остаются в нем (вызывающий держит _mempool_lock)
+        transactions = self.mempool
+        if not transactions:
+            raise ValueError("Mempool is empty, nothing to seal")
+        
+        leaves = [transaction_hash(tx) for tx in transactions]
+        levels = _merkle_levels(leaves)
+        root = levels[-1][0]
         
         # Получаем последний блок
-        cursor.execute("SELECT block_number, data_hash FROM blocks ORDER BY block_number DESC LIMIT 1")
-        last_block = cursor.fetchone()
+        last_block = self.store.tip()
         
-        # Создаем новый блок (упрощенный Proof-of-Stake)
+        # Заголовок блока: транзакции входят в него через меркл-корень
         previous_hash = last_block[1] if last_block else "0" * 64
-        block_data = {
-            "transactions": [transaction],
-            "timestamp": datetime.now().isoformat(),
-            "previous_block": previous_hash
+        timestamp = datetime.now().isoformat()
+        if isinstance(self.miner, NoProofOfWork):
+            difficulty = 0
+        elif self.difficulty is not None:
+            difficulty = self.difficulty
+        elif last_block and last_block[2]:
+            difficulty = last_block[2]
+        else:
+            difficulty = DEFAULT_DIFFICULTY
+        
+        # "Майним" блок: хэшируется только префикс заголовка + nonce
+        prefix = block_header_prefix(previous_hash, timestamp, root)
+        nonce, data_hash, attempts = self.miner.mine(prefix, difficulty)
+        self.last_mining_attempts = attempts
+        
+        block_number = self.store.append_block({
+            "previous_hash": previous_hash,
+            "timestamp": timestamp,
+            "data_hash": data_hash,
+            "merkle_root": root,
+            "nonce": nonce,
+            "difficulty": difficulty
+        }, transactions)
+        self.mempool, self.mempool_since = [], None
+        self._index_documents(block_number, data_hash, transactions)
+        
+        print(f"⛏️  Блок #{block_number} запечатан: {len(transactions)} транзакций")
+        
+        return {
+            "block_number": block_number,
+            "data_hash": data_hash,
+            "merkle_root": root,
+            "proofs": {
+                tx["tx_id"]: merkle_proof(leaves, index, levels)
+                for index, tx in enumerate(transactions)
+            }
+        }
+    
+    def get_inclusion_proof(self, tx_id):
+        """Доказательство включения транзакции в свой блок (ожидающая транзакция запечатывается)"""
+        self._seal_pending(lambda tx: tx["tx_id"] == tx_id)
+        found = self.store.find_transaction(tx_id)
+        if not found:
+            return None
+        block_number, root, transactions = found
+        
+        tx_ids = [tx["tx_id"] for tx in transactions]
+        leaves = [transaction_hash(tx) for tx in transactions]
+        index = tx_ids.index(tx_id)
+        
+        return {
+            "tx_id": tx_id,
+            "block_number": block_number,
+            "leaf": leaves[index],
+            "merkle_root": root,
+            "proof": merkle_proof(leaves, index)
         }
+    
+    def _checkpoint_key(self):
+        """Ключ HMAC для контрольных точек: DOCSCOIN_CHECKPOINT_KEY или файл <db>.key"""
+        key = os.environ.get("DOCSCOIN_CHECKPOINT_KEY")
+        if key:
+            return key.encode()
+        key_path = f"{self.db_path}.key"
+        if not os.path.exists(key_path):
+            with open(key_path, "wb") as f:
+                f.write(os.urandom(32).hex().encode())
+            os.chmod(key_path, 0o600)
+        with open(key_path, "rb") as f:
+            return f.read().strip()
+    
+    def _sign_checkpoint(self, height, block_hash_value, verified_at):
+        message = f"{height}|{block_hash_value}|{verified_at}".encode()
+        return hmac.new(self._checkpoint_key(), message, hashlib.sha256).hexdigest()
+    
+    def last_checkpoint(self):
+        """Последняя контрольная точка с корректной подписью (или None)"""
+        checkpoint = None
+        for height, block_hash_value, verified_at, signature in self.store.checkpoints():
+            expected = self._sign_checkpoint(height, block_hash_value, verified_at)
+            if hmac.compare_digest(expected, signature):
+                checkpoint = {"height": height, "block_hash": block_hash_value, "verified_at": verified_at}
+                break
+        return checkpoint
+    
+    def _record_checkpoint(self, height, block_hash_value):
+        verified_at = datetime.now().isoformat()
+        self.store.add_checkpoint(height, block_hash_value, verified_at,
+                                  self._sign_checkpoint(height, block_hash_value, verified_at))
+        return {"height": height, "block_hash": block_hash_value, "verified_at": verified_at}
+    
+    def verify_chain(self, full=False, workers=1):
+        """Проверка целостности цепочки.
         
-        data_hash = self.hash_data(block_data)
+        По умолчанию проверяются только блоки после последней подписанной
+        контрольной точки; full=True перепроверяет всю цепочку, при workers > 1
+        диапазоны блоков пересчитываются параллельно. При успехе записывается
+        новая контрольная точка."""
+        height = self.store.height()
         
-        # "Майним" блок (упрощенно)
-        nonce = 0
-        while not data_hash.startswith("0000"):  # Упрощенная сложность
-            nonce += 1
-            block_data["nonce"] = nonce
-            data_hash = self.hash_data(block_data)
+        start, expected_previous, errors = 1, None, []
+        checkpoint = None if full else self.last_checkpoint()
+        if checkpoint:
+            # Блок контрольной точки должен остаться неизменным
+            if self.store.block_hash(checkpoint["height"]) == checkpoint["block_hash"]:
+                start, expected_previous = checkpoint["height"] + 1, checkpoint["block_hash"]
+            else:
+                errors.append({"block_number": checkpoint["height"],
+                               "error": "checkpoint block was modified, falling back to full verification"})
         
-        # Добавляем блок
-        cursor.execute("""
-        INSERT INTO blocks (previous_hash, timestamp, data_hash, merkle_root, nonce)
-        VALUES (?, ?, ?, ?, ?)
-        """, (
-            previous_hash,
-            datetime.now().isoformat(),
-            data_hash,
-            data_hash,  # Упрощенный меркл-корень
-            nonce
-        ))
-        
-        block_number = cursor.lastrowid
-        
-        # Добавляем транзакцию
-        cursor.execute("""
-        INSERT INTO transactions 
-        (tx_id, block_number, operation_type, operator_id, certificate_thumbprint, 
-         document_id, action, data_summary, timestamp, signature)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            transaction["tx_id"],
-            block_number,
-            transaction["operation_type"],
-            transaction["operator_id"],
-            transaction["certificate_thumbprint"],
-            transaction["document_id"],
-            transaction["action"],
-            transaction["data_summary"],
-            transaction["timestamp"],
-            transaction.get("signature", "")
-        ))
+        if start > height:
+            tip_hash, verified = expected_previous, 0
+        elif workers > 1 and height - start + 1 >= workers:
+            # Диапазоны проверяются независимо, затем сшиваются по границам
+            step = (height - start + 1 + workers - 1) // workers
+            ranges = [(first, min(first + step - 1, height)) for first in range(start, height + 1, step)]
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_verify_range_worker, itertools.repeat(self.store.name),
+                                        itertools.repeat(self.db_path),
+                                        [r[0] for r in ranges], [r[1] for r in ranges]))
+            tip_hash, verified = expected_previous, 0
+            for (first, _), (first_previous, last_hash, count, range_errors) in zip(ranges, results):
+                if tip_hash is not None and first_previous is not None and first_previous != tip_hash:
+                    errors.append({"block_number": first, "error": "previous_hash does not link to prior block"})
+                errors.extend(range_errors)
+                tip_hash = last_hash if last_hash is not None else tip_hash
+                verified += count
+        else:
+            _, tip_hash, verified, range_errors = _verify_range(self.store, start, height, expected_previous)
+            errors.extend(range_errors)
         
-        conn.commit()
-        conn.close()
+        if full and isinstance(self.store, SQLiteStore):
+            errors.extend(self.verify_archives())
         
-        return block_number
+        result = {
+            "valid": not errors,
+            "verified_from": start,
+            "height": height,
+            "tip_hash": tip_hash,
+            "blocks_verified": verified,
+            "errors": errors,
+            "checkpoint": None
+        }
+        if not errors and height:
+            result["checkpoint"] = self._record_checkpoint(height, tip_hash)
+        
+        if errors:
+            print(f"❌ Цепочка повреждена: {len(errors)} ошибок (проверено блоков: {verified})")
+            for error in errors[:20]:
+                print(f"   • Блок #{error['block_number']}: {error['error']}")
+        elif verified == 0:
+            print(f"✅ Цепочка целостна: новых блоков после #{height} нет")
+        else:
+            print(f"✅ Цепочка целостна: блоки {start}..{height} (проверено: {verified})")
+        return result
     
-    def verify_document_history(self, document_id):
-        """Проверка истории операций с документом"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def archive_epochs(self, before=None, compact=True):
+        """Архивация закрытых эпох (календарных месяцев) в сжатые файлы только для чтения.
         
-        cursor.execute("""
-        SELECT tx_id, operation_type, operator_id, timestamp, action, data_summary
-        FROM transactions 
-        WHERE document_id = ? 
-        ORDER BY timestamp
-        """, (document_id,))
+        Эпоха закрыта, если все ее блоки старше начала месяца before (по умолчанию —
+        текущего) и среди них нет последнего блока цепочки. Меркл-корень хэшей блоков
+        эпохи закрепляется в цепочке транзакцией archive, затем блоки и транзакции эпохи
+        удаляются из базы; compact=True после этого сжимает файл базы.
+        История документов, отчеты и проверка цепочки читают архивы прозрачно."""
+        self.connection()  # архивы есть только у SQLite
+        self.flush()
+        cutoff = date.today().replace(day=1)
+        if before:
+            cutoff = min(cutoff, date.fromisoformat(before[:10]).replace(day=1))
+        
+        archived = []
+        archived_to = max((archive["last_block"] for archive in self.store.archives()), default=0)
+        for epoch, first, last in self.store.closed_epochs(cutoff.isoformat()):
+            if first != archived_to + 1:
+                raise ValueError(f"Epoch {epoch} (blocks {first}..{last}) does not continue "
+                                 f"the archived chain at block #{archived_to}")
+            # В архив попадают только целые блоки
+            _, _, _, errors = _verify_range(self.store, first, last)
+            if errors:
+                raise ValueError(f"Epoch {epoch} failed verification and was not archived: "
+                                 f"block #{errors[0]['block_number']}: {errors[0]['error']}")
+            
+            archive, document_ids = self.store.write_archive(epoch, first, last)
+            
+            # Якорь архива в живой цепочке
+            anchor = dict.fromkeys(TRANSACTION_FIELDS)
+            anchor.update({
+                "tx_id": f"ARCHIVE-{epoch}-{os.urandom(6).hex()}",
+                "operation_type": "system",
+                "action": "archive",
+                "data_summary": json.dumps({field: archive[field] for field in (
+                    "epoch", "first_block", "last_block", "last_hash", "transactions", "merkle_root", "sha256")}),
+                "timestamp": datetime.now().isoformat(),
+                "signature": ""
+            })
+            try:
+                self.add_transaction_to_block(anchor)
+            except Exception:
+                # Блок не записан: без строки archives якорь не нужен
+                self._discard_pending([anchor])
+                raise
+            
+            archive["anchor_tx_id"] = anchor["tx_id"]
+            archive["created_at"] = anchor["timestamp"]
+            self.store.prune_epoch(archive, document_ids)
+            archived.append(archive)
+            archived_to = last
+            print(f"🗄️  Эпоха {epoch} архивирована: блоки {first}..{last}, "
+                  f"транзакций: {archive['transactions']} → {archive['path']}")
+        
+        if archived and compact:
+            self.store.compact()
+        return archived
+    
+    def verify_archives(self):
+        """Сверка архивов эпох с их транзакциями-якорями в цепочке.
+        Содержимое файлов сверяется с таблицей archives при чтении блоков"""
+        errors = []
+        for archive in self.store.archives():
+            anchor = None
+            found = self.store.find_transaction(archive["anchor_tx_id"])
+            if found:
+                for tx in found[2]:
+                    if tx["tx_id"] == archive["anchor_tx_id"]:
+                        anchor = json.loads(tx["data_summary"])
+            if anchor is None:
+                errors.append({"block_number": archive["first_block"],
+                               "error": f"archive {archive['epoch']}: anchor transaction not found"})
+            elif any(anchor.get(field) != archive[field]
+                     for field in ("first_block", "last_block", "last_hash", "merkle_root", "sha256")):
+                errors.append({"block_number": archive["first_block"],
+                               "error": f"archive {archive['epoch']} does not match its anchor transaction"})
+        return errors
+    
+    def query_plans(self):
+        """EXPLAIN QUERY PLAN для запросов истории и отчета.
+        Возвращает {запрос: [строки плана]} и список запросов с полным сканированием"""
+        conn = self.connection()
+        queries = {"history": (HISTORY_QUERY, ("DOC",))}
+        for name, query in self._report_queries("2025-01-01", "2025-12-31").items():
+            queries[f"report_{name}"] = query
+        for name, query in self._report_queries("2025-01-01").items():
+            queries[f"report_{name}_open_end"] = query
+        queries["report_page"] = (
+            "SELECT rowid, tx_id FROM transactions WHERE (timestamp, rowid) > (?, ?) "
+            "AND timestamp <= ? ORDER BY timestamp, rowid LIMIT ?", ("2025-01-01", -1, "2025-12-31", 1000)
+        )
+        
+        plans, full_scans = {}, []
+        for name, (query, params) in queries.items():
+            plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+            plans[name] = plan
+            # "SCAN transactions" (в том числе по индексу) = полный проход
+            if any(step.startswith("SCAN transactions") for step in plan):
+                full_scans.append(name)
+        return plans, full_scans
+    
+    def _document_filter(self):
+        """Фильтр Блума документов: загрузка из <db>.bloom и догрузка блоков, запечатанных после него.
+        Отсутствующий, чужой (хэш блока не совпал) или переполненный фильтр строится заново по всей цепочке"""
+        with self._documents_lock:
+            if self._documents is not None:
+                return self._documents
+            path = f"{self.db_path}.bloom"
+            height = self.store.height()
+            bloom, first = None, 1
+            try:
+                bloom, covered, covered_hash = BloomFilter.load(path)
+                if covered <= height and not bloom.saturated and self.store.block_hash(covered) == covered_hash:
+                    first = covered + 1
+                else:
+                    bloom = None
+            except (OSError, ValueError):
+                pass
+            
+            document_ids = set(self.store.document_ids(first, height)) if first <= height else set()
+            if bloom is None or bloom.count + len(document_ids) > bloom.capacity:
+                if bloom is not None:
+                    document_ids = set(self.store.document_ids(1, height))
+                bloom = BloomFilter(max(self.document_capacity, 2 * len(document_ids)))
+            bloom.update(document_ids)
+            
+            self._documents = bloom
+            self._documents_tip = (height, self.store.block_hash(height) if height else None)
+            self._documents_dirty = bool(document_ids) or first == 1
+            self.save_document_filter()
+            return bloom
+    
+    def _index_documents(self, block_number, data_hash, transactions):
+        """Новый блок: документы — в фильтр, их история — из кэша"""
+        with self._documents_lock:
+            if self._documents is None:
+                return  # фильтр еще не загружен: блок войдет в него при загрузке
+            for tx in transactions:
+                document_id = tx.get("document_id")
+                if document_id:
+                    self._documents.add(document_id)
+                    self._history_cache.pop(document_id, None)
+            self._history_generation += 1
+            self._documents_tip = (block_number, data_hash)
+            self._documents_dirty = True
+    
+    def _catch_up_documents(self):
+        """Блоки, запечатанные другими процессами после загрузки фильтра: документы — в фильтр,
+        их истории — из кэша. Без изменений хранилища стоит одной дешевой проверки (store.changed)"""
+        if not self.store.changed():
+            return
+        with self._documents_lock:
+            covered, height = self._documents_tip[0], self.store.height()
+            if height <= covered:
+                return
+            for document_id in set(self.store.document_ids(covered + 1, height)):
+                self._documents.add(document_id)
+                self._history_cache.pop(document_id, None)
+            self._history_generation += 1
+            self._documents_tip = (height, self.store.block_hash(height))
+            self._documents_dirty = True
+    
+    def save_document_filter(self):
+        """Сохранение фильтра Блума рядом с базой (если он менялся с последнего сохранения)"""
+        with self._documents_lock:
+            if self._documents is None or not self._documents_dirty:
+                return
+            height, block_hash = self._documents_tip
+            self._documents.save(f"{self.db_path}.bloom", height, block_hash)
+            self._documents_dirty = False
+    
+    def document_history(self, document_id):
+        """История операций с документом (строки HISTORY_QUERY) без вывода.
+        Документы вне фильтра Блума отсекаются без обращения к хранилищу; недавние истории — из LRU-кэша.
+        Блоки других процессов догружаются в фильтр, если хранилище изменилось;
+        ожидающая в мемпуле операция с документом сначала запечатывается"""
+        self._seal_pending(lambda tx: tx.get("document_id") == document_id)
+        # Проверка фильтра без блокировки: бит, выставляемый параллельным seal_block, равносилен
+        # запросу, пришедшему до запечатывания блока
+        documents = self._documents or self._document_filter()
+        self._catch_up_documents()
+        if document_id not in documents:
+            self.lookup_stats["filtered"] += 1
+            return []
+        with self._documents_lock:
+            history = self._history_cache.get(document_id)
+            if history is not None:
+                self._history_cache.move_to_end(document_id)
+                self.lookup_stats["cached"] += 1
+                return list(history)
+            generation = self._history_generation
+            self.lookup_stats["queried"] += 1
         
-        history = cursor.fetchall()
-        conn.close()
+        history = tuple(self.store.document_history(document_id))
+        with self._documents_lock:
+            # Пока шел запрос, мог появиться блок с этим документом: такой результат не кэшируем
+            if generation == self._history_generation and self.history_cache_size:
+                self._history_cache[document_id] = history
+                while len(self._history_cache) > self.history_cache_size:
+                    self._history_cache.popitem(last=False)
+        return list(history)
+    
+    def has_document(self, document_id):
+        """Есть ли операции с документом в запечатанных блоках"""
+        return bool(self.document_history(document_id))
+    
+    def last_operation(self, document_id):
+        """Последняя операция с документом (словарь HISTORY_FIELDS) или None"""
+        history = self.document_history(document_id)
+        return dict(zip(HISTORY_FIELDS, history[-1])) if history else None
+    
+    def verify_document_history(self, document_id):
+        """Проверка истории операций с документом"""
+        history = self.document_history(document_id)
         
         if not history:
             print(f"📭 Документ {document_id} не найден в блокчейне")
@@ -215,53 +1752,351 @@ class DOCScoinBlockchain:
         
         return history
     
-    def generate_audit_report(self, start_date=None, end_date=None):
-        """Генерация отчета аудита"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        query = "SELECT * FROM transactions WHERE 1=1"
-        params = []
-        
+    def _report_filter(self, start_date=None, end_date=None):
+        """Условие WHERE по периоду отчета"""
+        where, params = [], []
         if start_date:
-            query += " AND timestamp >= ?"
+            where.append("timestamp >= ?")
             params.append(start_date)
         if end_date:
-            query += " AND timestamp <= ?"
+            where.append("timestamp <= ?")
             params.append(end_date)
+        return (" WHERE " + " AND ".join(where)) if where else "", params
+    
+    def _report_queries(self, start_date=None, end_date=None):
+        """Запросы отчета аудита по сырым транзакциям: агрегирование выполняется в SQL"""
+        where, params = self._report_filter(start_date, end_date)
+        return self._aggregate_queries(where, params)
+    
+    def _aggregate_queries(self, where, params):
+        # При фильтре по периоду унарный "+" не дает планировщику выбрать полный
+        # проход по индексу группировки вместо поиска по диапазону timestamp
+        group = "+" if where else ""
+        return {
+            "total": (f"SELECT COUNT(*) FROM transactions{where}", params),
+            "by_type": (f"SELECT operation_type, COUNT(*) FROM transactions{where} "
+                        f"GROUP BY {group}operation_type", params),
+            "by_operator": (f"SELECT operator_id, COUNT(*) FROM transactions{where} "
+                            f"GROUP BY {group}operator_id", params),
+        }
+    
+    def _rollup_queries(self, first_day=None, last_day=None):
+        """Запросы отчета по дневным агрегатам за целые дни [first_day, last_day]"""
+        where, params = [], []
+        if first_day:
+            where.append("day >= ?")
+            params.append(first_day)
+        if last_day:
+            where.append("day <= ?")
+            params.append(last_day)
+        where = (" WHERE " + " AND ".join(where)) if where else ""
+        return {
+            "total": (f"SELECT COALESCE(SUM(count), 0) FROM daily_rollups{where}", params),
+            "by_type": (f"SELECT operation_type, SUM(count) FROM daily_rollups{where} "
+                        f"GROUP BY operation_type", params),
+            "by_operator": (f"SELECT NULLIF(operator_id, ''), SUM(count) FROM daily_rollups{where} "
+                            f"GROUP BY operator_id", params),
+        }
+    
+    def _report_plan(self, start_date=None, end_date=None):
+        """Разбиение периода: целые дни из daily_rollups, края — из сырых транзакций.
+        Возвращает список (набор запросов, окно сырых транзакций для архивов или None);
+        результаты суммируются. Окно — (начало, конец, конец включительно)"""
+        # Целые дни: начиная со дня start_date (если он задан датой) или со следующего;
+        # день end_date всегда считается по сырым данным (граница включительная)
+        first_day = last_day = None
+        if start_date:
+            start_day = date.fromisoformat(start_date[:10])
+            first_day = start_day if len(start_date) == 10 else start_day + timedelta(days=1)
+        if end_date:
+            last_day = date.fromisoformat(end_date[:10]) - timedelta(days=1)
+        if first_day and last_day and first_day > last_day:
+            return [(self._report_queries(start_date, end_date), (start_date, end_date, True))]
         
-        query += " ORDER BY timestamp DESC"
-        cursor.execute(query, params)
+        # Дневные агрегаты архивированных эпох остаются в daily_rollups
+        plan = [(self._rollup_queries(first_day and first_day.isoformat(),
+                                      last_day and last_day.isoformat()), None)]
+        if start_date and len(start_date) > 10:
+            plan.append((self._aggregate_queries(
+                " WHERE timestamp >= ? AND timestamp < ?", [start_date, first_day.isoformat()]),
+                (start_date, first_day.isoformat(), False)))
+        if end_date:
+            edge = (last_day + timedelta(days=1)).isoformat()
+            plan.append((self._aggregate_queries(
+                " WHERE timestamp >= ? AND timestamp <= ?", [edge, end_date]),
+                (edge, end_date, True)))
+        return plan
+    
+    def generate_audit_report(self, start_date=None, end_date=None, use_rollups=True):
+        """Генерация отчета аудита.
+        Целые дни периода берутся из daily_rollups, неполные дни на краях — из transactions
+        и архивов эпох"""
+        conn = self.connection()
+        if use_rollups:
+            plan = self._report_plan(start_date, end_date)
+        else:
+            plan = [(self._report_queries(start_date, end_date), (start_date, end_date, True))]
         
-        transactions = cursor.fetchall()
+        total, by_type, by_operator = 0, {}, {}
+        for queries, window in plan:
+            total += conn.execute(*queries["total"]).fetchone()[0]
+            for key, count in conn.execute(*queries["by_type"]):
+                by_type[key] = by_type.get(key, 0) + count
+            for key, count in conn.execute(*queries["by_operator"]):
+                by_operator[key] = by_operator.get(key, 0) + count
+            if window is not None:
+                for tx in self.store.archived_transactions(*window):
+                    total += 1
+                    by_type[tx["operation_type"]] = by_type.get(tx["operation_type"], 0) + 1
+                    by_operator[tx["operator_id"]] = by_operator.get(tx["operator_id"], 0) + 1
         
         report = {
             "generated": datetime.now().isoformat(),
             "period": {"start": start_date, "end": end_date},
-            "total_operations": len(transactions),
-            "operations_by_type": {},
-            "operations_by_operator": {}
+            "total_operations": total,
+            "operations_by_type": by_type,
+            "operations_by_operator": by_operator
         }
         
-        for tx in transactions:
-            op_type = tx[2]
-            operator = tx[3]
-            
-            report["operations_by_type"][op_type] = report["operations_by_type"].get(op_type, 0) + 1
-            report["operations_by_operator"][operator] = report["operations_by_operator"].get(operator, 0) + 1
-        
-        conn.close()
-        
         print(f"📊 Отчет аудита:")
         print(f"   Всего операций: {report['total_operations']}")
         print(f"   По типам: {report['operations_by_type']}")
         
         return report
+    
+    def rebuild_rollups(self):
+        """Полный пересчет daily_rollups по таблице transactions и архивам эпох"""
+        conn = self.connection()
+        conn.execute("DELETE FROM daily_rollups")
+        conn.execute(ROLLUP_REBUILD_SQL)
+        conn.executemany(ROLLUP_UPSERT_SQL, [
+            (*key, count) for key, count in rollup_counts(self.store.archived_transactions()).items()
+        ])
+        conn.commit()
+        days = conn.execute("SELECT COUNT(DISTINCT day) FROM daily_rollups").fetchone()[0]
+        print(f"✅ Дневные агрегаты пересчитаны: {days} дней")
+        return days
+    
+    def iter_transactions(self, start_date=None, end_date=None, page_size=1000):
+        """Транзакции периода в порядке timestamp: из архивов эпох и из базы.
+        Архив читается потоком, когда обход дошел до его первой транзакции; внутри архива
+        транзакции идут в порядке цепочки — порядке их записи, то есть по timestamp"""
+        conn = self.connection()
+        live = (conn.execute("SELECT MIN(timestamp) FROM transactions").fetchone()[0],
+                lambda: self._iter_live_transactions(start_date, end_date, page_size))
+        archives = self.store.archives()
+        if not archives:
+            return live[1]()
+        sources = [(archive["first_timestamp"], lambda archive=archive: (
+            {field: tx[field] for field in REPORT_FIELDS}
+            for tx in self.store.archived_transactions(start_date, end_date, archives=[archive])
+        )) for archive in archives]
+        sources.append(live)
+        sources.sort(key=lambda source: source[0] or "")
+        return _merge_by_timestamp(sources)
+    
+    def _iter_live_transactions(self, start_date=None, end_date=None, page_size=1000):
+        """Транзакции базы в порядке (timestamp, rowid) страницами по page_size.
+        Keyset-пагинация: каждая страница продолжает поиск по индексу с последнего ключа"""
+        conn = self.connection()
+        end_filter, params = (" AND timestamp <= ?", [end_date]) if end_date else ("", [])
+        query = f"""
+        SELECT rowid, {', '.join(REPORT_FIELDS)} FROM transactions
+        WHERE (timestamp, rowid) > (?, ?){end_filter}
+        ORDER BY timestamp, rowid LIMIT ?
+        """
+        # (start_date, -1) < любой строки с timestamp >= start_date
+        last_key = (start_date or "", -1)
+        while True:
+            page = conn.execute(query, (*last_key, *params, page_size)).fetchall()
+            for row in page:
+                yield dict(zip(REPORT_FIELDS, row[1:]))
+            if len(page) < page_size:
+                return
+            last_key = (page[-1][3], page[-1][0])
+    
+    def stream_audit_report(self, output, fmt="jsonl", start_date=None, end_date=None,
+                            group_by=("type", "operator"), page_size=1000):
+        """Потоковый отчет аудита: строки транзакций пишутся в output по мере чтения,
+        агрегаты считаются на лету (память не зависит от числа строк).
+        fmt: "jsonl" (в конце — строка со сводкой) или "csv". Возвращает сводку"""
+        for dimension in group_by:
+            if dimension not in REPORT_DIMENSIONS:
+                raise ValueError(f"Unknown report dimension: {dimension}")
+        if fmt not in ("jsonl", "csv"):
+            raise ValueError(f"Unknown report format: {fmt}")
+        
+        aggregates = {dimension: {} for dimension in group_by}
+        total = 0
+        writer = None
+        if fmt == "csv":
+            writer = csv.DictWriter(output, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+        
+        for tx in self.iter_transactions(start_date, end_date, page_size):
+            total += 1
+            for dimension, counts in aggregates.items():
+                key = REPORT_DIMENSIONS[dimension](tx)
+                counts[key] = counts.get(key, 0) + 1
+            if writer:
+                writer.writerow(tx)
+            else:
+                output.write(json.dumps({"record": "transaction", **tx}, ensure_ascii=False) + "\n")
+        
+        summary = {
+            "generated": datetime.now().isoformat(),
+            "period": {"start": start_date, "end": end_date},
+            "total_operations": total,
+            "group_by": {dimension: counts for dimension, counts in aggregates.items()}
+        }
+        if fmt == "jsonl":
+            output.write(json.dumps({"record": "summary", **summary}, ensure_ascii=False) + "\n")
+        output.flush()
+        return summary
 
-# Интеграция с генератором документов
-if __name__ == "__main__":
-    # Тестирование
-    blockchain = DOCScoinBlockchain()
+
+# ---------------------------------------------------------------------------
+# Фоновая запись аудита
+# ---------------------------------------------------------------------------
+
+class AuditWriter:
+    """Неблокирующая запись аудита: ограниченная очередь и один поток-писатель.
+    
+    submit() сразу возвращает Future, который завершается номером блока, когда
+    транзакция запечатана и закоммичена. Писатель собирает из очереди пачку
+    (до max_batch транзакций или max_delay секунд) и запечатывает ее одним блоком.
+    Полная очередь блокирует submit() (backpressure); close() дописывает все
+    принятые транзакции перед остановкой."""
+    
+    _STOP = object()
+    
+    def __init__(self, blockchain, max_queue=10000, max_batch=500, max_delay=0.05, latency_window=100000):
+        self.blockchain = blockchain
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._latencies = collections.deque(maxlen=latency_window)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="docscoin-audit-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def submit(self, transaction, timeout=None):
+        """Поставить транзакцию в очередь; возвращает Future с результатом записи.
+        При заполненной очереди ждет до timeout секунд (None — без ограничения)"""
+        if self._closed:
+            raise RuntimeError("AuditWriter is closed")
+        future = Future()
+        self._queue.put((transaction, future, time.perf_counter()), timeout=timeout)
+        return future
+    
+    def record_export_operation(self, operator_id, certificate_hash, document_id, data_summary, timeout=None):
+        """Асинхронная фиксация экспорта: возвращает (tx_id, future) без ожидания записи"""
+        transaction = make_export_transaction(operator_id, certificate_hash, document_id, data_summary)
+        return transaction["tx_id"], self.submit(transaction, timeout)
+    
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is self._STOP:
+                break
+            batch = [item]
+            
+            # Добираем пачку: до max_batch элементов или max_delay секунд
+            deadline = time.perf_counter() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                if item[0] is None:  # маркер flush(): пишем пачку сразу
+                    break
+            
+            self._write(batch)
+        
+        # Остаток очереди после сигнала остановки
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not self._STOP:
+                leftover.append(item)
+        for start in range(0, len(leftover), self.max_batch):
+            self._write(leftover[start:start + self.max_batch])
+    
+    def _write(self, batch):
+        markers = [future for transaction, future, _ in batch if transaction is None]
+        batch = [item for item in batch if item[0] is not None]
+        try:
+            if batch:
+                with self.blockchain._mempool_lock:
+                    self.blockchain.mempool.extend(transaction for transaction, _, _ in batch)
+                    result = self.blockchain.seal_block()
+        except Exception as e:
+            # Блок не записан (мемпул сохранен в _seal_block): убираем из него только эту пачку —
+            # ее futures получают ошибку; транзакции других вызывающих ждут следующего блока
+            self.blockchain._discard_pending([transaction for transaction, _, _ in batch])
+            for _, future, _ in batch:
+                future.set_exception(e)
+            batch = []
+        
+        durable = time.perf_counter()
+        for future in markers:
+            future.set_result(None)
+        for transaction, future, enqueued in batch:
+            self._latencies.append(durable - enqueued)
+            future.set_result({
+                "tx_id": transaction["tx_id"],
+                "block_number": result["block_number"],
+                "merkle_root": result["merkle_root"],
+                "proof": result["proofs"][transaction["tx_id"]]
+            })
+    
+    def flush(self, timeout=None):
+        """Дождаться записи всех транзакций, принятых до вызова"""
+        if self._closed:
+            return
+        marker = Future()
+        self._queue.put((None, marker, time.perf_counter()), timeout=timeout)
+        marker.result(timeout)
+    
+    def close(self):
+        """Остановка писателя с записью всего, что уже в очереди"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(self._STOP)
+        self._thread.join()
+        atexit.unregister(self.close)
+    
+    def metrics(self):
+        """Задержка enqueue -> durable (мс): count, p50, p99, max"""
+        latencies = sorted(self._latencies)
+        if not latencies:
+            return {"count": 0, "p50_ms": None, "p99_ms": None, "max_ms": None}
+        
+        def percentile(p):
+            return round(1000 * latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3)
+        
+        return {
+            "count": len(latencies),
+            "p50_ms": percentile(0.50),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(1000 * latencies[-1], 3)
+        }
+
+
+def demo(db_path=None, storage="sqlite"):
+    """Демонстрация: экспорт, история, отчет"""
+    blockchain = DOCScoinBlockchain(db_path, storage=storage)
     
     # Фиксация экспорта документа
     tx_id = blockchain.record_export_operation(
@@ -271,8 +2106,101 @@ if __name__ == "__main__":
         data_summary="Экспорт трудовой книжки сотрудника Иванова"
     )
     
+    # Проверяем включение (ожидающая транзакция запечатывается)
+    inclusion = blockchain.get_inclusion_proof(tx_id)
+    print(f"🌳 Доказательство включения {tx_id}: "
+          f"{verify_merkle_proof(inclusion['leaf'], inclusion['proof'], inclusion['merkle_root'])}")
+    
     # Проверка истории
     blockchain.verify_document_history("DOC-2025-001")
     
-    # Генерация отчета
-    blockchain.generate_audit_report()
\ No newline at end of file
+    # Генерация отчета (отчеты строятся только по SQLite)
+    if isinstance(blockchain.store, SQLiteStore):
+        blockchain.generate_audit_report()
+    blockchain.close()
+
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='DOCScoin Blockchain Audit')
+    parser.add_argument('--db', type=str, default=None,
+                        help='Audit database (sqlite) or segment log directory (log)')
+    parser.add_argument('--storage', choices=sorted(STORAGE_BACKENDS), default='sqlite',
+                        help='Chain storage backend')
+    subparsers = parser.add_subparsers(dest='command')
+    
+    verify = subparsers.add_parser('verify', help='Verify chain integrity')
+    verify.add_argument('--full', action='store_true', help='Ignore checkpoints and re-verify every block')
+    verify.add_argument('--workers', type=int, default=1, help='Parallel workers for --full')
+    
+    lookup = subparsers.add_parser('lookup', help='Last operation with a document (exit 1 if none)')
+    lookup.add_argument('document_id', type=str)
+    
+    subparsers.add_parser('explain', help='Check that history/report queries use indexes')
+    
+    archive = subparsers.add_parser('archive', help='Move closed monthly epochs into compressed archives')
+    archive.add_argument('--before', type=str, default=None,
+                         help='Archive epochs before the month of this date (default: current month)')
+    archive.add_argument('--no-compact', action='store_true', help='Do not VACUUM the database afterwards')
+    
+    subparsers.add_parser('rebuild-rollups', help='Recompute daily_rollups from transactions')
+    
+    report = subparsers.add_parser('report', help='Stream audit report as JSON Lines or CSV')
+    report.add_argument('--start', type=str, default=None, help='Period start (ISO timestamp)')
+    report.add_argument('--end', type=str, default=None, help='Period end (ISO timestamp)')
+    report.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl')
+    report.add_argument('--output', type=str, default='-', help='Output file, "-" for stdout')
+    report.add_argument('--group-by', nargs='+', default=['type', 'operator'],
+                        choices=sorted(REPORT_DIMENSIONS), help='Aggregate dimensions')
+    report.add_argument('--page-size', type=int, default=1000)
+    
+    args = parser.parse_args()
+    # Отчеты, агрегаты и архивы есть только в SQLite
+    if args.storage != 'sqlite' and args.command in ('explain', 'archive', 'rebuild-rollups', 'report'):
+        parser.error(f"'{args.command}' needs --storage sqlite (not {args.storage})")
+    
+    if args.command == 'verify':
+        result = DOCScoinBlockchain(args.db, storage=args.storage).verify_chain(full=args.full, workers=args.workers)
+        sys.exit(0 if result["valid"] else 1)
+    elif args.command == 'lookup':
+        blockchain = DOCScoinBlockchain(args.db, storage=args.storage)
+        operation = blockchain.last_operation(args.document_id)
+        blockchain.close()
+        print(json.dumps(operation, ensure_ascii=False, indent=2))
+        sys.exit(0 if operation else 1)
+    elif args.command == 'explain':
+        plans, full_scans = DOCScoinBlockchain(args.db, storage=args.storage).query_plans()
+        for name, plan in plans.items():
+            print(f"{'❌' if name in full_scans else '✅'} {name}: {' | '.join(plan)}")
+        sys.exit(1 if full_scans else 0)
+    elif args.command == 'archive':
+        blockchain = DOCScoinBlockchain(args.db, storage=args.storage)
+        archived = blockchain.archive_epochs(before=args.before, compact=not args.no_compact)
+        blockchain.close()
+        if not archived:
+            print("📭 Закрытых эпох для архивации нет")
+    elif args.command == 'rebuild-rollups':
+        DOCScoinBlockchain(args.db, storage=args.storage).rebuild_rollups()
+    elif args.command == 'report':
+        blockchain = DOCScoinBlockchain(args.db, storage=args.storage)
+        if args.output == '-':
+            output = sys.stdout
+        else:
+            output = open(args.output, 'w', encoding='utf-8', newline='')
+        try:
+            summary = blockchain.stream_audit_report(
+                output, fmt=args.format, start_date=args.start, end_date=args.end,
+                group_by=args.group_by, page_size=args.page_size
+            )
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        print(f"📊 Операций за период: {summary['total_operations']}", file=sys.stderr)
+    else:
+        demo(args.db, args.storage)
+
+
+# Интеграция с генератором документов
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+DOCScoin Bloom Filter
+Set membership without false negatives: "is this document in the audit chain?"
+is answered from memory, and only possible members go to the database
+
+File layout (written atomically next to the database):
+    header  magic "DSBF", version, hash count, bit count, capacity, element count,
+            chain height covered and the data_hash of that block
+    body    the bit array
+
+The covered height and block hash let the owner tell a stale or foreign
+filter from a current one and catch it up with the blocks sealed since.
+"""
+
+import hashlib
+import math
+import os
+import struct
+from typing import Iterable, Optional, Tuple
+
+MAGIC = b"DSBF"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sBBQQQQ32s")
+
+
+class BloomFilter:
+    """Bit array with k indexes per key (double hashing over one BLAKE2b digest)"""
+
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.001,
+                 bits: Optional[int] = None, hashes: Optional[int] = None):
+        self.capacity = max(1, capacity)
+        if bits is None:
+            bits = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.bits = max(8, bits)
+        self.hashes = hashes or max(1, round(self.bits / self.capacity * math.log(2)))
+        self.array = bytearray((self.bits + 7) // 8)
+        # Keys that set at least one new bit: an estimate of distinct members
+        self.count = 0
+
+    def _probe(self, key: str) -> Tuple[int, int]:
+        """First bit index and step: index i is (h1 + i * h2) mod bits"""
+        digest = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest(), "little")
+        return (digest & 0xFFFFFFFFFFFFFFFF) % self.bits, ((digest >> 64) | 1) % self.bits
+
+    def add(self, key: str) -> bool:
+        """Add a key; False when every bit was already set (probably a member already)"""
+        index, step = self._probe(key)
+        bits, array = self.bits, self.array
+        added = False
+        for _ in range(self.hashes):
+            byte, mask = index >> 3, 1 << (index & 7)
+            if not array[byte] & mask:
+                array[byte] |= mask
+                added = True
+            index = (index + step) % bits
+        if added:
+            self.count += 1
+        return added
+
+    def update(self, keys: Iterable[str]) -> int:
+        return sum(self.add(key) for key in keys)
+
+    def __contains__(self, key: str) -> bool:
+        # Stops at the first clear bit: an absent key costs about two probes
+        index, step = self._probe(key)
+        bits, array = self.bits, self.array
+        for _ in range(self.hashes):
+            if not array[index >> 3] & (1 << (index & 7)):
+                return False
+            index = (index + step) % bits
+        return True
+
+    @property
+    def saturated(self) -> bool:
+        """More members than the filter was sized for: the false positive rate is above target"""
+        return self.count > self.capacity
+
+    def save(self, path: str, height: int, block_hash: str):
+        """Write the filter covering blocks 1..height (tip data_hash block_hash)"""
+        header = FILE_HEADER.pack(MAGIC, VERSION, self.hashes, self.bits, self.capacity, self.count, height,
+                                  bytes.fromhex(block_hash or "00" * 32))
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            f.write(self.array)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Tuple["BloomFilter", int, str]:
+        """(filter, covered height, covered block hash); ValueError if the file is not a valid filter"""
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < FILE_HEADER.size:
+            raise ValueError(f"{path}: truncated bloom filter")
+        magic, version, hashes, bits, capacity, count, height, block_hash = FILE_HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a bloom filter file")
+        array = data[FILE_HEADER.size:]
+        if len(array) != (bits + 7) // 8:
+            raise ValueError(f"{path}: bit array size does not match header")
+        bloom = cls(capacity, bits=bits, hashes=hashes)
+        bloom.array = bytearray(array)
+        bloom.count = count
+        return bloom, height, block_hash.hex()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+DOCScoin Canonical JSON
+Streaming hashing of JSON data in one canonical byte form shared by all tools
+
+Canonical form (the bytes that are hashed):
+    json.dumps(data, sort_keys=True, ensure_ascii=True, allow_nan=False)
+encoded as ASCII. That is:
+    - object keys sorted, separators ", " and ": " (json defaults);
+    - every non-ASCII character escaped as \\uXXXX (characters outside the BMP
+      as a UTF-16 surrogate pair), so the bytes never depend on an encoding;
+    - NaN and Infinity rejected with ValueError.
+It is byte-identical to what blockchain-audit and rutoken-signer hashed before,
+so hashes already stored in the audit chain stay valid.
+
+The data is never materialized as one string: subtrees are fed to the hash
+object as they are encoded, and long strings (base64 attachments) are escaped
+slice by slice.
+"""
+
+import hashlib
+import json
+from json.encoder import encode_basestring_ascii
+
+# Strings at least this long are streamed in slices instead of encoded whole
+LARGE_STRING = 64 * 1024
+# Encoded chunks are joined into blocks of about this size before update()
+UPDATE_BLOCK = 64 * 1024
+
+_ENCODER = json.JSONEncoder(sort_keys=True, ensure_ascii=True, allow_nan=False)
+
+
+def _mark_large(obj, marked):
+    """Collect ids of the containers that hold a large string; True if obj holds one"""
+    if isinstance(obj, dict):
+        values = obj.values()
+    elif isinstance(obj, (list, tuple)):
+        values = obj
+    else:
+        return isinstance(obj, str) and len(obj) >= LARGE_STRING
+    found = False
+    for value in values:
+        if isinstance(value, str):
+            if len(value) >= LARGE_STRING:
+                found = True
+        elif isinstance(value, (dict, list, tuple)) and _mark_large(value, marked):
+            found = True
+    if found:
+        marked.add(id(obj))
+    return found
+
+
+def _key(key):
+    """Object key as json.dumps converts it"""
+    if isinstance(key, str):
+        return key
+    if key is True:
+        return "true"
+    if key is False:
+        return "false"
+    if key is None:
+        return "null"
+    if isinstance(key, (int, float)):
+        return _ENCODER.encode(key)
+    raise TypeError(f"keys must be str, int, float, bool or None, not {key.__class__.__name__}")
+
+
+def _iterencode(obj, marked):
+    """Canonical text of obj in chunks; subtrees without large strings go
+    through the C encoder in one call"""
+    if isinstance(obj, str):
+        if len(obj) < LARGE_STRING:
+            yield encode_basestring_ascii(obj)
+            return
+        # Escaping works per code point, so slices never split an escape
+        yield '"'
+        for start in range(0, len(obj), LARGE_STRING):
+            yield encode_basestring_ascii(obj[start:start + LARGE_STRING])[1:-1]
+        yield '"'
+    elif id(obj) not in marked:
+        yield _ENCODER.encode(obj)
+    elif isinstance(obj, dict):
+        separator = "{"
+        for key, value in sorted(obj.items()):
+            yield separator + encode_basestring_ascii(_key(key)) + ": "
+            yield from _iterencode(value, marked)
+            separator = ", "
+        yield "}"
+    else:
+        separator = "["
+        for value in obj:
+            yield separator
+            yield from _iterencode(value, marked)
+            separator = ", "
+        yield "]"
+
+
+def iter_canonical(data):
+    """Canonical form of data as ASCII text chunks"""
+    marked = set()
+    _mark_large(data, marked)
+    return _iterencode(data, marked)
+
+
+def update_hash(hasher, data):
+    """Feed the canonical form of data into a hashlib object; returns the hasher"""
+    block, size = [], 0
+    for chunk in iter_canonical(data):
+        block.append(chunk)
+        size += len(chunk)
+        if size >= UPDATE_BLOCK:
+            hasher.update("".join(block).encode("ascii"))
+            block, size = [], 0
+    if block:
+        hasher.update("".join(block).encode("ascii"))
+    return hasher
+
+
+def canonical_hash(data, algorithm="sha256"):
+    """hashlib object over the canonical form of data (call .digest() / .hexdigest())"""
+    return update_hash(hashlib.new(algorithm), data)
+
+
+def canonical_bytes(data):
+    """The canonical form as bytes (reference; hashing should use update_hash)"""
+    return _ENCODER.encode(data).encode("ascii")
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+DOCScoin National Identifier Checksums
+Checksum validation of national identifiers, keyed by jurisdiction, for single
+values and for whole columns at once
+
+Schemes (see specification/field-mapping.md):
+    RU:INN       ИНН, 10 digits (legal entity) or 12 digits (individual)
+    RU:SNILS     СНИЛС, 11 digits, separators allowed ("123-456-789 64")
+    UA:RNOKPP    РНОКПП (ІПН), 10 digits
+    IN:AADHAAR   12 digits, Verhoeff check digit, first digit not 0 or 1
+    IN:PAN       AAAAA9999A; the check letter algorithm is not public, so
+                 only the structure and the holder-type letter are checked
+
+Columns are validated with NumPy digit-matrix arithmetic when NumPy is
+installed, and with the same rules in pure Python otherwise.
+
+Usage:
+    python tools/checksums.py RU:INN export.csv --column inn
+    python tools/checksums.py IN:AADHAAR ids.txt
+"""
+
+import re
+import sys
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pure-Python fallback
+    np = None
+
+_SEPARATORS = str.maketrans("", "", " -\t")
+
+INN10_WEIGHTS = (2, 4, 10, 3, 5, 9, 4, 6, 8)
+INN11_WEIGHTS = (7, 2, 4, 10, 3, 5, 9, 4, 6, 8)
+INN12_WEIGHTS = (3, 7, 2, 4, 10, 3, 5, 9, 4, 6, 8)
+SNILS_WEIGHTS = (9, 8, 7, 6, 5, 4, 3, 2, 1)
+# Numbers up to 001-001-998 were issued before check digits were introduced
+SNILS_UNCHECKED_MAX = 1001998
+RNOKPP_WEIGHTS = (-1, 5, 7, 9, 4, 6, 10, 5, 7)
+
+VERHOEFF_D = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9),
+    (1, 2, 3, 4, 0, 6, 7, 8, 9, 5),
+    (2, 3, 4, 0, 1, 7, 8, 9, 5, 6),
+    (3, 4, 0, 1, 2, 8, 9, 5, 6, 7),
+    (4, 0, 1, 2, 3, 9, 5, 6, 7, 8),
+    (5, 9, 8, 7, 6, 0, 4, 3, 2, 1),
+    (6, 5, 9, 8, 7, 1, 0, 4, 3, 2),
+    (7, 6, 5, 9, 8, 2, 1, 0, 4, 3),
+    (8, 7, 6, 5, 9, 3, 2, 1, 0, 4),
+    (9, 8, 7, 6, 5, 4, 3, 2, 1, 0),
+)
+VERHOEFF_P = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9),
+    (1, 5, 7, 6, 2, 8, 3, 0, 9, 4),
+    (5, 8, 0, 3, 7, 9, 6, 1, 4, 2),
+    (8, 9, 1, 6, 0, 4, 3, 5, 2, 7),
+    (9, 4, 5, 8, 1, 2, 7, 6, 3, 0),
+    (4, 2, 8, 9, 6, 5, 0, 7, 1, 3),
+    (2, 7, 9, 3, 8, 0, 1, 6, 5, 4),
+    (7, 0, 4, 2, 5, 3, 1, 8, 6, 9),
+)
+
+PAN_RE = re.compile(r"^[A-Z]{3}[PCHFATBLJG][A-Z][0-9]{4}[A-Z]$")
+
+
+def _weighted(digits: Sequence[int], weights: Sequence[int]) -> int:
+    return sum(d * w for d, w in zip(digits, weights))
+
+
+# ---------------------------------------------------------------------------
+# Single values: digits is a list of ints of an allowed length
+# ---------------------------------------------------------------------------
+
+def _check_inn(digits):
+    if len(digits) == 10:
+        return _weighted(digits, INN10_WEIGHTS) % 11 % 10 == digits[9]
+    return (_weighted(digits, INN11_WEIGHTS) % 11 % 10 == digits[10]
+            and _weighted(digits, INN12_WEIGHTS) % 11 % 10 == digits[11])
+
+
+def _check_snils(digits):
+    if int("".join(map(str, digits[:9]))) <= SNILS_UNCHECKED_MAX:
+        return True
+    control = _weighted(digits, SNILS_WEIGHTS) % 101
+    return (0 if control == 100 else control) == digits[9] * 10 + digits[10]
+
+
+def _check_rnokpp(digits):
+    return _weighted(digits, RNOKPP_WEIGHTS) % 11 % 10 == digits[9]
+
+
+def _check_aadhaar(digits):
+    if digits[0] < 2:
+        return False
+    check = 0
+    for position, digit in enumerate(reversed(digits)):
+        check = VERHOEFF_D[check][VERHOEFF_P[position % 8][digit]]
+    return check == 0
+
+
+# ---------------------------------------------------------------------------
+# Columns: matrix is an (n, length) integer array of digits, returns a bool array
+# ---------------------------------------------------------------------------
+
+def _matrix_inn(matrix):
+    if matrix.shape[1] == 10:
+        return matrix[:, :9] @ np.array(INN10_WEIGHTS) % 11 % 10 == matrix[:, 9]
+    return ((matrix[:, :10] @ np.array(INN11_WEIGHTS) % 11 % 10 == matrix[:, 10])
+            & (matrix[:, :11] @ np.array(INN12_WEIGHTS) % 11 % 10 == matrix[:, 11]))
+
+
+def _matrix_snils(matrix):
+    number = matrix[:, :9] @ (10 ** np.arange(8, -1, -1, dtype=np.int64))
+    control = matrix[:, :9] @ np.array(SNILS_WEIGHTS) % 101
+    control[control == 100] = 0
+    return (control == matrix[:, 9] * 10 + matrix[:, 10]) | (number <= SNILS_UNCHECKED_MAX)
+
+
+def _matrix_rnokpp(matrix):
+    return matrix[:, :9] @ np.array(RNOKPP_WEIGHTS) % 11 % 10 == matrix[:, 9]
+
+
+def _matrix_aadhaar(matrix):
+    d_table, p_table = np.array(VERHOEFF_D), np.array(VERHOEFF_P)
+    check = np.zeros(len(matrix), dtype=np.int64)
+    for position in range(matrix.shape[1]):
+        check = d_table[check, p_table[position % 8, matrix[:, -1 - position]]]
+    return (check == 0) & (matrix[:, 0] >= 2)
+
+
+def _check_pan(text):
+    return PAN_RE.match(text) is not None
+
+
+class ChecksumScheme(NamedTuple):
+    """Numeric schemes list their digit counts and get digits; others get the text"""
+    name: str
+    lengths: Tuple[int, ...]
+    check: Callable
+    check_matrix: Optional[Callable] = None
+
+
+CHECKSUMS: Dict[str, ChecksumScheme] = {
+    "RU:INN": ChecksumScheme("ИНН", (10, 12), _check_inn, _matrix_inn),
+    "RU:SNILS": ChecksumScheme("СНИЛС", (11,), _check_snils, _matrix_snils),
+    "UA:RNOKPP": ChecksumScheme("РНОКПП", (10,), _check_rnokpp, _matrix_rnokpp),
+    "IN:AADHAAR": ChecksumScheme("Aadhaar", (12,), _check_aadhaar, _matrix_aadhaar),
+    "IN:PAN": ChecksumScheme("PAN", (), _check_pan),
+}
+
+
+def _scheme(kind: str) -> ChecksumScheme:
+    try:
+        return CHECKSUMS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown checksum scheme: {kind} (known: {', '.join(CHECKSUMS)})") from None
+
+
+def normalize(scheme: ChecksumScheme, value) -> Optional[str]:
+    """Identifier without separators, None if it cannot be valid for the scheme"""
+    if value is None:
+        return None
+    text = str(value).strip()
+    if not scheme.lengths:
+        return text.upper()
+    text = text.translate(_SEPARATORS)
+    if len(text) not in scheme.lengths or not (text.isascii() and text.isdigit()):
+        return None
+    return text
+
+
+def _check_text(scheme: ChecksumScheme, text: Optional[str]) -> bool:
+    if text is None:
+        return False
+    if not scheme.lengths:
+        return scheme.check(text)
+    return scheme.check([ord(char) - 48 for char in text])
+
+
+def validate(kind: str, value) -> bool:
+    """Check one identifier, e.g. validate("RU:INN", "7707083893")"""
+    scheme = _scheme(kind)
+    return _check_text(scheme, normalize(scheme, value))
+
+
+def validate_column(kind: str, values: Iterable, use_numpy: Optional[bool] = None) -> List[bool]:
+    """Check a whole column of identifiers; one bool per value, in order.
+    Numeric schemes run as digit-matrix arithmetic per identifier length when NumPy is available"""
+    scheme = _scheme(kind)
+    if use_numpy is None:
+        use_numpy = np is not None
+    if not use_numpy or np is None or scheme.check_matrix is None:
+        return [_check_text(scheme, normalize(scheme, value)) for value in values]
+
+    # Only separators are stripped per value; the digit check runs on the matrix.
+    # Non-ASCII characters encode as '?', keeping one byte per character
+    texts = ["" if value is None else str(value).strip().translate(_SEPARATORS) for value in values]
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    results = np.zeros(len(texts), dtype=bool)
+    for length in scheme.lengths:
+        rows = np.flatnonzero(lengths == length)
+        if not len(rows):
+            continue
+        joined = "".join([texts[i] for i in rows.tolist()]).encode("ascii", "replace")
+        matrix = (np.frombuffer(joined, dtype=np.uint8).reshape(-1, length) - 48).astype(np.int64)
+        digits = (matrix <= 9).all(axis=1)
+        matrix[~digits] = 0
+        results[rows] = digits & scheme.check_matrix(matrix)
+    return results.tolist()
+
+
+def read_column(path: str, column: Optional[str] = None) -> List[str]:
+    """Values of one CSV column, or every line of a plain text file"""
+    import csv
+
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if column is None:
+            return [line.rstrip("\r\n") for line in f]
+        return [row.get(column) for row in csv.DictReader(f)]
+
+
+def main():
+    import argparse
+    import json
+    import time
+
+    parser = argparse.ArgumentParser(description="DOCScoin National Identifier Checksums")
+    parser.add_argument("kind", choices=sorted(CHECKSUMS))
+    parser.add_argument("path", help="CSV file (with --column) or one identifier per line")
+    parser.add_argument("--column", type=str, default=None, help="CSV column with the identifiers")
+    parser.add_argument("--no-numpy", action="store_true", help="Force the pure-Python implementation")
+    parser.add_argument("--show", type=int, default=20, help="Invalid rows listed in the summary")
+    args = parser.parse_args()
+
+    values = read_column(args.path, args.column)
+    started = time.perf_counter()
+    results = validate_column(args.kind, values, use_numpy=not args.no_numpy)
+    elapsed = time.perf_counter() - started
+
+    invalid = [i for i, ok in enumerate(results) if not ok]
+    summary = {
+        "kind": args.kind,
+        "engine": "python" if args.no_numpy or np is None or CHECKSUMS[args.kind].check_matrix is None else "numpy",
+        "total": len(results),
+        "valid": len(results) - len(invalid),
+        "invalid": len(invalid),
+        "invalid_rows": [{"row": i + 1, "value": values[i]} for i in invalid[:args.show]],
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(len(results) / elapsed, 1) if elapsed else None,
+    }
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    return 0 if not invalid else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
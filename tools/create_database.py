@@ -1,123 +1,129 @@
 #!/usr/bin/env python3
 """
 DOCScoin Template Registry Database Creator
-Creates SQLite database with template fields registry
+Creates SQLite database with template fields registry and bulk-imports field
+definitions from the specification tables, CSV or JSON
+
+Usage:
+    python tools/create_database.py                        # specification/*.md
+    python tools/create_database.py fields.csv extra.json --db path/to/registry.db
 """
 
-import sqlite3
+import csv
 import json
+import re
+import sqlite3
+import sys
+import time
 from pathlib import Path
 
-def create_database(db_path="template-registry.db"):
-    """Create SQLite database with template registry"""
-    
-    # Ensure tools directory exists
-    Path("tools").mkdir(exist_ok=True)
-    
-    conn = sqlite3.connect(f"tools/{db_path}")
-    cursor = conn.cursor()
-    
-    # Create tables
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS field_registry (
-        field_code TEXT PRIMARY KEY,
-        category TEXT NOT NULL,
-        level TEXT NOT NULL,
-        jurisdiction TEXT,
-        description TEXT NOT NULL,
-        data_type TEXT NOT NULL,
-        json_path TEXT NOT NULL,
-        example_value TEXT,
-        required BOOLEAN DEFAULT FALSE,
-        validation_pattern TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-    
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS templates (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        template_type TEXT NOT NULL,  -- word, excel, powerpoint, pdf
-        description TEXT,
-        file_path TEXT,
-        field_codes JSON NOT NULL,  -- Array of required field codes
-        version TEXT DEFAULT '1.0',
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-    
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS template_examples (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        template_id INTEGER,
-        example_name TEXT,
-        input_data JSON NOT NULL,
-        output_preview TEXT,
-        FOREIGN KEY (template_id) REFERENCES templates (id)
-    )
-    """)
-    
-    # Insert sample field definitions
-    sample_fields = [
-        # Global level fields
-        (
-            "GLOBAL:IDENTIFIER:GUID",
-            "IDENTIFIER", "GLOBAL", None,
-            "Global Unique Identifier",
-            "UUID", "$.global_unique_id",
-            "f47ac10b-58cc-4372-a567-0e02b2c3d479",
-            1, "^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$"
-        ),
-        # Russia fields
-        (
-            "NATIONAL:RU:PASSPORT:SERIES",
-            "PASSPORT", "NATIONAL", "RU",
-            "Серия паспорта РФ",
-            "STRING", "$.national_data.ru.passport.series",
-            "1234", 1, "^[0-9]{4}$"
-        ),
-        (
-            "NATIONAL:RU:PASSPORT:NUMBER",
-            "PASSPORT", "NATIONAL", "RU",
-            "Номер паспорта РФ",
-            "STRING", "$.national_data.ru.passport.number",
-            "567890", 1, "^[0-9]{6}$"
-        ),
-        # Ukraine fields
-        (
-            "NATIONAL:UA:PASSPORT:SERIES",
-            "PASSPORT", "NATIONAL", "UA",
-            "Серія паспорта України",
-            "STRING", "$.national_data.ua.passport.series",
-            "АБ", 1, "^[А-Я]{2}$"
-        ),
-        # Enterprise fields
-        (
-            "ENTERPRISE:EMPLOYEE:ID",
-            "EMPLOYEE", "ENTERPRISE", None,
-            "Employee ID",
-            "STRING", "$.enterprise_data.employee.employee_id",
-            "EMP-001", 1, None
-        ),
-    ]
-    
-    cursor.executemany("""
-    INSERT OR REPLACE INTO field_registry 
-    (field_code, category, level, jurisdiction, description, data_type, json_path, example_value, required, validation_pattern)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, sample_fields)
-    
-    # Insert sample template
-    cursor.execute("""
-    INSERT INTO templates (name, template_type, description, field_codes)
-    VALUES (?, ?, ?, ?)
-    """, (
-        "Employment Contract (RU)",
-        "word",
-        "Standard employment contract for Russian employees",
-        json.dumps([
+from registry import FIELD_COLUMNS, default_db_path
+
+SPECIFICATION_DIR = Path(__file__).resolve().parent.parent / "specification"
+DEFAULT_SOURCES = [
+    SPECIFICATION_DIR / "template-fields-registry.md",
+    SPECIFICATION_DIR / "field-mapping.md",
+]
+
+# Schema changes are applied in order; the number of the last one is kept in PRAGMA user_version
+SCHEMA_MIGRATIONS = [
+    # 1: base tables
+    (
+        """
+        CREATE TABLE IF NOT EXISTS field_registry (
+            field_code TEXT PRIMARY KEY,
+            category TEXT NOT NULL,
+            level TEXT NOT NULL,
+            jurisdiction TEXT,
+            description TEXT NOT NULL,
+            data_type TEXT NOT NULL,
+            json_path TEXT NOT NULL,
+            example_value TEXT,
+            required BOOLEAN DEFAULT FALSE,
+            validation_pattern TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            template_type TEXT NOT NULL,  -- word, excel, powerpoint, pdf
+            description TEXT,
+            file_path TEXT,
+            field_codes JSON NOT NULL,  -- Array of required field codes
+            version TEXT DEFAULT '1.0',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS template_examples (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            template_id INTEGER,
+            example_name TEXT,
+            input_data JSON NOT NULL,
+            output_preview TEXT,
+            FOREIGN KEY (template_id) REFERENCES templates (id)
+        )
+        """,
+    ),
+    # 2: one template per (name, version); earlier runs inserted duplicates
+    (
+        """
+        UPDATE template_examples SET template_id = (
+            SELECT MIN(t2.id) FROM templates t1 JOIN templates t2
+            ON t2.name = t1.name AND t2.version IS t1.version
+            WHERE t1.id = template_examples.template_id
+        ) WHERE template_id IN (SELECT id FROM templates)
+        """,
+        """
+        DELETE FROM templates WHERE id NOT IN (SELECT MIN(id) FROM templates GROUP BY name, version)
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_templates_name_version ON templates (name, version)",
+        "ALTER TABLE templates ADD COLUMN updated_at TIMESTAMP",
+    ),
+]
+
+# JSON paths of the specification field codes in a DOCScoin profile (see examples/basic-profile.json)
+JSON_PATHS = {
+    "GLOBAL:IDENTIFIER:GUID": "$.global_unique_id",
+    "GLOBAL:STATUS:VERIFICATION_LEVEL": "$.international_status.verification_level",
+    "GLOBAL:CONTACT:EMAIL_HASH": "$.international_contact.verified_email_hash",
+    "NATIONAL:RU:PASSPORT:SERIES": "$.national_data.ru.passport.series",
+    "NATIONAL:RU:PASSPORT:NUMBER": "$.national_data.ru.passport.number",
+    "NATIONAL:RU:TAX:INN": "$.national_data.ru.inn",
+    "NATIONAL:RU:SOCIAL:SNILS": "$.national_data.ru.snils",
+    "NATIONAL:UA:PASSPORT:SERIES": "$.national_data.ua.passport.series",
+    "NATIONAL:UA:PASSPORT:NUMBER": "$.national_data.ua.passport.number",
+    "NATIONAL:UA:TAX:TIN": "$.national_data.ua.tin",
+    "ENTERPRISE:EMPLOYEE:ID": "$.enterprise_data.employee.employee_id",
+    "ENTERPRISE:EMPLOYEE:DEPARTMENT": "$.enterprise_data.employee.department",
+    "ENTERPRISE:EMPLOYEE:POSITION": "$.enterprise_data.employee.position",
+    "ENTERPRISE:SALARY:BASE": "$.enterprise_data.compensation.base_salary.amount",
+    "ENTERPRISE:SALARY:CURRENCY": "$.enterprise_data.compensation.base_salary.currency",
+}
+
+# Required fields and their validation patterns: field_code -> (required, validation_pattern)
+VALIDATION_RULES = {
+    "GLOBAL:IDENTIFIER:GUID": (1, "^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$"),
+    "NATIONAL:RU:PASSPORT:SERIES": (1, "^[0-9]{4}$"),
+    "NATIONAL:RU:PASSPORT:NUMBER": (1, "^[0-9]{6}$"),
+    "NATIONAL:UA:PASSPORT:SERIES": (1, "^[А-Я]{2}$"),
+    "ENTERPRISE:EMPLOYEE:ID": (1, None),
+}
+
+# Data types known to the validator; specification types outside this set are stored as STRING
+DATA_TYPES = {"STRING", "UUID", "ENUM", "SHA256", "DATE", "DECIMAL", "INTEGER", "BOOLEAN", "ARRAY", "OBJECT"}
+
+TEMPLATE_COLUMNS = ("name", "template_type", "description", "file_path", "field_codes", "version")
+
+BUILTIN_TEMPLATES = [
+    {
+        "name": "Employment Contract (RU)",
+        "template_type": "word",
+        "description": "Standard employment contract for Russian employees",
+        "field_codes": [
             "GLOBAL:IDENTIFIER:GUID",
             "NATIONAL:RU:PASSPORT:SERIES",
             "NATIONAL:RU:PASSPORT:NUMBER",
@@ -128,15 +134,270 @@ def create_database(db_path="template-registry.db"):
             "ENTERPRISE:EMPLOYEE:POSITION",
             "ENTERPRISE:SALARY:BASE",
             "ENTERPRISE:SALARY:CURRENCY"
-        ])
-    ))
-    
-    conn.commit()
-    conn.close()
-    
-    print(f"✅ Database created: tools/{db_path}")
-    print("📊 Tables created: field_registry, templates, template_examples")
-    print("📝 Sample data inserted")
+        ],
+    },
+]
+
+# Columns compared to decide whether an existing row changed
+_FIELD_VALUE_COLUMNS = FIELD_COLUMNS[1:]
+_TEMPLATE_VALUE_COLUMNS = ("template_type", "description", "file_path", "field_codes")
+
+FIELD_UPSERT_SQL = f"""
+INSERT INTO field_registry ({', '.join(FIELD_COLUMNS)})
+VALUES ({', '.join('?' * len(FIELD_COLUMNS))})
+ON CONFLICT (field_code) DO UPDATE SET
+    {', '.join(f'{column} = excluded.{column}' for column in _FIELD_VALUE_COLUMNS)},
+    updated_at = CURRENT_TIMESTAMP
+WHERE {' OR '.join(f'{column} IS NOT excluded.{column}' for column in _FIELD_VALUE_COLUMNS)}
+"""
+
+TEMPLATE_UPSERT_SQL = f"""
+INSERT INTO templates ({', '.join(TEMPLATE_COLUMNS)})
+VALUES ({', '.join('?' * len(TEMPLATE_COLUMNS))})
+ON CONFLICT (name, version) DO UPDATE SET
+    {', '.join(f'{column} = excluded.{column}' for column in _TEMPLATE_VALUE_COLUMNS)},
+    updated_at = CURRENT_TIMESTAMP
+WHERE {' OR '.join(f'{column} IS NOT excluded.{column}' for column in _TEMPLATE_VALUE_COLUMNS)}
+"""
+
+
+# ---------------------------------------------------------------------------
+# Sources
+# ---------------------------------------------------------------------------
+
+def _split_code(field_code):
+    """(level, jurisdiction, category) from LEVEL:[JURISDICTION:]CATEGORY:FIELD"""
+    parts = field_code.split(":")
+    level = parts[0]
+    if level == "NATIONAL" and len(parts) > 2:
+        return level, parts[1], parts[2]
+    return level, None, parts[1] if len(parts) > 1 else level
+
+
+def _flag(value):
+    """required column from CSV/JSON: 1/0, true/false, yes/no"""
+    if isinstance(value, str):
+        return int(value.strip().lower() in ("1", "true", "yes", "y"))
+    return int(bool(value))
+
+
+def _clean_cell(text):
+    return text.strip().strip("`").strip()
+
+
+def parse_markdown(text):
+    """Field definitions and templates from a specification markdown file.
+    Tables with a 'Field Code' column become fields; a ```json block with
+    "field_mapping" supplies JSON paths. Other tables are ignored"""
+    fields, json_paths = [], {}
+    header = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line.startswith("|"):
+            header = None
+            continue
+        cells = [_clean_cell(cell) for cell in line.strip("|").split("|")]
+        if header is None:
+            header = [cell.lower() for cell in cells]
+            continue
+        if all(set(cell) <= set("-: ") for cell in cells):
+            continue
+        row = dict(zip(header, cells))
+        if "field code" not in row:
+            continue
+        example = row.get("example value") or row.get("example") or row.get("format")
+        fields.append({
+            "field_code": row["field code"],
+            "description": row.get("description"),
+            "data_type": row.get("data type"),
+            "example_value": example or None,
+        })
+
+    for block in re.findall(r"```json\s*(.*?)```", text, re.DOTALL):
+        try:
+            data = json.loads(block)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            json_paths.update(data.get("field_mapping", {}))
+    return fields, [], json_paths
+
+
+def parse_csv(text):
+    """One field per row; columns named like field_registry columns"""
+    fields = [{key: value for key, value in row.items() if value not in (None, "")}
+              for row in csv.DictReader(text.splitlines())]
+    return fields, [], {}
+
+
+def parse_json(text):
+    """A list of fields, or {"fields": [...], "templates": [...], "field_mapping": {...}}"""
+    data = json.loads(text)
+    if isinstance(data, list):
+        return data, [], {}
+    return data.get("fields", []), data.get("templates", []), data.get("field_mapping", {})
+
+
+PARSERS = {".md": parse_markdown, ".csv": parse_csv, ".json": parse_json}
+
+
+def load_sources(paths):
+    """Merge sources in order (later values win); returns (fields by code, templates, skipped codes)"""
+    merged, templates, json_paths = {}, list(BUILTIN_TEMPLATES), dict(JSON_PATHS)
+    for path in paths:
+        path = Path(path)
+        parser = PARSERS.get(path.suffix.lower())
+        if parser is None:
+            raise ValueError(f"Unsupported source format: {path}")
+        fields, source_templates, source_paths = parser(path.read_text(encoding="utf-8"))
+        json_paths.update(source_paths)
+        templates.extend(source_templates)
+        for field in fields:
+            code = field["field_code"]
+            merged.setdefault(code, {}).update({key: value for key, value in field.items() if value is not None})
+
+    rows, skipped = {}, []
+    for code, field in merged.items():
+        level, jurisdiction, category = _split_code(code)
+        required, pattern = VALIDATION_RULES.get(code, (0, None))
+        data_type = str(field.get("data_type") or "STRING").upper()
+        row = {
+            "field_code": code,
+            "category": field.get("category") or category,
+            "level": field.get("level") or level,
+            "jurisdiction": field.get("jurisdiction") or jurisdiction,
+            "description": field.get("description") or code,
+            "data_type": data_type if data_type in DATA_TYPES else "STRING",
+            "json_path": field.get("json_path") or json_paths.get(code),
+            "example_value": field.get("example_value"),
+            "required": _flag(field["required"]) if "required" in field else required,
+            "validation_pattern": field.get("validation_pattern") or pattern,
+        }
+        if row["json_path"] is None:
+            skipped.append(code)
+            continue
+        rows[code] = row
+
+    # The last definition of a (name, version) wins
+    unique_templates = {}
+    for template in templates:
+        template = dict(template, version=str(template.get("version", "1.0")))
+        unique_templates[(template["name"], template["version"])] = template
+    return rows, list(unique_templates.values()), skipped
+
+
+# ---------------------------------------------------------------------------
+# Import
+# ---------------------------------------------------------------------------
+
+def migrate(conn):
+    """Apply missing schema migrations; a current database costs one PRAGMA read"""
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= len(SCHEMA_MIGRATIONS):
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, statements in enumerate(SCHEMA_MIGRATIONS[version:], start=version + 1):
+        for statement in statements:
+            conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {number}")
+
+
+def _diff(existing, rows, key, columns):
+    """Split incoming rows into inserted / updated / unchanged keys"""
+    diff = {"inserted": [], "updated": [], "unchanged": []}
+    for row in rows:
+        old = existing.get(key(row))
+        if old is None:
+            diff["inserted"].append(key(row))
+        elif any(old[column] != row[column] for column in columns):
+            diff["updated"].append(key(row))
+        else:
+            diff["unchanged"].append(key(row))
+    return diff
+
+
+def import_registry(conn, fields, templates):
+    """Bulk upsert in one transaction; updated_at moves only on rows that changed.
+    Returns a diff summary for fields and templates"""
+    conn.row_factory = sqlite3.Row
+    existing_fields = {row["field_code"]: row for row in conn.execute(
+        f"SELECT {', '.join(FIELD_COLUMNS)} FROM field_registry")}
+    existing_templates = {(row["name"], row["version"]): row for row in conn.execute(
+        f"SELECT {', '.join(TEMPLATE_COLUMNS)} FROM templates")}
+
+    template_rows = [dict(template, field_codes=json.dumps(template["field_codes"]),
+                          description=template.get("description"), file_path=template.get("file_path"))
+                     for template in templates]
+    field_diff = _diff(existing_fields, fields, lambda row: row["field_code"], _FIELD_VALUE_COLUMNS)
+    template_diff = _diff(existing_templates, template_rows, lambda row: (row["name"], row["version"]),
+                          _TEMPLATE_VALUE_COLUMNS)
+    field_diff["not_in_sources"] = sorted(set(existing_fields) - {row["field_code"] for row in fields})
+
+    # Unchanged rows are not sent at all; the upsert's WHERE still guards against concurrent edits
+    changed_fields = set(field_diff["inserted"]) | set(field_diff["updated"])
+    changed_templates = set(template_diff["inserted"]) | set(template_diff["updated"])
+    with conn:
+        conn.executemany(FIELD_UPSERT_SQL, ([row[column] for column in FIELD_COLUMNS]
+                                            for row in fields if row["field_code"] in changed_fields))
+        conn.executemany(TEMPLATE_UPSERT_SQL, ([row[column] for column in TEMPLATE_COLUMNS]
+                                               for row in template_rows
+                                               if (row["name"], row["version"]) in changed_templates))
+    return {"fields": field_diff, "templates": template_diff}
+
+
+def create_database(db_path=None, sources=None):
+    """Create (or upgrade) the template registry and import field definitions.
+    Returns the import summary"""
+    db_path = db_path or default_db_path()
+    sources = [path for path in DEFAULT_SOURCES if path.exists()] if sources is None else sources
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+    started = time.perf_counter()
+    fields, templates, skipped = load_sources(sources)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            migrate(conn)
+        summary = import_registry(conn, list(fields.values()), templates)
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - started
+
+    summary["fields"]["skipped_without_json_path"] = skipped
+    summary["rows"] = len(fields) + len(templates)
+    summary["seconds"] = round(elapsed, 3)
+    summary["rows_per_sec"] = round(summary["rows"] / elapsed, 1) if elapsed else None
+
+    field_diff, template_diff = summary["fields"], summary["templates"]
+    print(f"✅ Database ready: {db_path}")
+    print(f"📥 Sources: {', '.join(str(path) for path in sources) or 'built-in templates only'}")
+    print(f"📊 Fields: {len(field_diff['inserted'])} inserted, {len(field_diff['updated'])} updated, "
+          f"{len(field_diff['unchanged'])} unchanged, {len(skipped)} skipped (no JSON path)")
+    print(f"📊 Templates: {len(template_diff['inserted'])} inserted, {len(template_diff['updated'])} updated, "
+          f"{len(template_diff['unchanged'])} unchanged")
+    print(f"⚡ {summary['rows']} rows in {elapsed:.3f}s ({summary['rows_per_sec']:,.0f} rows/sec)")
+    return summary
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='DOCScoin Template Registry Database Creator')
+    parser.add_argument('sources', nargs='*', help='Specification .md tables, .csv or .json field definitions '
+                                                   '(default: specification/template-fields-registry.md, '
+                                                   'field-mapping.md)')
+    parser.add_argument('--db', type=str, default=None,
+                        help='Template registry database (default: $DOCSCOIN_REGISTRY_DB or tools/template-registry.db)')
+    parser.add_argument('--summary', type=str, default=None, help='Write the full diff summary as JSON')
+    args = parser.parse_args()
+
+    summary = create_database(args.db, args.sources or None)
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+    return 0
+
 
 if __name__ == "__main__":
-    create_database()
\ No newline at end of file
+    sys.exit(main())
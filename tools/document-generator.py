@@ -4,99 +4,230 @@ DOCScoin Document Generator
 Generates documents from templates using field registry
 """
 
-import sqlite3
 import json
 import re
+import os
+import sys
+import time
+import hashlib
+import itertools
+import csv
 from pathlib import Path
 import argparse
 from datetime import datetime
+from typing import NamedTuple, Tuple
+
+from field_crypto import default_key_file, open_decryptor
+from json_path import Path as JsonPath, PathSet, compile_path, has_wildcard, resolve_path
+from registry import connect_registry, default_db_path, open_snapshot
+
+# Placeholders like {{FIELD:CODE}}
+PLACEHOLDER_RE = re.compile(r'\{\{([A-Z:_]+)\}\}')
+
+
+class Placeholder(NamedTuple):
+    """Compiled placeholder bound to a compiled JSON path"""
+    field_code: str
+    path: JsonPath
+    text: str
+    repeated: bool
+
+
+class CompiledTemplate(NamedTuple):
+    """Literal chunks and placeholders; paths resolves every placeholder in one walk"""
+    chunks: Tuple
+    paths: PathSet
+
+
+def compile_template(template_text, field_paths):
+    """Split a template into literal chunks and placeholders bound to JSON paths.
+    field_paths maps field_code -> compiled path; unknown codes raise ValueError"""
+    chunks = []
+    position = 0
+    for match in PLACEHOLDER_RE.finditer(template_text):
+        if match.start() > position:
+            chunks.append(template_text[position:match.start()])
+        field_code = match.group(1)
+        if field_code not in field_paths:
+            raise ValueError(f"Field code not found: {field_code}")
+        path = field_paths[field_code]
+        chunks.append(Placeholder(field_code, path, match.group(0), has_wildcard(path)))
+        position = match.end()
+    if position < len(template_text):
+        chunks.append(template_text[position:])
+    paths = PathSet([chunk.path for chunk in chunks if type(chunk) is Placeholder])
+    return CompiledTemplate(tuple(chunks), paths)
+
+
+def render_template(compiled, json_data, decryptor=None):
+    """Render a compiled template in one pass; returns (text, missing field codes).
+    [*] placeholders render their values comma-separated. With a decryptor, ENC[...]
+    values of the placeholders are decrypted in one batch (DecryptionError if one fails)"""
+    parts = []
+    missing = []
+    values = compiled.paths.extract(json_data)
+    if decryptor is not None:
+        values = decryptor.reveal_values(values)
+    values = iter(values)
+    for chunk in compiled.chunks:
+        if type(chunk) is str:
+            parts.append(chunk)
+            continue
+        value = next(values)
+        if chunk.repeated:
+            value = ', '.join(str(item) for item in value) if value else None
+        if value is not None:
+            parts.append(str(value))
+        else:
+            # Keep placeholder if value not found
+            parts.append(chunk.text)
+            missing.append(chunk.field_code)
+    return ''.join(parts), missing
+
+
+# Employment contract; {date} is filled in before placeholders are rendered
+CONTRACT_TEMPLATE = """
+EMPLOYMENT CONTRACT
+===================
+
+Contract ID: {{GLOBAL:IDENTIFIER:GUID}}
+
+EMPLOYEE INFORMATION:
+---------------------
+Passport: {{NATIONAL:RU:PASSPORT:SERIES}} {{NATIONAL:RU:PASSPORT:NUMBER}}
+Tax ID: {{NATIONAL:RU:TAX:INN}}
+
+Employee ID: {{ENTERPRISE:EMPLOYEE:ID}}
+Position: {{ENTERPRISE:EMPLOYEE:POSITION}}
+
+COMPENSATION:
+-------------
+Base Salary: {{ENTERPRISE:SALARY:BASE}} {{ENTERPRISE:SALARY:CURRENCY}}
+
+Date: {date}
+"""
+
+# Rows of the employee data CSV: (label, field code)
+EMPLOYEE_DATA_FIELDS = [
+    ("Global ID", 'GLOBAL:IDENTIFIER:GUID'),
+    ("Passport Series", 'NATIONAL:RU:PASSPORT:SERIES'),
+    ("Passport Number", 'NATIONAL:RU:PASSPORT:NUMBER'),
+    ("Employee ID", 'ENTERPRISE:EMPLOYEE:ID'),
+    ("Position", 'ENTERPRISE:EMPLOYEE:POSITION'),
+    ("Salary", 'ENTERPRISE:SALARY:BASE'),
+]
+
 
 class DocumentGenerator:
-    def __init__(self, db_path="tools/template-registry.db"):
-        self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
-        self.conn.row_factory = sqlite3.Row
+    # Compiled templates kept per generator instance
+    TEMPLATE_CACHE_SIZE = 256
+    
+    def __init__(self, db_path=None, snapshot=None, decryptor=None):
+        """The registry database is opened on first use; with snapshot (a RegistrySnapshot,
+        a MappedRegistry or a snapshot file) the generator never touches SQLite.
+        decryptor (field_crypto.FieldDecryptor) decrypts ENC[...] values that are rendered"""
+        self.db_path = db_path or default_db_path()
+        self.snapshot = open_snapshot(snapshot)
+        self.decryptor = decryptor
+        self._conn = None
+        self._field_paths = None
+        self._templates = {}
+    
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = connect_registry(self.db_path)
+        return self._conn
+    
+    def field_paths(self):
+        """field_code -> compiled JSON path, read from the registry once"""
+        if self._field_paths is None:
+            if self.snapshot is not None:
+                rows = self.snapshot.fields
+            else:
+                rows = self.conn.execute("SELECT field_code, json_path FROM field_registry").fetchall()
+            self._field_paths = {row['field_code']: compile_path(row['json_path']) for row in rows}
+        return self._field_paths
+    
+    def template(self, template_name):
+        """Template registry row by name, None if absent"""
+        if self.snapshot is not None:
+            return self.snapshot.template(template_name)
+        return self.conn.execute("SELECT * FROM templates WHERE name = ?", (template_name,)).fetchone()
+    
+    def invalidate(self):
+        """Forget cached registry paths and compiled templates (after registry edits)"""
+        self._field_paths = None
+        self._templates = {}
+    
+    def compile(self, template_text):
+        """Compiled form of a template, cached by its text"""
+        compiled = self._templates.get(template_text)
+        if compiled is None:
+            compiled = compile_template(template_text, self.field_paths())
+            if len(self._templates) >= self.TEMPLATE_CACHE_SIZE:
+                self._templates.clear()
+            self._templates[template_text] = compiled
+        return compiled
         
     def get_field_value(self, json_data, field_code):
         """Get value from JSON data using field code mapping"""
-        cursor = self.conn.cursor()
+        path = self.field_paths().get(field_code)
         
-        # Get field definition
-        cursor.execute(
-            "SELECT json_path, data_type FROM field_registry WHERE field_code = ?",
-            (field_code,)
-        )
-        field = cursor.fetchone()
-        
-        if not field:
+        if path is None:
             raise ValueError(f"Field code not found: {field_code}")
         
-        # Extract value using JSON path (simplified)
-        path = field['json_path'].replace('$.', '').split('.')
-        value = json_data
-        for key in path:
-            if key in value:
-                value = value[key]
-            else:
-                return None
-        
+        value = resolve_path(json_data, path)
+        if self.decryptor is not None:
+            value = self.decryptor.reveal_values([value])[0]
         return value
     
     def generate_from_template(self, template_text, json_data):
         """Replace placeholders in template text"""
-        
-        # Find all placeholders like {{FIELD:CODE}}
-        placeholders = re.findall(r'\{\{([A-Z:_]+)\}\}', template_text)
-        
-        result = template_text
-        for field_code in placeholders:
-            value = self.get_field_value(json_data, field_code)
-            if value is not None:
-                result = result.replace(f'{{{{{field_code}}}}}', str(value))
-            else:
-                # Keep placeholder if value not found
-                print(f"⚠️  Warning: No value for {field_code}")
-        
+        result, missing = render_template(self.compile(template_text), json_data, self.decryptor)
+        for field_code in missing:
+            print(f"⚠️  Warning: No value for {field_code}")
         return result
     
+    @classmethod
+    def from_field_paths(cls, field_paths, decryptor=None):
+        """Generator bound to an already loaded registry, without a database connection"""
+        generator = cls.__new__(cls)
+        generator.db_path = None
+        generator.snapshot = None
+        generator.decryptor = decryptor
+        generator._conn = None
+        generator._field_paths = dict(field_paths)
+        generator._templates = {}
+        return generator
+    
+    def render_contract(self, json_data, date=None):
+        """Employment contract text; returns (text, missing field codes)"""
+        template = CONTRACT_TEMPLATE.replace('{date}', date or datetime.now().strftime('%Y-%m-%d'))
+        return render_template(self.compile(template), json_data, self.decryptor)
+    
+    def render_employee_data(self, json_data):
+        """Employee data as Field,Value CSV text"""
+        csv_lines = ["Field,Value"]
+        csv_lines.extend(
+            f"{label},{self.get_field_value(json_data, field_code)}"
+            for label, field_code in EMPLOYEE_DATA_FIELDS
+        )
+        return '\n'.join(csv_lines)
+    
     def generate_word_template(self, template_name, json_data, output_path):
         """Generate Word document (simplified - creates .txt for now)"""
         
-        # Get template from database
-        cursor = self.conn.cursor()
-        cursor.execute(
-            "SELECT * FROM templates WHERE name = ?",
-            (template_name,)
-        )
-        template = cursor.fetchone()
+        # Get template from the registry
+        template = self.template(template_name)
         
         if not template:
             raise ValueError(f"Template not found: {template_name}")
         
-        # Simple template for demonstration
-        word_template = f"""
-        EMPLOYMENT CONTRACT
-        ===================
-        
-        Contract ID: {{GLOBAL:IDENTIFIER:GUID}}
-        
-        EMPLOYEE INFORMATION:
-        ---------------------
-        Passport: {{NATIONAL:RU:PASSPORT:SERIES}} {{NATIONAL:RU:PASSPORT:NUMBER}}
-        Tax ID: {{NATIONAL:RU:TAX:INN}}
-        
-        Employee ID: {{ENTERPRISE:EMPLOYEE:ID}}
-        Position: {{ENTERPRISE:EMPLOYEE:POSITION}}
-        
-        COMPENSATION:
-        -------------
-        Base Salary: {{ENTERPRISE:SALARY:BASE}} {{ENTERPRISE:SALARY:CURRENCY}}
-        
-        Date: {datetime.now().strftime('%Y-%m-%d')}
-        """
-        
         # Generate document
-        document = self.generate_from_template(word_template, json_data)
+        document, missing = self.render_contract(json_data)
+        for field_code in missing:
+            print(f"⚠️  Warning: No value for {field_code}")
         
         # Save to file
         with open(output_path, 'w', encoding='utf-8') as f:
@@ -108,55 +239,271 @@ class DocumentGenerator:
     def generate_excel_template(self, json_data, output_path):
         """Generate Excel data (CSV for demonstration)"""
         
-        # Simple CSV generation
-        csv_lines = [
-            "Field,Value",
-            f"Global ID,{self.get_field_value(json_data, 'GLOBAL:IDENTIFIER:GUID')}",
-            f"Passport Series,{self.get_field_value(json_data, 'NATIONAL:RU:PASSPORT:SERIES')}",
-            f"Passport Number,{self.get_field_value(json_data, 'NATIONAL:RU:PASSPORT:NUMBER')}",
-            f"Employee ID,{self.get_field_value(json_data, 'ENTERPRISE:EMPLOYEE:ID')}",
-            f"Position,{self.get_field_value(json_data, 'ENTERPRISE:EMPLOYEE:POSITION')}",
-            f"Salary,{self.get_field_value(json_data, 'ENTERPRISE:SALARY:BASE')}",
-        ]
-        
         with open(output_path, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(csv_lines))
+            f.write(self.render_employee_data(json_data))
         
         print(f"✅ Excel data generated: {output_path}")
     
+    def export_table(self, profiles, field_codes, output_path, batch_size=10000):
+        """Write one wide table (one row per profile, one column per field code).
+        .csv streams rows through a buffered csv writer; .parquet writes row groups
+        of batch_size via pyarrow. Memory does not grow with the number of profiles.
+        Returns the number of rows written"""
+        paths = [self.field_paths().get(code) for code in field_codes]
+        for code, path in zip(field_codes, paths):
+            if path is None:
+                raise ValueError(f"Field code not found: {code}")
+        
+        # All columns come from one walk of each profile
+        columns = PathSet(paths)
+        
+        def rows():
+            for json_data in profiles:
+                values = columns.extract(json_data)
+                if self.decryptor is not None:
+                    values = self.decryptor.reveal_values(values)
+                yield [export_cell(value) for value in values]
+        
+        if output_path.endswith('.parquet'):
+            count = write_parquet(rows(), field_codes, output_path, batch_size)
+        else:
+            count = 0
+            with open(output_path, 'w', encoding='utf-8', newline='', buffering=1 << 20) as f:
+                writer = csv.writer(f)
+                writer.writerow(field_codes)
+                for row in rows():
+                    writer.writerow(row)
+                    count += 1
+        
+        print(f"✅ Table exported: {output_path} ({count} rows x {len(field_codes)} fields)")
+        return count
+    
     def close(self):
-        self.conn.close()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def export_cell(value):
+    """Cell value for the export table: nested values as JSON, missing as empty"""
+    if value is None:
+        return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def write_parquet(rows, columns, output_path, batch_size=10000):
+    """Stream rows into a Parquet file one row group at a time (requires pyarrow)"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export requires pyarrow: pip install pyarrow")
+    
+    schema = pa.schema([(column, pa.string()) for column in columns])
+    count = 0
+    with pq.ParquetWriter(output_path, schema, compression='zstd') as writer:
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            arrays = [pa.array([row[i] for row in batch], type=pa.string()) for i in range(len(columns))]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(batch)
+    return count
+
+
+# ---------------------------------------------------------------------------
+# Batch generation
+# ---------------------------------------------------------------------------
+
+def output_basename(json_data, source):
+    """Deterministic, collision-free base name for one profile's outputs.
+    Readable part from the employee/global ID, uniqueness from the input source key"""
+    if not isinstance(json_data, dict):
+        json_data = {}
+    enterprise = json_data.get('enterprise_data')
+    employee = enterprise.get('employee') if isinstance(enterprise, dict) else None
+    readable = ((employee.get('employee_id') if isinstance(employee, dict) else None)
+                or json_data.get('global_unique_id') or 'profile')
+    readable = re.sub(r'[^A-Za-z0-9._-]+', '_', str(readable))[:64]
+    digest = hashlib.sha256(source.encode('utf-8')).hexdigest()[:10]
+    return f"{readable}_{digest}"
+
+
+def output_paths(output_dir, basename):
+    return {
+        'contract': os.path.join(output_dir, f"contract_{basename}.txt"),
+        'employee_data': os.path.join(output_dir, f"employee_data_{basename}.csv"),
+    }
+
+
+def write_atomic(path, text):
+    """Write via a temp file and rename, so a file that exists is always complete"""
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def iter_profiles(data):
+    """Yield (source key, file path, raw JSON text) for a JSON file, a directory of
+    JSON files or a JSON Lines file. Source keys are stable between runs"""
+    path = Path(data)
+    if path.is_dir():
+        for file_path in sorted(path.rglob('*.json')):
+            yield str(file_path.resolve()), str(file_path), None
+    elif path.suffix == '.jsonl':
+        source = str(path.resolve())
+        with open(path, 'r', encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    yield f"{source}:{number}", None, line
+    else:
+        yield str(path.resolve()), str(path), None
+
+
+def load_profiles(data):
+    """Parsed profiles from a JSON file, directory or JSON Lines file (lazily)"""
+    for _, path, text in iter_profiles(data):
+        if path is not None:
+            with open(path, 'r', encoding='utf-8') as f:
+                yield json.load(f)
+        else:
+            yield json.loads(text)
+
+
+_worker = None
+
+
+def _init_worker(field_paths, output_dir, date, resume, key_file=None):
+    """Per-process state: a generator over the parent's registry, no SQLite; keys are opened per process"""
+    global _worker
+    decryptor = open_decryptor(key_file) if key_file else None
+    _worker = (DocumentGenerator.from_field_paths(field_paths, decryptor), output_dir, date, resume)
+
+
+def _generate_profile(record):
+    """Render every template for one profile; returns a status dict"""
+    generator, output_dir, date, resume = _worker
+    source, path, text = record
+    try:
+        if path is not None:
+            with open(path, 'r', encoding='utf-8') as f:
+                json_data = json.load(f)
+        else:
+            json_data = json.loads(text)
+        if not isinstance(json_data, dict):
+            raise ValueError(f"profile must be a JSON object, got {type(json_data).__name__}")
+        
+        paths = output_paths(output_dir, output_basename(json_data, source))
+        if resume and all(os.path.exists(p) for p in paths.values()):
+            return {"source": source, "status": "skipped", "documents": 0}
+        
+        contract, missing = generator.render_contract(json_data, date)
+        employee_data = generator.render_employee_data(json_data)
+        write_atomic(paths['contract'], contract)
+        write_atomic(paths['employee_data'], employee_data)
+        return {"source": source, "status": "generated", "documents": len(paths), "missing": missing}
+    except (OSError, ValueError) as e:
+        return {"source": source, "status": "error", "documents": 0, "error": str(e)}
+
+
+def generate_batch(field_paths, records, output_dir, workers=1, resume=True, date=None, chunksize=32,
+                   key_file=None):
+    """Render all templates for every profile on a worker pool.
+    Yields per-profile status dicts (order not guaranteed with workers > 1)"""
+    initargs = (field_paths, output_dir, date or datetime.now().strftime('%Y-%m-%d'), resume, key_file)
+    if workers <= 1:
+        _init_worker(*initargs)
+        yield from map(_generate_profile, records)
+        return
+    
+    # Profiles are fed in bounded windows so huge inputs are never held in memory
+    window = workers * chunksize * 4
+    records = iter(records)
+    from multiprocessing import Pool
+    with Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+        while True:
+            batch = list(itertools.islice(records, window))
+            if not batch:
+                break
+            yield from pool.imap_unordered(_generate_profile, batch, chunksize)
+
 
 def main():
     parser = argparse.ArgumentParser(description='DOCScoin Document Generator')
-    parser.add_argument('--data', type=str, required=True, help='JSON data file')
+    parser.add_argument('--data', type=str, required=True,
+                        help='JSON data file, directory of JSON files or JSON Lines file')
     parser.add_argument('--template', type=str, default='Employment Contract (RU)', help='Template name')
+    parser.add_argument('--db', type=str, default=None,
+                        help='Template registry database (default: $DOCSCOIN_REGISTRY_DB or tools/template-registry.db)')
+    parser.add_argument('--snapshot', type=str, default=None,
+                        help='Registry snapshot file (registry.py compile or snapshot); no database is opened')
+    parser.add_argument('--key-file', type=str, default=None,
+                        help='Field key file for ENC[...] values (default: $DOCSCOIN_FIELD_KEY)')
     parser.add_argument('--output-dir', type=str, default='output', help='Output directory')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes for batch input')
+    parser.add_argument('--no-resume', action='store_true', help='Regenerate outputs that already exist')
+    parser.add_argument('--export', type=str, default=None,
+                        help='Write one wide table for all profiles instead (.csv or .parquet)')
+    parser.add_argument('--fields', nargs='+', default=[code for _, code in EMPLOYEE_DATA_FIELDS],
+                        help='Field codes (columns) for --export')
     
     args = parser.parse_args()
     
+    # Initialize generator
+    key_file = args.key_file or default_key_file()
+    generator = DocumentGenerator(args.db, snapshot=args.snapshot, decryptor=open_decryptor(key_file))
+    
+    if args.export:
+        generator.export_table(load_profiles(args.data), args.fields, args.export)
+        generator.close()
+        return 0
+    
     # Create output directory
-    Path(args.output_dir).mkdir(exist_ok=True)
+    Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+    
+    if Path(args.data).is_dir() or args.data.endswith('.jsonl'):
+        # Batch mode: the template must exist, registry is loaded once and shared
+        if not generator.template(args.template):
+            raise ValueError(f"Template not found: {args.template}")
+        field_paths = generator.field_paths()
+        generator.close()
+        
+        started = time.perf_counter()
+        counts = {"generated": 0, "skipped": 0, "error": 0}
+        documents = 0
+        for result in generate_batch(field_paths, iter_profiles(args.data), args.output_dir,
+                                     workers=args.workers, resume=not args.no_resume, key_file=key_file):
+            counts[result["status"]] += 1
+            documents += result["documents"]
+            if result["status"] == "error":
+                print(f"❌ {result['source']}: {result['error']}")
+        elapsed = time.perf_counter() - started
+        
+        print(f"\n🎉 Profiles: {counts['generated']} generated, {counts['skipped']} skipped (already complete), "
+              f"{counts['error']} failed")
+        print(f"📄 Documents written: {documents} in {elapsed:.2f}s "
+              f"({documents / elapsed if elapsed else 0:,.0f} docs/sec)")
+        return 1 if counts['error'] else 0
     
     # Load JSON data
     with open(args.data, 'r', encoding='utf-8') as f:
         json_data = json.load(f)
     
-    # Initialize generator
-    generator = DocumentGenerator()
-    
-    # Generate documents
-    word_output = f"{args.output_dir}/contract_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-    generator.generate_word_template(args.template, json_data, word_output)
-    
-    excel_output = f"{args.output_dir}/employee_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    generator.generate_excel_template(json_data, excel_output)
+    # Generate documents (names are derived from the profile and input path, not the clock)
+    paths = output_paths(args.output_dir, output_basename(json_data, str(Path(args.data).resolve())))
+    generator.generate_word_template(args.template, json_data, paths['contract'])
+    generator.generate_excel_template(json_data, paths['employee_data'])
     
     generator.close()
     
     print(f"\n🎉 Documents generated in: {args.output_dir}/")
     print("📄 Word-like document (TXT): contract_*.txt")
     print("📊 Excel data (CSV): employee_data_*.csv")
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+DOCScoin Field Encryption
+Decryption of ENC[ALGORITHM](payload) field values for the validator and the
+document generator
+
+Format:
+    ENC[AES256_GCM](<base64 of 12-byte nonce + ciphertext + 16-byte tag>)
+
+Keys live in a local key file (JSON: algorithm, key_id, base64 key) created by
+the keygen command. AES-256-GCM uses the optional 'cryptography' package; it is
+imported only when a key is actually opened.
+
+Values are decrypted on demand: callers hand over only the values a rule or a
+template touched. Plaintexts are cached in a bounded LRU with a TTL; cached
+bytes are overwritten with zeros when they expire or are evicted. (Strings
+returned to the caller are ordinary Python strings and cannot be wiped.)
+
+Usage:
+    python tools/field_crypto.py keygen --output field.key
+    python tools/field_crypto.py encrypt --key-file field.key --path '$.national_data.ru.inn' \\
+        profile.json encrypted-profile.json
+"""
+
+import base64
+import binascii
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+from json_path import compile_path, resolve_path
+
+ENCRYPTED_RE = re.compile(r"ENC\[([A-Z0-9_]+)\]\((.*)\)\Z", re.DOTALL)
+NONCE_SIZE = 12
+TAG_SIZE = 16
+KEY_SIZE = 32
+
+
+class DecryptionError(ValueError):
+    """An ENC[...] value cannot be decrypted (unknown algorithm, malformed payload, wrong key)"""
+
+
+def is_encrypted(value) -> bool:
+    return isinstance(value, str) and value.startswith("ENC[") and ENCRYPTED_RE.match(value) is not None
+
+
+def default_key_file() -> Optional[str]:
+    """Field key file from $DOCSCOIN_FIELD_KEY, if set"""
+    return os.environ.get("DOCSCOIN_FIELD_KEY") or None
+
+
+def generate_key_file(path: str, key_id: Optional[str] = None):
+    """Write a new random AES-256 key file readable only by its owner"""
+    data = {
+        "algorithm": AESGCMCipher.algorithm,
+        "key_id": key_id or binascii.hexlify(os.urandom(4)).decode(),
+        "key": base64.b64encode(os.urandom(KEY_SIZE)).decode(),
+    }
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+def load_key(path: str) -> bytearray:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("algorithm") != AESGCMCipher.algorithm:
+        raise ValueError(f"Unsupported key algorithm in {path}: {data.get('algorithm')}")
+    key = bytearray(base64.b64decode(data["key"]))
+    if len(key) != KEY_SIZE:
+        raise ValueError(f"Key in {path} must be {KEY_SIZE} bytes, got {len(key)}")
+    return key
+
+
+def _wipe(buffer: bytearray):
+    buffer[:] = bytes(len(buffer))
+
+
+class AESGCMCipher:
+    """AES-256-GCM; one instance is one cipher context, reused for every value"""
+    algorithm = "AES256_GCM"
+
+    def __init__(self, key: bytes):
+        try:
+            from cryptography.exceptions import InvalidTag
+            from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        except ImportError:
+            raise RuntimeError("AES-256-GCM field decryption needs the 'cryptography' package "
+                               "(pip install cryptography)") from None
+        if len(key) != KEY_SIZE:
+            raise ValueError(f"AES-256-GCM key must be {KEY_SIZE} bytes")
+        self._aead = AESGCM(bytes(key))
+        self._invalid_tag = InvalidTag
+
+    def encrypt(self, plaintext: str) -> str:
+        nonce = os.urandom(NONCE_SIZE)
+        data = nonce + self._aead.encrypt(nonce, plaintext.encode("utf-8"), None)
+        return f"ENC[{self.algorithm}]({base64.b64encode(data).decode()})"
+
+    def decrypt(self, payload: str) -> bytes:
+        try:
+            data = base64.b64decode(payload, validate=True)
+        except (binascii.Error, ValueError):
+            raise DecryptionError("payload is not base64") from None
+        if len(data) < NONCE_SIZE + TAG_SIZE:
+            raise DecryptionError("payload is too short for nonce and tag")
+        try:
+            return self._aead.decrypt(data[:NONCE_SIZE], data[NONCE_SIZE:], None)
+        except self._invalid_tag:
+            raise DecryptionError("authentication failed (wrong key or modified value)") from None
+
+
+class FieldDecryptor:
+    """Decrypts ENC[...] values with pluggable ciphers and a bounded, expiring plaintext cache.
+
+    A cipher is any object with an `algorithm` name and `decrypt(payload) -> bytes`."""
+
+    def __init__(self, ciphers: Iterable, max_entries: int = 4096, ttl: float = 300.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self._ciphers = {cipher.algorithm: cipher for cipher in ciphers}
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        # ciphertext -> (plaintext bytes, expiry time), least recently used first
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+
+    @classmethod
+    def from_key_file(cls, path: str, **options) -> "FieldDecryptor":
+        key = load_key(path)
+        try:
+            return cls([AESGCMCipher(key)], **options)
+        finally:
+            _wipe(key)
+
+    def reveal(self, value):
+        """Plaintext of an ENC[...] value; any other value is returned unchanged"""
+        return self.reveal_many([value])[0]
+
+    def reveal_many(self, values: Iterable, raise_errors: bool = True) -> List:
+        """Decrypt every ENC[...] value in one batch, each distinct ciphertext once.
+        With raise_errors=False a failing value is replaced by its DecryptionError"""
+        results = list(values)
+        pending: Dict[str, List[int]] = {}
+        now = self._clock()
+        with self._lock:
+            for index, value in enumerate(results):
+                if not is_encrypted(value):
+                    continue
+                entry = self._cache.get(value)
+                if entry is not None and entry[1] > now:
+                    self._cache.move_to_end(value)
+                    self.stats["hits"] += 1
+                    results[index] = entry[0].decode("utf-8")
+                    continue
+                if entry is not None:
+                    self._discard(value)
+                    self.stats["expired"] += 1
+                pending.setdefault(value, []).append(index)
+
+        for ciphertext, indexes in pending.items():
+            try:
+                plaintext = self._decrypt(ciphertext)
+            except DecryptionError as e:
+                if raise_errors:
+                    raise
+                for index in indexes:
+                    results[index] = e
+                continue
+            text = plaintext.decode("utf-8")
+            with self._lock:
+                self.stats["misses"] += 1
+                self._store(ciphertext, plaintext, now + self.ttl)
+            for index in indexes:
+                results[index] = text
+        return results
+
+    def reveal_values(self, values: List, raise_errors: bool = True) -> List:
+        """reveal_many over extracted field values, where [*] fields are lists of values"""
+        positions, ciphertexts = [], []
+        for i, value in enumerate(values):
+            if isinstance(value, list):
+                positions.extend((i, j) for j, item in enumerate(value) if is_encrypted(item))
+                ciphertexts.extend(item for item in value if is_encrypted(item))
+            elif is_encrypted(value):
+                positions.append((i, None))
+                ciphertexts.append(value)
+        if not ciphertexts:
+            return values
+
+        values = list(values)
+        copied = set()
+        for (i, j), plaintext in zip(positions, self.reveal_many(ciphertexts, raise_errors)):
+            if j is None:
+                values[i] = plaintext
+                continue
+            if i not in copied:
+                # The list belongs to the caller's document; never write plaintext into it
+                values[i] = list(values[i])
+                copied.add(i)
+            values[i][j] = plaintext
+        return values
+
+    def _decrypt(self, ciphertext: str) -> bytearray:
+        algorithm, payload = ENCRYPTED_RE.match(ciphertext).groups()
+        cipher = self._ciphers.get(algorithm)
+        if cipher is None:
+            raise DecryptionError(f"No key for {algorithm} values")
+        plaintext = bytearray(cipher.decrypt(payload))
+        try:
+            plaintext.decode("utf-8")
+        except UnicodeDecodeError:
+            _wipe(plaintext)
+            raise DecryptionError("plaintext is not UTF-8 text") from None
+        return plaintext
+
+    def _store(self, ciphertext: str, plaintext: bytearray, expires: float):
+        if ciphertext in self._cache:
+            self._discard(ciphertext)
+        self._cache[ciphertext] = (plaintext, expires)
+        while len(self._cache) > self.max_entries:
+            _, (evicted, _) = self._cache.popitem(last=False)
+            _wipe(evicted)
+            self.stats["evicted"] += 1
+
+    def _discard(self, ciphertext: str):
+        plaintext, _ = self._cache.pop(ciphertext)
+        _wipe(plaintext)
+
+    def clear(self):
+        """Wipe and drop every cached plaintext"""
+        with self._lock:
+            for plaintext, _ in self._cache.values():
+                _wipe(plaintext)
+            self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
+
+
+def open_decryptor(key_file: Optional[str] = None) -> Optional[FieldDecryptor]:
+    """Decryptor for key_file (or $DOCSCOIN_FIELD_KEY); None when no key is configured"""
+    key_file = key_file or default_key_file()
+    return FieldDecryptor.from_key_file(key_file) if key_file else None
+
+
+def encrypt_fields(json_data: Dict, json_paths: Iterable[str], cipher: AESGCMCipher) -> int:
+    """Encrypt the string values at json_paths in place; returns how many were encrypted"""
+    count = 0
+    for json_path in json_paths:
+        path = compile_path(json_path)
+        parent = resolve_path(json_data, path[:-1])
+        key = path[-1]
+        if isinstance(parent, dict) and isinstance(parent.get(key), str) and not is_encrypted(parent[key]):
+            parent[key] = cipher.encrypt(parent[key])
+            count += 1
+    return count
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='DOCScoin Field Encryption')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    keygen = subparsers.add_parser('keygen', help='Create a local AES-256-GCM key file')
+    keygen.add_argument('--output', type=str, required=True)
+    keygen.add_argument('--key-id', type=str, default=None)
+
+    encrypt = subparsers.add_parser('encrypt', help='Encrypt fields of a JSON profile')
+    encrypt.add_argument('--key-file', type=str, required=True)
+    encrypt.add_argument('--path', action='append', required=True, dest='paths',
+                         help='JSON path of a field to encrypt (repeatable)')
+    encrypt.add_argument('input', type=str)
+    encrypt.add_argument('output', type=str)
+
+    args = parser.parse_args()
+    if args.command == 'keygen':
+        generate_key_file(args.output, args.key_id)
+        print(f"✅ Key file created: {args.output}")
+        return
+
+    key = load_key(args.key_file)
+    cipher = AESGCMCipher(key)
+    _wipe(key)
+    with open(args.input, 'r', encoding='utf-8') as f:
+        json_data = json.load(f)
+    count = encrypt_fields(json_data, args.paths, cipher)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(json_data, f, ensure_ascii=False, indent=2)
+    print(f"✅ {count} fields encrypted: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
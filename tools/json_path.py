@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+DOCScoin JSON Paths
+Compiled registry JSON paths shared by the validator and the document generator
+
+Syntax:
+    $.a.b.c              nested object keys
+    $.items[0]           array index (negative counts from the end)
+    $.items[*].name      every array element (or every object value)
+    $['key.with.dots']   quoted key; \\' \\" and \\\\ escape inside quotes
+    $.a\\.b               backslash escapes '.', '[' and '\\' in a bare key
+
+A path compiles to an accessor tuple: str steps are object keys, int steps are
+array indexes and WILDCARD expands to every element. Plain dotted paths compile
+to the same key tuples the tools used before.
+"""
+
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple, Union
+
+
+class _Wildcard:
+    """The [*] step; a singleton so compiled paths pickle and compare by identity"""
+    __slots__ = ()
+
+    def __repr__(self):
+        return "WILDCARD"
+
+    def __reduce__(self):
+        return "WILDCARD"
+
+
+WILDCARD = _Wildcard()
+
+Step = Union[str, int, _Wildcard]
+Path = Tuple[Step, ...]
+
+
+def compile_path(json_path: str) -> Path:
+    """Compile a registry path like '$.a.b[0].c' into an accessor tuple; ValueError if malformed"""
+    text = json_path[1:] if json_path.startswith('$') else json_path
+    if text and text[0] not in '.[':
+        # Paths without the leading '$.' are taken as relative keys
+        text = '.' + text
+    steps: List[Step] = []
+    i, n = 0, len(text)
+    while i < n:
+        char = text[i]
+        if char == '.':
+            i += 1
+            key = []
+            while i < n and text[i] not in '.[':
+                if text[i] == '\\' and i + 1 < n:
+                    i += 1
+                key.append(text[i])
+                i += 1
+            if not key:
+                raise ValueError(f"Empty key in JSON path: {json_path}")
+            steps.append(''.join(key))
+        elif char == '[':
+            end = i + 1
+            if end < n and text[end] in '\'"':
+                quote, end, key = text[end], end + 1, []
+                while end < n and text[end] != quote:
+                    if text[end] == '\\' and end + 1 < n:
+                        end += 1
+                    key.append(text[end])
+                    end += 1
+                if text[end + 1:end + 2] != ']':
+                    raise ValueError(f"Unterminated quoted key in JSON path: {json_path}")
+                steps.append(''.join(key))
+                i = end + 2
+                continue
+            close = text.find(']', end)
+            if close < 0:
+                raise ValueError(f"Unterminated bracket in JSON path: {json_path}")
+            inner = text[end:close].strip()
+            if inner == '*':
+                steps.append(WILDCARD)
+            else:
+                try:
+                    steps.append(int(inner))
+                except ValueError:
+                    raise ValueError(f"Invalid index [{inner}] in JSON path: {json_path}") from None
+            i = close + 1
+        else:
+            raise ValueError(f"Unexpected '{char}' in JSON path: {json_path}")
+    return tuple(steps)
+
+
+def has_wildcard(path: Path) -> bool:
+    return any(step is WILDCARD for step in path)
+
+
+def _children(value):
+    if isinstance(value, list):
+        return value
+    if isinstance(value, dict):
+        return value.values()
+    return ()
+
+
+_MISSING = object()
+
+
+def _step(value, step):
+    """One accessor step; _MISSING if it does not apply to value"""
+    if type(step) is str:
+        if isinstance(value, dict) and step in value:
+            return value[step]
+    elif isinstance(value, list) and -len(value) <= step < len(value):
+        return value[step]
+    return _MISSING
+
+
+def resolve_path(data: Any, path: Path):
+    """Resolve a compiled path. Without wildcards: the value, or None if any step is
+    missing. With wildcards: the list of every value found (possibly empty)"""
+    if has_wildcard(path):
+        found: List[Any] = []
+        _collect(data, path, found)
+        return found
+    value = data
+    for step in path:
+        value = _step(value, step)
+        if value is _MISSING:
+            return None
+    return value
+
+
+def _collect(value, path: Path, found: List[Any]):
+    for position, step in enumerate(path):
+        if step is WILDCARD:
+            for child in _children(value):
+                _collect(child, path[position + 1:], found)
+            return
+        value = _step(value, step)
+        if value is _MISSING:
+            return
+    found.append(value)
+
+
+class _Node(NamedTuple):
+    """Path trie node: output slots ending here and (step, child) branches"""
+    slots: Tuple[int, ...]
+    branches: Tuple[Tuple[Step, '_Node'], ...]
+
+
+def _group_key(step: Step):
+    # Key "0" and index 0 are different steps
+    return step if step is WILDCARD else (type(step), step)
+
+
+def _build_trie(paths: Sequence[Path], depth: int, indexes: Sequence[int]) -> _Node:
+    slots = tuple(i for i in indexes if len(paths[i]) == depth)
+    groups: Dict[Any, List[int]] = {}
+    order: List[Step] = []
+    for i in indexes:
+        if len(paths[i]) > depth:
+            step = paths[i][depth]
+            if _group_key(step) not in groups:
+                groups[_group_key(step)] = []
+                order.append(step)
+            groups[_group_key(step)].append(i)
+    branches = tuple((step, _build_trie(paths, depth + 1, groups[_group_key(step)])) for step in order)
+    return _Node(slots, branches)
+
+
+class PathSet:
+    """Many compiled paths resolved together in a single walk of a document.
+
+    Paths sharing a prefix share the walk; extract() returns values in path order
+    with the same results resolve_path() would give for each path."""
+
+    def __init__(self, paths: Sequence[Path]):
+        self.paths = tuple(paths)
+        self._multi = tuple(has_wildcard(path) for path in self.paths)
+        self._root = _build_trie(self.paths, 0, range(len(self.paths)))
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __reduce__(self):
+        return (PathSet, (self.paths,))
+
+    def extract(self, data: Any) -> List[Any]:
+        results: List[Any] = [[] if multi else None for multi in self._multi]
+        self._walk(self._root, data, results, False)
+        return results
+
+    def _walk(self, node: _Node, value, results, collecting):
+        for slot in node.slots:
+            if collecting:
+                results[slot].append(value)
+            else:
+                results[slot] = value
+        for step, child in node.branches:
+            if step is WILDCARD:
+                for item in _children(value):
+                    self._walk(child, item, results, True)
+            else:
+                item = _step(value, step)
+                if item is not _MISSING:
+                    self._walk(child, item, results, collecting)
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+DOCScoin Registry Access
+Locates and opens the template registry lazily, or serves it from a snapshot:
+an in-memory JSON snapshot, or a compiled read-only snapshot that is memory-mapped
+
+Usage:
+    python tools/registry.py snapshot --output registry-snapshot.json [--db PATH]
+    python tools/registry.py compile --output registry.snap [--db PATH]
+    python tools/registry.py info registry.snap
+
+SQLite is imported only when a database is actually opened, so tools running
+from a snapshot have no SQLite dependency at runtime.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+from urllib.parse import quote
+
+if TYPE_CHECKING:
+    import sqlite3
+
+# Next to the tools, wherever the process was started from
+DEFAULT_DB_PATH = str(Path(__file__).resolve().parent / "template-registry.db")
+
+FIELD_COLUMNS = (
+    "field_code", "category", "level", "jurisdiction", "description", "data_type",
+    "json_path", "example_value", "required", "validation_pattern"
+)
+TEMPLATE_COLUMNS = ("id", "name", "template_type", "description", "file_path", "field_codes", "version")
+
+
+def default_db_path() -> str:
+    """Registry database path: $DOCSCOIN_REGISTRY_DB or tools/template-registry.db"""
+    return os.environ.get("DOCSCOIN_REGISTRY_DB") or DEFAULT_DB_PATH
+
+
+def connect_registry(db_path: Optional[str] = None) -> "sqlite3.Connection":
+    """Read-only connection to an existing registry database (never creates an empty one)"""
+    import sqlite3
+    
+    path = os.path.abspath(db_path or default_db_path())
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Registry database not found: {path} (run create_database.py or pass a snapshot)")
+    conn = sqlite3.connect(f"file:{quote(path)}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class RegistrySnapshot:
+    """field_registry and templates rows held in memory; rows are dicts keyed like sqlite3.Row"""
+
+    def __init__(self, fields: List[Dict], templates: List[Dict]):
+        self.fields = tuple(fields)
+        self.templates = tuple(templates)
+        self._templates_by_name = {}
+        for template in self.templates:
+            self._templates_by_name.setdefault(template["name"], template)
+
+    @classmethod
+    def from_connection(cls, conn: "sqlite3.Connection") -> "RegistrySnapshot":
+        import sqlite3
+        
+        conn.row_factory = sqlite3.Row
+        fields = [{column: row[column] for column in FIELD_COLUMNS}
+                  for row in conn.execute(f"SELECT {', '.join(FIELD_COLUMNS)} FROM field_registry ORDER BY field_code")]
+        templates = [{column: row[column] for column in TEMPLATE_COLUMNS}
+                     for row in conn.execute(f"SELECT {', '.join(TEMPLATE_COLUMNS)} FROM templates ORDER BY id")]
+        return cls(fields, templates)
+
+    @classmethod
+    def from_database(cls, db_path: Optional[str] = None) -> "RegistrySnapshot":
+        conn = connect_registry(db_path)
+        try:
+            return cls.from_connection(conn)
+        finally:
+            conn.close()
+
+    @classmethod
+    def load(cls, path: str) -> "RegistrySnapshot":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["fields"], data["templates"])
+
+    def save(self, path: str):
+        """Write the snapshot atomically (temp file + rename)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"fields": list(self.fields), "templates": list(self.templates)}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def required_fields(self) -> List[Dict]:
+        return [row for row in self.fields if row["required"]]
+
+    def template(self, name: str) -> Optional[Dict]:
+        return self._templates_by_name.get(name)
+
+
+# ---------------------------------------------------------------------------
+# Compiled snapshot
+# ---------------------------------------------------------------------------
+#
+# Layout (little-endian):
+#   header   magic, format version, field count, template count,
+#            cells offset, strings offset, total size, SHA-256 of everything after the header
+#   cells    one CELL per column, fields sorted by field_code, then templates
+#   strings  UTF-8 text referenced by (offset, length) from the cells
+#
+# Nothing is parsed or hashed on open: rows are views that decode a cell when it is
+# read, so every process mapping the file shares the same page-cached bytes. The
+# SHA-256 is checked on request (verify=True, 'registry.py info').
+
+SNAPSHOT_MAGIC = b"DOCSREG\0"
+SNAPSHOT_FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sHHIIQQQ32s")
+# kind, int value or string offset, string length
+CELL = struct.Struct("<Bqi")
+CELL_NULL, CELL_INT, CELL_TEXT = 0, 1, 2
+
+
+class SnapshotError(ValueError):
+    """The snapshot file is not a registry snapshot, has another format or fails its hash"""
+
+
+def compile_snapshot(registry: RegistrySnapshot, output_path: str) -> str:
+    """Write registry as a compiled snapshot (atomically, read-only); returns its SHA-256"""
+    fields = sorted(registry.fields, key=lambda row: row["field_code"])
+    strings = bytearray()
+    string_offsets: Dict[bytes, int] = {}
+    cells = bytearray()
+    
+    def add_cell(value):
+        if value is None:
+            cells.extend(CELL.pack(CELL_NULL, 0, 0))
+        elif isinstance(value, int):
+            cells.extend(CELL.pack(CELL_INT, int(value), 0))
+        else:
+            data = str(value).encode("utf-8")
+            if data not in string_offsets:
+                string_offsets[data] = len(strings)
+                strings.extend(data)
+            cells.extend(CELL.pack(CELL_TEXT, string_offsets[data], len(data)))
+    
+    for row in fields:
+        for column in FIELD_COLUMNS:
+            add_cell(row[column])
+    for row in registry.templates:
+        for column in TEMPLATE_COLUMNS:
+            add_cell(row[column])
+    
+    cells_offset = HEADER.size
+    strings_offset = cells_offset + len(cells)
+    payload = bytes(cells) + bytes(strings)
+    digest = hashlib.sha256(payload).digest()
+    header = HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, 0, len(fields), len(registry.templates),
+                         cells_offset, strings_offset, HEADER.size + len(payload), digest)
+    
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(payload)
+    os.chmod(tmp_path, 0o444)
+    os.replace(tmp_path, output_path)
+    return digest.hex()
+
+
+class _MappedRow:
+    """Read-only row over snapshot cells, indexed by column name like sqlite3.Row"""
+    __slots__ = ("_snapshot", "_base", "_columns")
+    
+    def __init__(self, snapshot, base, columns):
+        self._snapshot = snapshot
+        self._base = base
+        self._columns = columns
+    
+    def __getitem__(self, column):
+        return self._snapshot._cell(self._base + self._columns.index(column) * CELL.size)
+    
+    def get(self, column, default=None):
+        return self[column] if column in self._columns else default
+    
+    def keys(self):
+        return list(self._columns)
+
+
+class _MappedRows(Sequence):
+    def __init__(self, snapshot, offset, count, columns):
+        self._snapshot = snapshot
+        self._offset = offset
+        self._count = count
+        self._columns = columns
+        self._stride = CELL.size * len(columns)
+    
+    def __len__(self):
+        return self._count
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return _MappedRow(self._snapshot, self._offset + index * self._stride, self._columns)
+
+
+class MappedRegistry:
+    """Compiled snapshot opened with mmap; same interface as RegistrySnapshot.
+    Opening checks the header, format version and size; verify=True also hashes the payload"""
+    
+    def __init__(self, path: str, verify: bool = False):
+        self.path = path
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise SnapshotError(f"Not a registry snapshot: {path}")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, field_count, template_count,
+         cells_offset, self._strings_offset, size, digest) = HEADER.unpack_from(self._map, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise SnapshotError(f"Not a registry snapshot: {path}")
+        if version != SNAPSHOT_FORMAT_VERSION:
+            raise SnapshotError(f"Unsupported snapshot format {version} (expected {SNAPSHOT_FORMAT_VERSION}): {path}")
+        if size != len(self._map):
+            raise SnapshotError(f"Truncated registry snapshot: {path}")
+        if verify and hashlib.sha256(self._map[HEADER.size:]).digest() != digest:
+            raise SnapshotError(f"Registry snapshot hash mismatch: {path}")
+        self.sha256 = digest.hex()
+        self.fields = _MappedRows(self, cells_offset, field_count, FIELD_COLUMNS)
+        self.templates = _MappedRows(self, cells_offset + field_count * CELL.size * len(FIELD_COLUMNS),
+                                     template_count, TEMPLATE_COLUMNS)
+        self._field_codes = None
+    
+    def _cell(self, offset):
+        kind, value, length = CELL.unpack_from(self._map, offset)
+        if kind == CELL_TEXT:
+            start = self._strings_offset + value
+            return self._map[start:start + length].decode("utf-8")
+        return value if kind == CELL_INT else None
+    
+    def required_fields(self) -> List[_MappedRow]:
+        return [row for row in self.fields if row["required"]]
+    
+    def field(self, field_code: str) -> Optional[_MappedRow]:
+        """Field row by code (binary search over the sorted fields)"""
+        if self._field_codes is None:
+            self._field_codes = [row["field_code"] for row in self.fields]
+        index = bisect_left(self._field_codes, field_code)
+        if index < len(self._field_codes) and self._field_codes[index] == field_code:
+            return self.fields[index]
+        return None
+    
+    def template(self, name: str) -> Optional[_MappedRow]:
+        for row in self.templates:
+            if row["name"] == name:
+                return row
+        return None
+    
+    def close(self):
+        self._map.close()
+
+
+def open_snapshot(snapshot):
+    """Accept a RegistrySnapshot / MappedRegistry, a snapshot file path (compiled or JSON) or None"""
+    if snapshot is None or isinstance(snapshot, (RegistrySnapshot, MappedRegistry)):
+        return snapshot
+    with open(snapshot, "rb") as f:
+        compiled = f.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+    return MappedRegistry(snapshot) if compiled else RegistrySnapshot.load(snapshot)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='DOCScoin Registry')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    snapshot = subparsers.add_parser('snapshot', help='Serialize the registry for --snapshot')
+    snapshot.add_argument('--db', type=str, default=None, help='Template registry database')
+    snapshot.add_argument('--output', type=str, required=True)
+
+    compile_parser = subparsers.add_parser('compile', help='Compile an immutable memory-mapped snapshot')
+    compile_parser.add_argument('--db', type=str, default=None, help='Template registry database')
+    compile_parser.add_argument('--output', type=str, required=True)
+
+    info = subparsers.add_parser('info', help='Verify a compiled snapshot hash and print its stamp')
+    info.add_argument('snapshot', type=str)
+
+    args = parser.parse_args()
+    if args.command == 'info':
+        registry = MappedRegistry(args.snapshot, verify=True)
+        print(json.dumps({"path": args.snapshot, "format_version": SNAPSHOT_FORMAT_VERSION,
+                          "sha256": registry.sha256, "fields": len(registry.fields),
+                          "templates": len(registry.templates)}, indent=2))
+        return
+
+    registry = RegistrySnapshot.from_database(args.db)
+    if args.command == 'compile':
+        digest = compile_snapshot(registry, args.output)
+        print(f"✅ Snapshot compiled: {args.output} (sha256 {digest[:16]}…)")
+    else:
+        registry.save(args.output)
+        print(f"✅ Snapshot written: {args.output}")
+    print(f"📊 {len(registry.fields)} fields, {len(registry.templates)} templates")
+
+
+if __name__ == "__main__":
+    main()
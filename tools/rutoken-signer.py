@@ -7,44 +7,139 @@
 import hashlib
 import base64
 import json
-from datetime import datetime
+import importlib.util
+import sys
+import glob
+import time
+from datetime import datetime, date
+from pathlib import Path
 import os
 
+from canonical_json import canonical_hash, update_hash
+
+
+def load_blockchain_module():
+    """Импорт tools/blockchain-audit.py (имя файла с дефисом не импортируется напрямую)"""
+    if "blockchain_audit" not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            "blockchain_audit", Path(__file__).resolve().with_name("blockchain-audit.py")
+        )
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["blockchain_audit"] = module
+        spec.loader.exec_module(module)
+    return sys.modules["blockchain_audit"]
+
+
+def certificate_thumbprint(certificate):
+    """Отпечаток сертификата: SHA1 от канонического JSON"""
+    return "SHA1:" + canonical_hash(certificate, "sha1").hexdigest().upper()
+
+
+def hash_payload(data, hash_algorithm="SHA256", chunk_size=1 << 20):
+    """Хэш данных за один проход с инкрементальными update():
+    dict — потоково по каноническому JSON (canonical_json), файл (Path) — блоками
+    по chunk_size, bytes — как есть, остальное — str(data).
+    Имитация ГОСТ 34.11: упрощенно тоже SHA256"""
+    h = hashlib.sha256()
+    if isinstance(data, dict):
+        update_hash(h, data)
+    elif isinstance(data, os.PathLike):
+        with open(data, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                h.update(chunk)
+    elif isinstance(data, (bytes, bytearray, memoryview)):
+        h.update(data)
+    else:
+        h.update(str(data).encode())
+    return h.digest()
+
+
+def mock_signature_value(data_hash):
+    """Значение подписи, которое возвращает мок-токен для данного хэша"""
+    return base64.b64encode(f"MOCK_SIGNATURE_{data_hash.hex()}".encode()).decode('utf-8')
+
+
+class _MockTokenSession:
+    """Открытая сессия токена (мок)"""
+    token_serial = "RT-MOCK-001"
+    
+    def __init__(self, signer):
+        self.signer = signer
+    
+    def __enter__(self):
+        self.signer.sessions_opened += 1
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def sign(self, data_hash):
+        return mock_signature_value(data_hash)
+
+
 class MockRutokenSigner:
     """Мок-класс для имитации работы с Рутокен (без реального токена)"""
     
     def __init__(self, pin="123456"):
         self.pin = pin
         self.certificate = self.generate_mock_certificate()
+        self._thumbprint = None
+        self.sessions_opened = 0
         
     def generate_mock_certificate(self):
-        """Генерация мок-сертификата"""
+        """Генерация мок-сертификата (действует с начала текущего года в течение года)"""
+        year = datetime.now().year
         return {
             "subject": "CN=DOCScoin Test User, O=Test Company, C=RU",
             "serial": "TEST-123456",
             "issuer": "CN=DOCScoin Test CA",
-            "valid_from": "2025-01-01",
-            "valid_to": "2026-01-01",
+            "valid_from": f"{year}-01-01",
+            "valid_to": f"{year + 1}-01-01",
             "public_key": "MOCK-RSA-PUBLIC-KEY",
             "token_type": "RUTOKEN_ECP_MOCK"
         }
     
+    def certificate_thumbprint(self):
+        """Отпечаток сертификата, на него ссылаются компактные подписи"""
+        if self._thumbprint is None:
+            self._thumbprint = certificate_thumbprint(self.certificate)
+        return self._thumbprint
+    
+    def hash_payload(self, data, hash_algorithm="SHA256", chunk_size=1 << 20):
+        """Хэш данных за один проход с инкрементальными update()"""
+        return hash_payload(data, hash_algorithm, chunk_size)
+    
+    def open_session(self):
+        """Сессия с токеном (мок): в реальной реализации — C_OpenSession + C_Login по PIN"""
+        return _MockTokenSession(self)
+    
+    def sign_many(self, items, hash_algorithm="SHA256", chunk_size=1 << 20):
+        """Пакетная подпись в одной сессии токена.
+        items — словари, bytes, строки или пути к файлам (Path); выдает компактные
+        записи подписи по мере обработки, сертификат — ссылкой по отпечатку"""
+        thumbprint = self.certificate_thumbprint()
+        algorithm = f"{hash_algorithm}_with_RSA" if hash_algorithm != "GOST" else "GOST R 34.10-2012"
+        with self.open_session() as session:
+            batch_time = datetime.now()
+            batch_id = batch_time.strftime('%Y%m%d%H%M%S')
+            signing_time = batch_time.isoformat()
+            for sequence, item in enumerate(items):
+                data_hash = self.hash_payload(item, hash_algorithm, chunk_size)
+                yield {
+                    "signature_id": f"SIG-{batch_id}-{sequence:06d}",
+                    "signing_time": signing_time,
+                    "algorithm": algorithm,
+                    "data_hash": base64.b64encode(data_hash).decode('utf-8'),
+                    "signature_value": session.sign(data_hash),
+                    "certificate_thumbprint": thumbprint,
+                    "token_serial": session.token_serial
+                }
+    
     def sign_data(self, data, hash_algorithm="SHA256"):
         """Подпись данных (мок-реализация)"""
         
-        if isinstance(data, dict):
-            data_str = json.dumps(data, sort_keys=True)
-        else:
-            data_str = str(data)
-        
         # "Подпись" - просто хэш + метаданные
-        if hash_algorithm == "SHA256":
-            data_hash = hashlib.sha256(data_str.encode()).digest()
-        elif hash_algorithm == "GOST":
-            # Имитация ГОСТ 34.11
-            data_hash = hashlib.sha256(data_str.encode()).digest()  # Упрощенно
-        else:
-            data_hash = hashlib.sha256(data_str.encode()).digest()
+        data_hash = self.hash_payload(data, hash_algorithm)
         
         signature = {
             "signature_id": f"SIG-{datetime.now().strftime('%Y%m%d%H%M%S')}",
@@ -61,17 +156,143 @@ class MockRutokenSigner:
         return signature
     
     def verify_signature(self, data, signature):
-        """Проверка подписи (мок)"""
-        print(f"🔍 Проверка подписи от: {signature.get('signer_certificate', {}).get('subject', 'Unknown')}")
-        print(f"   Время подписи: {signature.get('signing_time')}")
-        print(f"   Алгоритм: {signature.get('algorithm')}")
-        print(f"   Использован токен: {signature.get('token_used', False)}")
+        """Проверка подписи: хэш данных, значение подписи и срок действия сертификата"""
+        verifier = SignatureVerifier(certificates=[self.certificate])
+        return verifier.verify(data, signature)["valid"]
+
+
+class SignatureVerifier:
+    """Проверка подписей с кэшем разобранных сертификатов по SHA-256 их содержимого.
+    
+    Полные подписи несут сертификат в signer_certificate, компактные (sign_many)
+    ссылаются на него по certificate_thumbprint — такие сертификаты нужно
+    передать в certificates или встретить раньше в полной подписи."""
+    
+    def __init__(self, certificates=()):
+        self._by_digest = {}
+        self._by_thumbprint = {}
+        for certificate in certificates:
+            self._parse_certificate(certificate)
+    
+    def _parse_certificate(self, certificate):
+        """Разобранный сертификат (serial, valid_from, valid_to, thumbprint).
+        Кэш по SHA-256 всего сертификата: serial совпадает и у поддельного
+        или просроченного сертификата с тем же номером"""
+        digest = canonical_hash(certificate).digest()
+        parsed = self._by_digest.get(digest)
+        if parsed is None:
+            parsed = {
+                "serial": certificate.get("serial"),
+                "valid_from": date.fromisoformat(certificate["valid_from"][:10]),
+                "valid_to": date.fromisoformat(certificate["valid_to"][:10]),
+                "thumbprint": certificate_thumbprint(certificate)
+            }
+            self._by_digest[digest] = parsed
+            self._by_thumbprint[parsed["thumbprint"]] = parsed
+        return parsed
+    
+    def verify(self, data, signature):
+        """Возвращает {"valid": bool, "errors": [(вид, описание)]}"""
+        errors = []
         
-        # Всегда возвращаем True для мок-реализации
-        return True
+        # Сертификат подписанта
+        certificate = None
+        try:
+            if signature.get("signer_certificate"):
+                certificate = self._parse_certificate(signature["signer_certificate"])
+            else:
+                certificate = self._by_thumbprint.get(signature.get("certificate_thumbprint"))
+                if certificate is None:
+                    errors.append(("unknown_certificate", "certificate not found by thumbprint"))
+        except (KeyError, ValueError, TypeError) as e:
+            errors.append(("bad_certificate", f"cannot parse certificate: {e}"))
+        
+        # Срок действия сертификата на момент подписи
+        try:
+            signing_day = datetime.fromisoformat(signature["signing_time"]).date()
+            if certificate and not certificate["valid_from"] <= signing_day <= certificate["valid_to"]:
+                errors.append(("certificate_expired",
+                               f"signed {signing_day}, certificate valid "
+                               f"{certificate['valid_from']}..{certificate['valid_to']}"))
+        except (KeyError, ValueError, TypeError):
+            errors.append(("bad_signing_time", "missing or invalid signing_time"))
+        
+        # Хэш данных и значение подписи
+        algorithm = signature.get("algorithm", "")
+        data_hash = hash_payload(data, "GOST" if algorithm.startswith("GOST") else "SHA256")
+        if signature.get("data_hash") != base64.b64encode(data_hash).decode('utf-8'):
+            errors.append(("hash_mismatch", "data_hash does not match document"))
+        elif signature.get("signature_value") != mock_signature_value(data_hash):
+            errors.append(("bad_signature", "signature_value does not match data_hash"))
+        
+        return {"valid": not errors, "errors": errors}
+
+
+# ---------------------------------------------------------------------------
+# Массовая проверка подписанных файлов
+# ---------------------------------------------------------------------------
+
+_worker_verifier = None
+
+
+def _init_verifier(certificates):
+    global _worker_verifier
+    _worker_verifier = SignatureVerifier(certificates)
+
+
+def _verify_signed_file(path):
+    """Проверка одного signed_*.json (в процессе пула)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            signed = json.load(f)
+        result = _worker_verifier.verify(signed["document"], signed["signature"])
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        result = {"valid": False, "errors": [("unreadable", str(e))]}
+    result["file"] = path
+    return result
+
+
+def verify_directory(directory, workers=None, certificates=(), pattern="signed_*.json", chunksize=256):
+    """Проверка всех подписанных файлов каталога (рекурсивно) в пуле процессов.
+    Возвращает машиночитаемую сводку с пропускной способностью"""
+    paths = sorted(glob.glob(os.path.join(directory, "**", pattern), recursive=True))
+    summary = {"directory": directory, "total": 0, "valid": 0, "invalid": 0,
+               "errors_by_kind": {}, "invalid_files": []}
+    started = time.perf_counter()
+    
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        _init_verifier(list(certificates))
+        results = map(_verify_signed_file, paths)
+        pool = None
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_verifier,
+                                   initargs=(list(certificates),))
+        results = pool.map(_verify_signed_file, paths, chunksize=chunksize)
+    try:
+        for result in results:
+            summary["total"] += 1
+            if result["valid"]:
+                summary["valid"] += 1
+                continue
+            summary["invalid"] += 1
+            summary["invalid_files"].append({"file": result["file"], "errors": result["errors"]})
+            for kind, _ in result["errors"]:
+                summary["errors_by_kind"][kind] = summary["errors_by_kind"].get(kind, 0) + 1
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    
+    elapsed = time.perf_counter() - started
+    summary["seconds"] = round(elapsed, 3)
+    summary["files_per_sec"] = round(summary["total"] / elapsed, 1) if elapsed else None
+    return summary
 
-def integrate_with_generator():
-    """Интеграция подписи в генератор документов"""
+def integrate_with_generator(audit_writer=None):
+    """Интеграция подписи в генератор документов.
+    Запись в блокчейн идет через фоновый AuditWriter: подписанный файл сохраняется,
+    не дожидаясь майнинга и коммита SQLite"""
     
     # 1. Создаем подписывающее устройство
     print("🔐 Инициализация Рутокен...")
@@ -89,10 +310,13 @@ def integrate_with_generator():
     print("📝 Подписание документа...")
     signature = signer.sign_data(doc_data, hash_algorithm="SHA256")
     
-    # 4. Фиксируем в блокчейне
+    # 4. Ставим фиксацию в блокчейне в очередь (tx_id известен сразу)
     print("⛓️  Фиксация в блокчейне...")
-    blockchain = DOCScoinBlockchain()
-    blockchain.record_export_operation(
+    owns_writer = audit_writer is None
+    if owns_writer:
+        blockchain_module = load_blockchain_module()
+        audit_writer = blockchain_module.AuditWriter(blockchain_module.DOCScoinBlockchain())
+    tx_id, audit_future = audit_writer.record_export_operation(
         operator_id="admin_01",
         certificate_hash=signature["signer_certificate"]["serial"],
         document_id=doc_data["document_id"],
@@ -104,7 +328,7 @@ def integrate_with_generator():
         "version": "DOCScoin v2.0",
         "document": doc_data,
         "signature": signature,
-        "blockchain_tx_id": signature["signature_id"]
+        "blockchain_tx_id": tx_id
     }
     
     output_file = f"signed_{doc_data['document_id']}.json"
@@ -112,23 +336,64 @@ def integrate_with_generator():
         json.dump(signed_document, f, indent=2, ensure_ascii=False)
     
     print(f"✅ Документ подписан и сохранен: {output_file}")
-    print(f"🔗 TX ID в блокчейне: {signature['signature_id']}")
+    print(f"🔗 TX ID в блокчейне: {tx_id}")
+    
+    if owns_writer:
+        # Гарантия записи перед выходом
+        audit_writer.close()
+        audit_writer.blockchain.close()
+        print(f"⛓️  Запись подтверждена в блоке #{audit_future.result()['block_number']}")
+        print(f"⏱️  Задержка записи аудита: {audit_writer.metrics()}")
     
     return signed_document
 
-if __name__ == "__main__":
-    # Демонстрация работы
+def demo():
+    """Демонстрация: подпись, фиксация в блокчейне, проверка"""
     signed_doc = integrate_with_generator()
     
     # Проверка подписи
     print("\n" + "="*50)
-    verifier = MockRutokenSigner()
-    is_valid = verifier.verify_signature(
-        signed_doc["document"],
-        signed_doc["signature"]
-    )
+    signature = signed_doc["signature"]
+    print(f"🔍 Проверка подписи от: {signature['signer_certificate']['subject']}")
+    print(f"   Время подписи: {signature['signing_time']}")
+    print(f"   Алгоритм: {signature['algorithm']}")
+    result = SignatureVerifier().verify(signed_doc["document"], signature)
     
-    if is_valid:
+    if result["valid"]:
         print("✅ Подпись действительна")
     else:
-        print("❌ Подпись недействительна")
\ No newline at end of file
+        print("❌ Подпись недействительна")
+        for kind, message in result["errors"]:
+            print(f"   • {kind}: {message}")
+
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='DOCScoin Rutoken signer (mock)')
+    subparsers = parser.add_subparsers(dest='command')
+    
+    verify = subparsers.add_parser('verify', help='Verify all signed_*.json files in a directory')
+    verify.add_argument('directory', type=str)
+    verify.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    verify.add_argument('--certificates', type=str, default=None,
+                        help='JSON file with a list of certificates for compact signatures')
+    
+    args = parser.parse_args()
+    
+    if args.command == 'verify':
+        certificates = []
+        if args.certificates:
+            with open(args.certificates, 'r', encoding='utf-8') as f:
+                certificates = json.load(f)
+        summary = verify_directory(args.directory, args.workers, certificates)
+        print(json.dumps(summary, indent=2, ensure_ascii=False))
+        print(f"📊 Проверено файлов: {summary['total']} ({summary['files_per_sec']} файлов/с), "
+              f"недействительных: {summary['invalid']}", file=sys.stderr)
+        sys.exit(0 if summary["invalid"] == 0 else 1)
+    else:
+        demo()
+
+
+if __name__ == "__main__":
+    main()
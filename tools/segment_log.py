@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+DOCScoin Segment Log
+Append-only block storage for the audit chain: length-prefixed, CRC-checked
+records in segment files, read through mmap
+
+Layout of a log directory:
+    00000001.seg ...    segments; each record is [u32 length][u32 CRC32][JSON block]
+    blocks.idx          sparse height index: (height, segment, offset) every
+                        HEIGHT_INDEX_INTERVAL blocks
+    documents.idx       (height, segment, offset, document ids) for every block
+                        that touches a document
+    LOCK                held by the one process that appends
+
+A record is one block with its transactions, so a block is either fully in the
+log or not at all. The log is the source of truth: on open the indexes are
+caught up from the last sparse entry, and a torn record at the end of the last
+segment (a crash during append) is cut off.
+"""
+
+import json
+import mmap
+import os
+import struct
+import zlib
+from bisect import bisect_right
+from typing import Dict, Iterator, List, Optional, Tuple
+
+RECORD_HEADER = struct.Struct("<II")
+SEGMENT_SIZE = 64 * 1024 * 1024
+HEIGHT_INDEX_INTERVAL = 64
+HEIGHT_ENTRY = struct.Struct("<QIQ")
+DOCUMENT_ENTRY = struct.Struct("<QIQH")
+DOCUMENT_ID = struct.Struct("<H")
+
+Position = Tuple[int, int]
+
+
+class CorruptRecord(ValueError):
+    """A record inside the log fails its length or CRC check"""
+
+    def __init__(self, segment: int, offset: int, reason: str, torn: bool = False):
+        super().__init__(f"corrupt record in segment {segment} at offset {offset}: {reason}")
+        self.segment = segment
+        self.offset = offset
+        # The bad record is the last thing in its segment: an interrupted append
+        self.torn = torn
+
+
+def _segment_name(segment: int) -> str:
+    return f"{segment:08d}.seg"
+
+
+def _document_ids(block: Dict) -> List[str]:
+    ids = []
+    for tx in block.get("transactions", ()):
+        document_id = tx.get("document_id")
+        if document_id and document_id not in ids:
+            ids.append(document_id)
+    return ids
+
+
+class SegmentLog:
+    """Blocks appended in height order (1, 2, ...); reads by height and by document_id"""
+
+    def __init__(self, path: str, readonly: bool = False, fsync: bool = False,
+                 segment_size: int = SEGMENT_SIZE):
+        self.path = path
+        self.readonly = readonly
+        self.fsync = fsync
+        self.segment_size = segment_size
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._writer = None
+        self._lock_file = None
+        if not readonly:
+            os.makedirs(path, exist_ok=True)
+            self._lock()
+        self._segments = sorted(int(name[:-4]) for name in os.listdir(path) if name.endswith(".seg"))
+        self._heights: List[int] = []
+        self._height_positions: List[Position] = []
+        self._documents: Dict[str, List[Position]] = {}
+        self._document_height = 0
+        self.height = 0
+        self._tip: Optional[Dict] = None
+        # First corrupt record found on open (the log is not appended to while set)
+        self.corruption: Optional[CorruptRecord] = None
+        self._end: Position = (self._segments[-1] if self._segments else 1, 0)
+        self._open_indexes()
+
+    # -- files ---------------------------------------------------------------
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _lock(self):
+        self._lock_file = open(self._file("LOCK"), "a+b")
+        try:
+            import fcntl
+        except ImportError:  # no advisory locks on this platform
+            return
+        try:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            raise RuntimeError(f"Segment log is open for writing in another process: {self.path}") from None
+
+    def _map(self, segment: int, needed: int) -> Optional[mmap.mmap]:
+        """Read-only map of a segment covering at least `needed` bytes (remapped as the segment grows)"""
+        mapped = self._maps.get(segment)
+        if mapped is not None and len(mapped) >= needed:
+            return mapped
+        try:
+            f = open(self._file(_segment_name(segment)), "rb")
+        except FileNotFoundError:
+            return mapped
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0 or (mapped is not None and size == len(mapped)):
+                return mapped
+            if mapped is not None:
+                mapped.close()
+            mapped = self._maps[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return mapped
+
+    def _read(self, segment: int, offset: int) -> Optional[Tuple[Dict, int]]:
+        """(block, end offset) of the record at offset; None at the end of the segment.
+        CorruptRecord if the record is cut short or fails its CRC"""
+        mapped = self._map(segment, offset + RECORD_HEADER.size)
+        available = len(mapped) if mapped is not None else 0
+        if offset >= available:
+            return None
+        if offset + RECORD_HEADER.size > available:
+            raise CorruptRecord(segment, offset, "truncated header", torn=True)
+        length, crc = RECORD_HEADER.unpack_from(mapped, offset)
+        start = offset + RECORD_HEADER.size
+        mapped = self._map(segment, start + length)
+        if start + length > len(mapped):
+            raise CorruptRecord(segment, offset, "truncated payload", torn=True)
+        payload = mapped[start:start + length]
+        if zlib.crc32(payload) != crc:
+            raise CorruptRecord(segment, offset, "CRC mismatch", torn=start + length == len(mapped))
+        try:
+            return json.loads(payload), start + length
+        except ValueError:
+            raise CorruptRecord(segment, offset, "payload is not JSON") from None
+
+    def _scan(self, position: Position) -> Iterator[Tuple[Position, Dict, int]]:
+        """(position, block, end offset) of every record from position onwards, across segments"""
+        segment, offset = position
+        while True:
+            record = self._read(segment, offset)
+            if record is None:
+                later = [s for s in self._segments if s > segment]
+                if not later:
+                    return
+                segment, offset = later[0], 0
+                continue
+            block, end = record
+            yield (segment, offset), block, end
+            offset = end
+
+    # -- indexes -------------------------------------------------------------
+
+    def _load_entries(self, name: str) -> bytes:
+        try:
+            with open(self._file(name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return b""
+
+    def _truncate(self, name: str, size: int):
+        if not self.readonly:
+            with open(self._file(name), "r+b") as f:
+                f.truncate(size)
+
+    def _open_indexes(self):
+        data = self._load_entries("blocks.idx")
+        whole = len(data) - len(data) % HEIGHT_ENTRY.size
+        if whole != len(data):
+            self._truncate("blocks.idx", whole)
+        for height, segment, offset in HEIGHT_ENTRY.iter_unpack(data[:whole]):
+            self._heights.append(height)
+            self._height_positions.append((segment, offset))
+
+        data = self._load_entries("documents.idx")
+        position = 0
+        while position + DOCUMENT_ENTRY.size <= len(data):
+            height, segment, offset, count = DOCUMENT_ENTRY.unpack_from(data, position)
+            cursor, ids = position + DOCUMENT_ENTRY.size, []
+            for _ in range(count):
+                if cursor + DOCUMENT_ID.size > len(data):
+                    break
+                (length,) = DOCUMENT_ID.unpack_from(data, cursor)
+                cursor += DOCUMENT_ID.size
+                ids.append(data[cursor:cursor + length].decode("utf-8"))
+                cursor += length
+            if len(ids) != count or cursor > len(data):
+                break
+            for document_id in ids:
+                self._documents.setdefault(document_id, []).append((segment, offset))
+            self._document_height = height
+            position = cursor
+        if position != len(data):
+            self._truncate("documents.idx", position)
+
+        self._catch_up()
+
+    def _catch_up(self):
+        """Index the blocks after the last sparse entry and find the tip"""
+        first_segment = self._segments[0] if self._segments else 1
+        start = self._height_positions[-1] if self._height_positions else (first_segment, 0)
+        expected = self._heights[-1] if self._heights else 1
+        if self._heights:
+            try:
+                record = self._read(*start)
+            except CorruptRecord:
+                record = None
+            if record is None or record[0].get("block_number") != expected:
+                # The log is shorter than its index (or was replaced): rebuild everything
+                self._reset_indexes()
+                start, expected = (first_segment, 0), 1
+
+        try:
+            for position, block, end in self._scan(start):
+                if block.get("block_number") != expected:
+                    raise CorruptRecord(*position, f"expected block {expected}, found {block.get('block_number')}")
+                self._index(block, position)
+                self._tip, self.height = block, expected
+                self._end = (position[0], end)
+                expected += 1
+        except CorruptRecord as e:
+            if e.torn and e.segment == self._segments[-1]:
+                if not self.readonly:
+                    # Interrupted append at the end of the log: cut it off
+                    self._close_map(e.segment)
+                    with open(self._file(_segment_name(e.segment)), "r+b") as f:
+                        f.truncate(e.offset)
+                    self._end = (e.segment, e.offset)
+            else:
+                self.corruption = e
+        if self._document_height > self.height:
+            # Index entries of blocks that are no longer in the log
+            self._documents, self._document_height = {}, 0
+            self._truncate("documents.idx", 0)
+            for position, block, _ in self._scan((first_segment, 0)):
+                if block["block_number"] > self.height:
+                    break
+                self._index_documents(block, position)
+
+    def _reset_indexes(self):
+        self._heights, self._height_positions = [], []
+        self._documents, self._document_height = {}, 0
+        for name in ("blocks.idx", "documents.idx"):
+            if os.path.exists(self._file(name)):
+                self._truncate(name, 0)
+
+    def _index(self, block: Dict, position: Position):
+        height = block["block_number"]
+        if height % HEIGHT_INDEX_INTERVAL == 1 and (not self._heights or height > self._heights[-1]):
+            self._heights.append(height)
+            self._height_positions.append(position)
+            if not self.readonly:
+                with open(self._file("blocks.idx"), "ab") as f:
+                    f.write(HEIGHT_ENTRY.pack(height, *position))
+        if height > self._document_height:
+            self._index_documents(block, position)
+
+    def _index_documents(self, block: Dict, position: Position):
+        ids = _document_ids(block)
+        self._document_height = block["block_number"]
+        if not ids:
+            return
+        for document_id in ids:
+            self._documents.setdefault(document_id, []).append(position)
+        if not self.readonly:
+            entry = bytearray(DOCUMENT_ENTRY.pack(block["block_number"], *position, len(ids)))
+            for document_id in ids:
+                data = document_id.encode("utf-8")
+                entry += DOCUMENT_ID.pack(len(data)) + data
+            with open(self._file("documents.idx"), "ab") as f:
+                f.write(entry)
+
+    # -- public API ----------------------------------------------------------
+
+    @property
+    def end(self) -> Position:
+        """Position right after the last record: changes with every append"""
+        return self._end
+
+    def tip(self) -> Optional[Dict]:
+        """Last block, None for an empty log"""
+        return self._tip
+
+    def append(self, block: Dict) -> int:
+        """Append the next block (block_number is assigned); returns its height"""
+        if self.readonly:
+            raise RuntimeError(f"Segment log is open read-only: {self.path}")
+        if self.corruption is not None:
+            raise RuntimeError(f"Segment log is corrupt, not appending: {self.corruption}")
+        height = self.height + 1
+        block = {"block_number": height, **block}
+        payload = json.dumps(block, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        record = RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+        segment, offset = self._end
+        if offset and offset + len(record) > self.segment_size:
+            self._close_writer()
+            segment, offset = segment + 1, 0
+        if self._writer is None:
+            self._writer = open(self._file(_segment_name(segment)), "ab")
+            if segment not in self._segments:
+                self._segments.append(segment)
+        try:
+            self._writer.write(record)
+            self._writer.flush()
+            if self.fsync:
+                os.fsync(self._writer.fileno())
+        except BaseException:
+            # Cut a partial record off so a retried append starts at the same offset
+            writer, self._writer = self._writer, None
+            try:
+                writer.close()
+            except OSError:
+                pass
+            with open(self._file(_segment_name(segment)), "r+b") as f:
+                f.truncate(offset)
+            raise
+
+        self._index(block, (segment, offset))
+        self._end = (segment, offset + len(record))
+        self._tip, self.height = block, height
+        return height
+
+    def position(self, height: int) -> Optional[Position]:
+        """Position of a block: nearest sparse entry below it, then a short scan"""
+        if not 1 <= height <= self.height:
+            return None
+        index = bisect_right(self._heights, height) - 1
+        start = self._height_positions[index] if index >= 0 else (self._segments[0], 0)
+        for position, block, _ in self._scan(start):
+            if block["block_number"] == height:
+                return position
+        return None
+
+    def blocks(self, first: int = 1, last: Optional[int] = None) -> Iterator[Dict]:
+        """Blocks first..last in height order"""
+        last = self.height if last is None else min(last, self.height)
+        start = self.position(max(first, 1))
+        if start is None or first > last:
+            return
+        for _, block, _ in self._scan(start):
+            if block["block_number"] > last:
+                return
+            yield block
+
+    def read(self, position: Position) -> Dict:
+        record = self._read(*position)
+        if record is None:
+            raise CorruptRecord(*position, "no record at this position")
+        return record[0]
+
+    def document_blocks(self, document_id: str) -> Iterator[Dict]:
+        """Blocks with a transaction on document_id, in height order"""
+        for position in self._documents.get(document_id, ()):
+            yield self.read(position)
+
+    def _close_map(self, segment: int):
+        mapped = self._maps.pop(segment, None)
+        if mapped is not None:
+            mapped.close()
+
+    def _close_writer(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def close(self):
+        self._close_writer()
+        for segment in list(self._maps):
+            self._close_map(segment)
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
@@ -5,84 +5,289 @@ Validates JSON data against field registry rules
 """
 
 import json
-import sqlite3
 import re
-from typing import Dict, List, Tuple
+from datetime import datetime
+from numbers import Number
+from typing import TYPE_CHECKING, Callable, Dict, FrozenSet, List, NamedTuple, Optional, Pattern, Tuple
+
+import checksums
+from field_crypto import DecryptionError, default_key_file, is_encrypted, open_decryptor
+from json_path import Path, PathSet, compile_path, has_wildcard, resolve_path
+from registry import connect_registry, default_db_path, open_snapshot
+
+if TYPE_CHECKING:
+    import sqlite3
+
+
+# Type checkers are module-level functions so compiled plans pickle to worker processes
+def _is_string(value) -> bool:
+    return isinstance(value, str)
+
+
+def _is_digit_string(value) -> bool:
+    # Digit-only strings (passport series, numbers) often arrive as JSON numbers;
+    # the field pattern is then matched against str(value), as before typed checks
+    return isinstance(value, str) or (isinstance(value, int) and not isinstance(value, bool) and value >= 0)
+
+
+def _is_decimal(value) -> bool:
+    return isinstance(value, (Number, str)) and not isinstance(value, bool)
+
+
+def _is_integer(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_boolean(value) -> bool:
+    return isinstance(value, bool)
+
+
+def _is_array(value) -> bool:
+    return isinstance(value, list)
+
+
+def _is_object(value) -> bool:
+    return isinstance(value, dict)
+
+
+# Type checkers keyed by field_registry.data_type (unknown types are not checked)
+TYPE_CHECKERS: Dict[str, Callable] = {
+    'STRING': _is_digit_string,
+    'UUID': _is_string,
+    'ENUM': _is_string,
+    'SHA256': _is_string,
+    'DATE': _is_string,
+    'DECIMAL': _is_decimal,
+    'INTEGER': _is_integer,
+    'BOOLEAN': _is_boolean,
+    'ARRAY': _is_array,
+    'OBJECT': _is_object,
+}
+
+
+class CompiledField(NamedTuple):
+    """One required registry field, ready to check"""
+    field_code: str
+    json_path: str
+    path: Path
+    repeated: bool
+    pattern: Optional[Pattern]
+    data_type: str
+    type_check: Optional[Callable]
+
+
+class ValidationPlan(NamedTuple):
+    """Compiled fields plus their paths, extracted together in one walk per profile"""
+    fields: Tuple[CompiledField, ...]
+    paths: PathSet
+    # Codes of the plan's fields: the national checks do not report their decryption errors again
+    field_codes: FrozenSet[str] = frozenset()
+
+
+def compile_registry(rows) -> ValidationPlan:
+    """Compile required field_registry rows into an immutable validation plan"""
+    fields = []
+    for row in rows:
+        path = compile_path(row['json_path'])
+        fields.append(CompiledField(
+            field_code=row['field_code'],
+            json_path=row['json_path'],
+            path=path,
+            repeated=has_wildcard(path),
+            pattern=re.compile(row['validation_pattern']) if row['validation_pattern'] else None,
+            data_type=row['data_type'],
+            type_check=TYPE_CHECKERS.get((row['data_type'] or '').upper()),
+        ))
+    return ValidationPlan(tuple(fields), PathSet([field.path for field in fields]),
+                          frozenset(field.field_code for field in fields))
+
+
+class ValidationError(NamedTuple):
+    """A single validation failure; kind and field_code feed batch summaries"""
+    kind: str
+    field_code: str
+    message: str
+
+
+def check_profile(plan: ValidationPlan, json_data: Dict, decryptor=None) -> List[ValidationError]:
+    """Run a compiled plan and the national checks against one profile.
+    With a decryptor, ENC[...] values of the checked fields are decrypted first;
+    without one they only count as present"""
+    errors = []
+    
+    values = plan.paths.extract(json_data)
+    if decryptor is not None:
+        values = decryptor.reveal_values(values, raise_errors=False)
+    
+    for field, value in zip(plan.fields, values):
+        if not field.repeated:
+            _check_value(field, value, field.json_path, errors)
+        elif not value:
+            # [*] paths need at least one element
+            errors.append(ValidationError(
+                'missing', field.field_code,
+                f"❌ Required field missing: {field.field_code} ({field.json_path})"))
+        else:
+            # Every element of a repeated field is checked on its own
+            for index, item in enumerate(value):
+                _check_value(field, item, f"{field.json_path} #{index}", errors)
+    
+    # Additional validations
+    _validate_national_checksums(json_data, errors, decryptor, plan.field_codes)
+    _validate_passport_numbers(json_data, errors, decryptor, plan.field_codes)
+    
+    return errors
+
+
+def _check_value(field: CompiledField, value, location: str, errors: List[ValidationError]):
+    # Check if field exists
+    if not value:
+        errors.append(ValidationError(
+            'missing', field.field_code,
+            f"❌ Required field missing: {field.field_code} ({location})"))
+        return
+    
+    if isinstance(value, DecryptionError):
+        errors.append(ValidationError(
+            'decryption_failed', field.field_code,
+            f"❌ Field {field.field_code} cannot be decrypted: {value}"))
+        return
+    if is_encrypted(value):
+        # Encrypted and no key configured: the content cannot be checked
+        return
+    
+    # Check type if the registry type is known
+    if field.type_check and not field.type_check(value):
+        errors.append(ValidationError(
+            'invalid_type', field.field_code,
+            f"❌ Field {field.field_code} has invalid type: expected {field.data_type}"))
+        return
+    
+    # Validate pattern if exists
+    if field.pattern and not field.pattern.match(str(value)):
+        errors.append(ValidationError(
+            'invalid_format', field.field_code,
+            f"❌ Field {field.field_code} has invalid format: {value}"))
+
+
+# National identifiers checked against their jurisdiction's checksum: (field code, path, scheme)
+NATIONAL_CHECKSUMS = (
+    ('NATIONAL:RU:TAX:INN', compile_path("$.national_data.ru.inn"), 'RU:INN'),
+    ('NATIONAL:RU:SOCIAL:SNILS', compile_path("$.national_data.ru.snils"), 'RU:SNILS'),
+    ('NATIONAL:UA:TAX:TIN', compile_path("$.national_data.ua.tin"), 'UA:RNOKPP'),
+    ('NATIONAL:IN:AADHAAR', compile_path("$.national_data.in.aadhaar.aadhaar_number"), 'IN:AADHAAR'),
+    ('NATIONAL:IN:TAX:PAN', compile_path("$.national_data.in.other_ids.pan"), 'IN:PAN'),
+)
+RU_PASSPORT_SERIES_PATH = compile_path("$.national_data.ru.passport.series")
+RU_PASSPORT_NUMBER_PATH = compile_path("$.national_data.ru.passport.number")
+
+
+def _validate_national_checksums(data: Dict, errors: List[ValidationError], decryptor=None,
+                                 checked_fields: FrozenSet[str] = frozenset()):
+    """Validate national identifier checksums (encrypted values only with a decryptor).
+    Decryption errors of checked_fields are already reported by the plan"""
+    values = [resolve_path(data, path) for _, path, _ in NATIONAL_CHECKSUMS]
+    if decryptor is not None:
+        values = decryptor.reveal_values(values, raise_errors=False)
+    for (field_code, _, kind), value in zip(NATIONAL_CHECKSUMS, values):
+        if value is None or value == '' or is_encrypted(value):
+            continue
+        if isinstance(value, DecryptionError):
+            if field_code not in checked_fields:
+                errors.append(ValidationError(
+                    'decryption_failed', field_code, f"❌ Field {field_code} cannot be decrypted: {value}"))
+        elif not checksums.validate(kind, value):
+            errors.append(ValidationError(
+                'invalid_checksum', field_code,
+                f"❌ {checksums.CHECKSUMS[kind].name} failed checksum validation: {value}"))
+
+
+def _validate_passport_numbers(data: Dict, errors: List[ValidationError], decryptor=None,
+                               checked_fields: FrozenSet[str] = frozenset()):
+    """Validate passport numbers (encrypted values only with a decryptor).
+    Decryption errors of checked_fields are already reported by the plan"""
+    # Check RU passport
+    ru_series = resolve_path(data, RU_PASSPORT_SERIES_PATH)
+    ru_number = resolve_path(data, RU_PASSPORT_NUMBER_PATH)
+    if decryptor is not None:
+        ru_series, ru_number = decryptor.reveal_values([ru_series, ru_number], raise_errors=False)
+    
+    for field_code, value in (('NATIONAL:RU:PASSPORT:SERIES', ru_series), ('NATIONAL:RU:PASSPORT:NUMBER', ru_number)):
+        if isinstance(value, DecryptionError) and field_code not in checked_fields:
+            errors.append(ValidationError(
+                'decryption_failed', field_code, f"❌ Field {field_code} cannot be decrypted: {value}"))
+    if any(isinstance(value, DecryptionError) or is_encrypted(value) for value in (ru_series, ru_number)):
+        # Undecryptable, or encrypted and no key configured: the format cannot be checked
+        return
+    
+    if ru_series and ru_number:
+        if not (len(str(ru_series)) == 4 and str(ru_series).isdigit()):
+            errors.append(ValidationError(
+                'invalid_format', 'NATIONAL:RU:PASSPORT:SERIES',
+                f"❌ RU passport series must be 4 digits: {ru_series}"))
+        if not (len(str(ru_number)) == 6 and str(ru_number).isdigit()):
+            errors.append(ValidationError(
+                'invalid_format', 'NATIONAL:RU:PASSPORT:NUMBER',
+                f"❌ RU passport number must be 6 digits: {ru_number}"))
+
 
 class DOCScoinValidator:
-    def __init__(self, db_path="tools/template-registry.db"):
-        self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
-        self.conn.row_factory = sqlite3.Row
+    def __init__(self, db_path: Optional[str] = None, snapshot=None, decryptor=None):
+        """The registry database is opened on first use; with snapshot (a RegistrySnapshot,
+        a MappedRegistry or a snapshot file) the validator never touches SQLite.
+        decryptor (field_crypto.FieldDecryptor) decrypts ENC[...] values of checked fields"""
+        self.db_path = db_path or default_db_path()
+        self.snapshot = open_snapshot(snapshot)
+        self.decryptor = decryptor
+        self._conn: Optional["sqlite3.Connection"] = None
+        self._plan: Optional[ValidationPlan] = None
+        self._plan_version = None
+    
+    @property
+    def conn(self) -> "sqlite3.Connection":
+        if self._conn is None:
+            self._conn = connect_registry(self.db_path)
+        return self._conn
+    
+    def _registry_version(self):
+        """Changes whenever field_registry may have changed.
+        data_version moves on commits from other connections, total_changes on our own"""
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        return data_version, self.conn.total_changes
+    
+    def compiled_plan(self) -> ValidationPlan:
+        """Compiled plan of required fields, rebuilt only when the registry changes"""
+        if self.snapshot is not None:
+            # Snapshots are immutable: compiled once
+            if self._plan is None:
+                self._plan = compile_registry(self.snapshot.required_fields())
+            return self._plan
+        version = self._registry_version()
+        if self._plan is None or version != self._plan_version:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                "SELECT field_code, json_path, validation_pattern, data_type FROM field_registry WHERE required = 1"
+            )
+            self._plan = compile_registry(cursor.fetchall())
+            self._plan_version = version
+        return self._plan
+    
+    def invalidate(self):
+        """Drop the compiled plan so the next validation recompiles it"""
+        self._plan = None
         
     def validate_json(self, json_data: Dict) -> Tuple[bool, List[str]]:
         """Validate JSON data against field registry"""
-        errors = []
-        
-        # Get all required fields
-        cursor = self.conn.cursor()
-        cursor.execute(
-            "SELECT field_code, json_path, validation_pattern, data_type FROM field_registry WHERE required = 1"
-        )
-        required_fields = cursor.fetchall()
-        
-        for field in required_fields:
-            field_code = field['field_code']
-            json_path = field['json_path']
-            
-            # Check if field exists
-            if not self._get_value_by_path(json_data, json_path):
-                errors.append(f"❌ Required field missing: {field_code} ({json_path})")
-                continue
-            
-            # Validate pattern if exists
-            if field['validation_pattern']:
-                value = self._get_value_by_path(json_data, json_path)
-                if value and not re.match(field['validation_pattern'], str(value)):
-                    errors.append(f"❌ Field {field_code} has invalid format: {value}")
-        
-        # Additional validations
-        self._validate_russian_inn(json_data, errors)
-        self._validate_passport_numbers(json_data, errors)
-        
+        errors = [error.message for error in check_profile(self.compiled_plan(), json_data, self.decryptor)]
         return len(errors) == 0, errors
     
     def _get_value_by_path(self, data: Dict, json_path: str):
         """Get value from JSON using path"""
-        path = json_path.replace('$.', '').split('.')
-        value = data
-        for key in path:
-            if isinstance(value, dict) and key in value:
-                value = value[key]
-            else:
-                return None
-        return value
+        return resolve_path(data, compile_path(json_path))
     
-    def _validate_russian_inn(self, data: Dict, errors: List[str]):
-        """Validate Russian INN checksum"""
-        inn_path = "$.national_data.ru.inn"
-        inn = self._get_value_by_path(data, inn_path)
-        
-        if inn and isinstance(inn, str) and len(inn) == 12:
-            # Simple format check (can be enhanced with actual checksum)
-            if not inn.isdigit():
-                errors.append(f"❌ INN must contain only digits: {inn}")
-    
-    def _validate_passport_numbers(self, data: Dict, errors: List[str]):
-        """Validate passport numbers"""
-        # Check RU passport
-        ru_series = self._get_value_by_path(data, "$.national_data.ru.passport.series")
-        ru_number = self._get_value_by_path(data, "$.national_data.ru.passport.number")
-        
-        if ru_series and ru_number:
-            if not (len(str(ru_series)) == 4 and str(ru_series).isdigit()):
-                errors.append(f"❌ RU passport series must be 4 digits: {ru_series}")
-            if not (len(str(ru_number)) == 6 and str(ru_number).isdigit()):
-                errors.append(f"❌ RU passport number must be 6 digits: {ru_number}")
-    
-    def generate_validation_report(self, json_data: Dict) -> str:
-        """Generate detailed validation report"""
-        is_valid, errors = self.validate_json(json_data)
+    def generate_validation_report(self, json_data: Dict, result: Optional[Tuple[bool, List[str]]] = None) -> str:
+        """Generate detailed validation report (pass a validate_json result to avoid re-validating)"""
+        is_valid, errors = result if result is not None else self.validate_json(json_data)
         
         report = [
             "=" * 50,
@@ -100,12 +305,16 @@ class DOCScoinValidator:
             report.append("✅ All validations passed!")
         
         # Field statistics
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT COUNT(*) as total FROM field_registry")
-        total_fields = cursor.fetchone()['total']
-        
-        cursor.execute("SELECT COUNT(*) as required FROM field_registry WHERE required = 1")
-        required_fields = cursor.fetchone()['required']
+        if self.snapshot is not None:
+            total_fields = len(self.snapshot.fields)
+            required_fields = len(self.snapshot.required_fields())
+        else:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT COUNT(*) as total FROM field_registry")
+            total_fields = cursor.fetchone()['total']
+            
+            cursor.execute("SELECT COUNT(*) as required FROM field_registry WHERE required = 1")
+            required_fields = cursor.fetchone()['required']
         
         report.extend([
             "",
@@ -118,27 +327,168 @@ class DOCScoinValidator:
         return '\n'.join(report)
     
     def close(self):
-        self.conn.close()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
 
-# Для использования с examples/basic-profile.json
-if __name__ == "__main__":
+# ---------------------------------------------------------------------------
+# Batch validation
+# ---------------------------------------------------------------------------
+
+_worker_plan: Optional[ValidationPlan] = None
+_worker_decryptor = None
+
+
+def _init_worker(plan: ValidationPlan, key_file: Optional[str] = None):
+    """Receive the parent's compiled plan once per worker process; keys are opened per process"""
+    global _worker_plan, _worker_decryptor
+    _worker_plan = plan
+    _worker_decryptor = open_decryptor(key_file) if key_file else None
+
+
+def _validate_record(record: Tuple[str, Optional[str], Optional[str]]) -> Dict:
+    """Validate one (source, file path, raw JSON text) record in a worker"""
+    source, path, text = record
+    try:
+        if path is not None:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        else:
+            data = json.loads(text)
+    except (OSError, ValueError) as e:
+        return {"source": source, "valid": False,
+                "errors": [{"kind": "parse", "field_code": None, "message": f"❌ Cannot read JSON: {e}"}]}
+    
+    errors = check_profile(_worker_plan, data, _worker_decryptor)
+    return {"source": source, "valid": not errors, "errors": [error._asdict() for error in errors]}
+
+
+def iter_records(inputs: List[str], jsonl: bool = False):
+    """Yield (source, path, text) records from files, directories, globs and JSON Lines streams.
+    '-' reads JSON Lines from stdin; '*.jsonl' files are always read line by line"""
+    import glob
+    import sys
+    from pathlib import Path
+    
+    def from_lines(name, lines):
+        for number, line in enumerate(lines, 1):
+            if line.strip():
+                yield f"{name}:{number}", None, line
+    
+    for item in inputs:
+        if item == '-':
+            yield from from_lines('<stdin>', sys.stdin)
+            continue
+        if Path(item).is_dir():
+            paths = sorted(str(p) for p in Path(item).rglob('*') if p.suffix in ('.json', '.jsonl'))
+        elif glob.has_magic(item):
+            paths = sorted(glob.glob(item, recursive=True))
+        else:
+            paths = [item]
+        
+        for path in paths:
+            if jsonl or path.endswith('.jsonl'):
+                with open(path, 'r', encoding='utf-8') as f:
+                    yield from from_lines(path, f)
+            else:
+                yield path, path, None
+
+
+def validate_batch(plan: ValidationPlan, records, workers: int = 1, chunksize: int = 64,
+                   key_file: Optional[str] = None):
+    """Validate records on a process pool sharing one compiled plan.
+    Yields per-record results in input order"""
+    import itertools
+    
+    if workers <= 1:
+        _init_worker(plan, key_file)
+        yield from map(_validate_record, records)
+        return
+    
+    from multiprocessing import Pool
+    
+    # Records are fed in bounded windows so huge inputs are never held in memory
+    window = workers * chunksize * 4
+    records = iter(records)
+    with Pool(workers, initializer=_init_worker, initargs=(plan, key_file)) as pool:
+        while True:
+            batch = list(itertools.islice(records, window))
+            if not batch:
+                break
+            yield from pool.imap(_validate_record, batch, chunksize)
+
+
+def summarize_batch(results) -> Dict:
+    """Aggregate per-record results into counts by error kind and field code"""
+    summary = {"total": 0, "valid": 0, "invalid": 0, "errors_by_kind": {}, "errors_by_field": {}}
+    for result in results:
+        summary["total"] += 1
+        summary["valid" if result["valid"] else "invalid"] += 1
+        for error in result["errors"]:
+            kind, field = error["kind"], error["field_code"] or "-"
+            summary["errors_by_kind"][kind] = summary["errors_by_kind"].get(kind, 0) + 1
+            summary["errors_by_field"][field] = summary["errors_by_field"].get(field, 0) + 1
+    return summary
+
+
+def main():
+    import argparse
+    import glob
+    import os
     import sys
-    from datetime import datetime
+    import time
+    
+    parser = argparse.ArgumentParser(description='DOCScoin JSON Validator')
+    parser.add_argument('inputs', nargs='*', default=['examples/basic-profile.json'],
+                        help='JSON file, directory, glob, *.jsonl file or "-" for JSON Lines on stdin')
+    parser.add_argument('--db', type=str, default=None,
+                        help='Template registry database (default: $DOCSCOIN_REGISTRY_DB or tools/template-registry.db)')
+    parser.add_argument('--snapshot', type=str, default=None,
+                        help='Registry snapshot file (registry.py compile or snapshot); no database is opened')
+    parser.add_argument('--key-file', type=str, default=None,
+                        help='Field key file for ENC[...] values (default: $DOCSCOIN_FIELD_KEY)')
+    parser.add_argument('--jsonl', action='store_true', help='Treat every input file as JSON Lines')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes for batch mode')
+    args = parser.parse_args()
+    
+    key_file = args.key_file or default_key_file()
+    validator = DOCScoinValidator(args.db, snapshot=args.snapshot, decryptor=open_decryptor(key_file))
     
-    if len(sys.argv) > 1:
-        json_file = sys.argv[1]
-    else:
-        json_file = "examples/basic-profile.json"
+    single = (len(args.inputs) == 1 and not args.jsonl and args.inputs[0] != '-'
+              and os.path.isfile(args.inputs[0]) and not args.inputs[0].endswith('.jsonl')
+              and not glob.has_magic(args.inputs[0]))
+    if single:
+        # Load JSON
+        with open(args.inputs[0], 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        
+        # Validate once, reuse the result for the report and the exit code
+        result = validator.validate_json(data)
+        print(validator.generate_validation_report(data, result))
+        sys.exit(0 if result[0] else 1)
+    
+    # Batch mode: one JSON line per record, summary as the last line
+    plan = validator.compiled_plan()
+    validator.close()
     
-    # Load JSON
-    with open(json_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    started = time.perf_counter()
     
-    # Validate
-    validator = DOCScoinValidator()
-    report = validator.generate_validation_report(data)
-    print(report)
+    def stream():
+        for result in validate_batch(plan, iter_records(args.inputs, args.jsonl), args.workers,
+                                     key_file=key_file):
+            print(json.dumps(result, ensure_ascii=False))
+            yield result
     
-    # Check if valid
-    is_valid, errors = validator.validate_json(data)
-    sys.exit(0 if is_valid else 1)
\ No newline at end of file
+    summary = summarize_batch(stream())
+    elapsed = time.perf_counter() - started
+    summary["seconds"] = round(elapsed, 3)
+    summary["records_per_sec"] = round(summary["total"] / elapsed, 1) if elapsed else None
+    print(json.dumps({"summary": summary}, ensure_ascii=False))
+    print(f"📊 Validated {summary['total']} records: {summary['valid']} valid, "
+          f"{summary['invalid']} invalid", file=sys.stderr)
+    sys.exit(0 if summary["total"] and summary["invalid"] == 0 else 1)
+
+
+# Для использования с examples/basic-profile.json
+if __name__ == "__main__":
+    main()